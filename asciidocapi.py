@@ -33,7 +33,19 @@ Doctests:
    >>> print outfile.getvalue()
    <simpara>Hello <emphasis>Bill Smith</emphasis></simpara>
 
-2. Check error handling:
+2. Check forked execution:
+
+   >>> import StringIO
+   >>> infile = StringIO.StringIO('Hello *{author}*')
+   >>> outfile = StringIO.StringIO()
+   >>> asciidoc = AsciiDocAPI(fork=True)
+   >>> asciidoc.options('--no-header-footer')
+   >>> asciidoc.attributes['author'] = 'Joe Bloggs'
+   >>> asciidoc.execute(infile, outfile, backend='html4')
+   >>> print outfile.getvalue()
+   <p>Hello <strong>Joe Bloggs</strong></p>
+
+3. Check error handling:
 
    >>> import StringIO
    >>> asciidoc = AsciiDocAPI()
@@ -46,15 +58,24 @@ Doctests:
        raise AsciiDocError(self.messages[-1])
    AsciiDocError: ERROR: <stdin>: line 1: [blockdef-listing] missing closing delimiter
 
+   >>> asciidoc = AsciiDocAPI(fork=True)
+   >>> infile = StringIO.StringIO('---------')
+   >>> asciidoc.execute(infile, outfile)
+   Traceback (most recent call last):
+     File "<stdin>", line 1, in <module>
+     File "asciidocapi.py", line 189, in execute
+       raise AsciiDocError(self.messages[-1])
+   AsciiDocError: ERROR: <stdin>: line 1: [blockdef-listing] missing closing delimiter
+
 
 Copyright (C) 2009 Stuart Rackham. Free use of this software is granted
 under the terms of the GNU General Public License (GPL).
 
 """
 
-import sys,os,re,imp
+import sys,os,re,imp,pickle,StringIO
 
-API_VERSION = '0.1.2'
+API_VERSION = '0.1.3'
 MIN_ASCIIDOC_VERSION = '8.4.1'  # Minimum acceptable AsciiDoc version.
 
 
@@ -145,11 +166,14 @@ class AsciiDocAPI(object):
     """
     AsciiDoc API class.
     """
-    def __init__(self, asciidoc_py=None):
+    def __init__(self, asciidoc_py=None, fork=False):
         """
         Locate and import asciidoc.py.
         Initialize instance attributes.
+        If fork is True (and the platform supports it) each execute() runs
+        asciidoc in a forked child process.
         """
+        self.fork = fork and hasattr(os, 'fork')
         self.options = Options()
         self.attributes = {}
         self.messages = []
@@ -234,6 +258,9 @@ class AsciiDocAPI(object):
                 s = '%s=%s' % (k,v)
             opts('--attribute', s)
         args = [infile]
+        if self.fork:
+            self.__execute_forked(opts, args, outfile)
+            return
         # The AsciiDoc command was designed to process source text then
         # exit, there are globals and statics in asciidoc.py that have
         # to be reinitialized before each run -- hence the reload.
@@ -247,6 +274,64 @@ class AsciiDocAPI(object):
             if e.code:
                 raise AsciiDocError(self.messages[-1])
 
+    def __execute_forked(self, opts, args, outfile):
+        '''
+        Run asciidoc in a forked child process.
+        The asciidoc module is only ever executed in children, so each
+        child starts with a copy-on-write copy of the pristine module
+        imported by the parent and there is no need to reload it. The
+        child returns the exit code, messages and (if outfile is a file
+        like object) the output to the parent through a pipe.
+        '''
+        if outfile is not None and not isinstance(outfile, basestring):
+            # Replace the caller's file object with one we can read back.
+            buf = StringIO.StringIO()
+            opts.values[opts.values.index(('--out-file', outfile))] = \
+                ('--out-file', buf)
+        else:
+            buf = None
+        rfd, wfd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Child process.
+            try:
+                os.close(rfd)
+                code = 0
+                try:
+                    try:
+                        self.asciidoc.execute(self.cmd, opts.values, args)
+                    except SystemExit, e:
+                        code = e.code
+                    messages = self.asciidoc.messages[:]
+                except Exception, e:
+                    code = 1
+                    messages = ['ERROR: %s' % e]
+                output = buf is not None and buf.getvalue() or None
+                data = pickle.dumps((code, messages, output), 2)
+                while data:
+                    data = data[os.write(wfd, data):]
+                os.close(wfd)
+            finally:
+                os._exit(0)
+        # Parent process.
+        os.close(wfd)
+        chunks = []
+        try:
+            while True:
+                chunk = os.read(rfd, 65536)
+                if not chunk: break
+                chunks.append(chunk)
+        finally:
+            os.close(rfd)
+            os.waitpid(pid, 0)
+        if not chunks:
+            raise AsciiDocError('asciidoc child process failed')
+        code, self.messages, output = pickle.loads(''.join(chunks))
+        if output is not None:
+            outfile.write(output)
+        if code:
+            raise AsciiDocError(self.messages[-1])
+
 
 if __name__ == "__main__":
     """
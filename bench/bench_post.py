@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""
+End-to-end posting throughput benchmark.
+
+Runs 'blogpost.py post' on a set of generated HTML blog files against a
+local fakewp server and reports posts per second, bytes sent and
+received, HTTP requests, connections and XML-RPC (or REST API) call
+counts for three passes: creating the posts, updating them (--force) and
+skipping them unmodified.
+
+Arguments are passed to blogpost.py, for example:
+
+    python bench/bench_post.py --latency 0.1 -- --upload-jobs 8
+"""
+
+import sys
+import os
+import time
+import shutil
+import subprocess
+import tempfile
+import json
+import platform
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+import blogpost
+import fakewp
+
+
+PROG = os.path.basename(os.path.splitext(__file__)[0])
+BLOGPOST = os.path.join(BENCH_DIR, '..', 'blogpost.py')
+
+PASSES = (
+    ('create', []),
+    ('update', ['--force']),
+    ('unmodified', []),
+)
+
+
+def message(msg):
+    sys.stderr.write('%s: %s\n' % (PROG, msg))
+
+def write_file(filename, text):
+    f = open(filename, 'w')
+    try:
+        f.write(text)
+    finally:
+        f.close()
+
+def make_site(directory, posts, media, media_size):
+    """
+    Write posts HTML blog files to directory, each referencing media
+    image files of media_size bytes. HTML files have no title so a
+    blogpost cache file containing one is written for each.
+    Return list of blog file names.
+    """
+    blog_files = []
+    for i in range(posts):
+        lines = ['<p>Post %d of %d.</p>' % (i, posts)]
+        for j in range(media):
+            name = 'post%03d-%02d.png' % (i, j)
+            write_file(os.path.join(directory, name), os.urandom(media_size))
+            lines.append('<p><img src="%s" alt="%s"></p>' % (name, name))
+        lines.append('<!--more-->')
+        lines += ['<p>Paragraph %d.</p>' % k for k in range(50)]
+        blog_file = os.path.join(directory, 'post%03d.html' % i)
+        write_file(blog_file, '\n'.join(lines) + '\n')
+        blog = blogpost.Blogpost('http://localhost/', None, None,
+                blogpost.OPTIONS)
+        blog.set_blog_file(blog_file)
+        blog.title = 'Post %d' % i
+        blog.save_cache()
+        blog_files.append(blog_file)
+    return blog_files
+
+def run_pass(server, conf_file, blog_files, args):
+    """
+    Post blog_files with blogpost.py and return result dictionary.
+    """
+    server.stats.reset()
+    env = dict(os.environ)
+    # Stop blogpost reading the user's $HOME/.blogpost.
+    env['HOME'] = os.path.dirname(conf_file)
+    cmd = [sys.executable, BLOGPOST, '-f', conf_file, 'post'] + args + blog_files
+    devnull = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        status = subprocess.call(cmd, env=env, stdout=devnull)
+        elapsed = time.time() - start
+    finally:
+        devnull.close()
+    result = server.stats.get()
+    result.update(
+        status = status,
+        seconds = elapsed,
+        posts = len(blog_files),
+        posts_per_second = len(blog_files) / elapsed,
+        rpc_calls = sum(result['calls'].values()),
+    )
+    return result
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='usage: %prog [OPTIONS] [-- BLOGPOST_OPTIONS]',
+        description='Measure blogpost.py posting throughput against a '
+            'local fake WordPress server.')
+    parser.add_option('-b', '--bandwidth', type='int',
+        dest='bandwidth', default=None, metavar='BYTES',
+        help='limit server transfers to BYTES per second')
+    parser.add_option('--busy-rate', type='float',
+        dest='busy_rate', default=0, metavar='RATE',
+        help='fraction of requests refused with HTTP 503')
+    parser.add_option('--capacity', type='int',
+        dest='capacity', default=None, metavar='REQUESTS',
+        help='server refuses requests beyond REQUESTS in progress')
+    parser.add_option('--drop-rate', type='float',
+        dest='drop_rate', default=0, metavar='RATE',
+        help='fraction of requests dropped without a response')
+    parser.add_option('--fault-rate', type='float',
+        dest='fault_rate', default=0, metavar='RATE',
+        help='fraction of calls that return a fault')
+    parser.add_option('-l', '--latency', type='float',
+        dest='latency', default=0.05, metavar='SECONDS',
+        help='delay added to each request (default 0.05)')
+    parser.add_option('-m', '--media', type='int',
+        dest='media', default=4, metavar='N',
+        help='media files per post (default 4)')
+    parser.add_option('--media-size', type='int',
+        dest='media_size', default=64*1024, metavar='BYTES',
+        help='media file size (default 65536)')
+    parser.add_option('-n', '--posts', type='int',
+        dest='posts', default=20, metavar='N',
+        help='number of posts (default 20)')
+    parser.add_option('--no-gzip',
+        action='store_false', dest='gzip', default=True,
+        help='server does not support gzip compression')
+    parser.add_option('--no-multicall',
+        action='store_false', dest='multicall', default=True,
+        help='server does not support system.multicall')
+    parser.add_option('--split-write',
+        action='store_true', dest='split_write', default=False,
+        help='server sends response headers and bodies separately')
+    parser.add_option('-o', '--output',
+        dest='output', default=None, metavar='FILE',
+        help='write JSON results to FILE')
+    parser.add_option('--rest',
+        action='store_true', dest='rest', default=False,
+        help='post with the REST API instead of XML-RPC')
+    parser.add_option('--seed', type='int',
+        dest='seed', default=None, metavar='SEED',
+        help='failure injection random seed')
+    options, args = parser.parse_args()
+    server = fakewp.Server(('127.0.0.1', 0), options.latency,
+            options.bandwidth, options.fault_rate, options.drop_rate,
+            options.multicall, options.seed, busy_rate=options.busy_rate,
+            capacity=options.capacity, gzip=options.gzip,
+            split_write=options.split_write)
+    server.start()
+    tmpdir = tempfile.mkdtemp(prefix=PROG)
+    try:
+        conf_file = os.path.join(tmpdir, 'blogpost.conf')
+        if options.rest:
+            write_file(conf_file, 'API = %r\nURL = %r\nUSERNAME = %r\n'
+                    'PASSWORD = %r\n' %
+                    ('rest', server.rest_url, 'admin', 'secret'))
+        else:
+            write_file(conf_file, 'URL = %r\nUSERNAME = %r\nPASSWORD = %r\n' %
+                    (server.url, 'admin', 'secret'))
+        site = os.path.join(tmpdir, 'site')
+        os.mkdir(site)
+        blog_files = make_site(site, options.posts, options.media,
+                options.media_size)
+        results = []
+        print '%-11s %7s %9s %10s %10s %8s %6s %5s %5s' % ('pass',
+                'seconds', 'posts/s', 'sent', 'received', 'requests', 'calls',
+                'conns', 'busy')
+        for name, pass_args in PASSES:
+            result = run_pass(server, conf_file, blog_files, pass_args + args)
+            result['pass'] = name
+            results.append(result)
+            print '%-11s %7.2f %9.2f %10d %10d %8d %6d %5d %5d' % (name,
+                    result['seconds'], result['posts_per_second'],
+                    result['bytes_received'], result['bytes_sent'],
+                    result['requests'], result['rpc_calls'],
+                    result['connections'], result['busy'])
+            if result['status'] != 0:
+                message('%s: blogpost.py exited with status %d' %
+                        (name, result['status']))
+    finally:
+        shutil.rmtree(tmpdir)
+    if options.output:
+        data = dict(
+            version = blogpost.VERSION,
+            python = platform.python_version(),
+            platform = platform.platform(),
+            date = time.strftime('%Y-%m-%dT%H:%M:%S'),
+            options = dict(options.__dict__, blogpost_args=args),
+            results = results,
+        )
+        f = open(options.output, 'w')
+        try:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write('\n')
+        finally:
+            f.close()
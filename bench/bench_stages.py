@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+"""
+Stage-level microbenchmarks for the blogpost processing pipeline.
+
+Generates synthetic AsciiDoc, Rimu and HTML documents of increasing size
+(long <pre> listings, hundreds of images, large data: URIs) and times the
+individual blogpost stages. No WordPress server is needed: media files
+are recorded as uploaded before process_media() is timed.
+
+Results are written as JSON so runs from different versions can be
+compared with the --compare option.
+"""
+
+import sys
+import os
+import time
+import StringIO
+import base64
+import platform
+import shutil
+import tempfile
+import timeit
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import blogpost
+import asciidocapi
+
+
+PROG = os.path.basename(os.path.splitext(__file__)[0])
+
+STAGES = ('asciidoc2html', 'sanitize_html', 'process_media',
+        'get_parameters', 'set_title_from_blog_file', 'save_cache',
+        'load_cache')
+
+
+def message(msg):
+    sys.stderr.write('%s: %s\n' % (PROG, msg))
+
+
+#################################
+# Synthetic document generation #
+#################################
+
+LISTING_LINES = 40      # Lines per <pre> listing.
+DATA_URI_SIZE = 16*1024 # Bytes of image data per data: URI.
+DATA_URI_EVERY = 10     # One data: URI per this many sections.
+
+def write_file(filename, text):
+    f = open(filename, 'w')
+    try:
+        f.write(text)
+    finally:
+        f.close()
+
+def make_images(directory, count):
+    """
+    Create count small image files in directory.
+    Return list of their names relative to directory.
+    """
+    names = []
+    for i in range(count):
+        name = 'img%04d.png' % i
+        write_file(os.path.join(directory, name), os.urandom(512))
+        names.append(name)
+    return names
+
+def asciidoc_document(size):
+    """
+    Return AsciiDoc source with size sections, each with a paragraph, a
+    listing block and an image.
+    """
+    lines = [
+        'Benchmark Document',
+        '==================',
+        ':blogpost-status: published',
+        ':blogpost-doctype: article',
+        ':blogpost-posttype: post',
+        ':blogpost-categories: benchmarks,blogpost',
+        '',
+    ]
+    for i in range(size):
+        lines += [
+            'Section %d' % i,
+            '-----------',
+            'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed',
+            'do eiusmod tempor incididunt ut labore et dolore magna aliqua.',
+            '',
+            '-----------------------------------------------------------',
+        ]
+        lines += ['    listing line %d of section %d' % (j, i)
+                for j in range(LISTING_LINES)]
+        lines += [
+            '-----------------------------------------------------------',
+            '',
+            'image::img%04d.png[Image %d]' % (i, i),
+            '',
+        ]
+    return '\n'.join(lines) + '\n'
+
+def rimu_document(size):
+    """
+    Return Rimu source with blogpost parameters and size sections.
+    """
+    lines = [
+        "{blogpost-status} = 'published'",
+        "{blogpost-doctype} = 'article'",
+        "{blogpost-posttype} = 'post'",
+        "{blogpost-categories} = 'benchmarks,blogpost'",
+        '',
+        '# Benchmark Document',
+        '',
+    ]
+    for i in range(size):
+        lines += [
+            '## Section %d' % i,
+            'Lorem ipsum dolor sit amet, consectetur adipiscing elit.',
+            '',
+            '<image:img%04d.png|Image %d>' % (i, i),
+            '',
+        ]
+    return '\n'.join(lines) + '\n'
+
+def html_document(size):
+    """
+    Return rendered HTML like that generated by the wordpress backend:
+    size sections, each with a paragraph, a <pre> listing and an image
+    link, and every DATA_URI_EVERY sections a large data: URI image.
+    """
+    data = base64.encodestring(os.urandom(DATA_URI_SIZE)).rstrip()
+    lines = ['<h1>Benchmark Document</h1>']
+    for i in range(size):
+        lines += [
+            '<h2 id="_section_%d">Section %d</h2>' % (i, i),
+            '<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed',
+            'do eiusmod tempor incididunt ut labore et dolore magna aliqua.</p>',
+            '<pre><code>listing line 0 of section %d' % i,
+        ]
+        lines += ['    listing line %d of section %d' % (j, i)
+                for j in range(1, LISTING_LINES)]
+        lines += [
+            '</code></pre>',
+            '<div class="imageblock">',
+            '<a href="img%04d.png"><img src="img%04d.png" alt="Image %d"></a>'
+                % (i, i, i),
+            '</div>',
+        ]
+        if i % DATA_URI_EVERY == 0:
+            lines += ['<img alt="Embedded %d"' % i,
+                    'src="data:image/png;base64,%s">' % data]
+        if i == size // 2:
+            lines.append('<!--more-->')
+    return '\n'.join(lines) + '\n'
+
+
+##############
+# Benchmarks #
+##############
+
+def new_blog(options, blog_file):
+    blog = blogpost.Blogpost('http://localhost/xmlrpc.php', 'user', 'password',
+            options)
+    blog.set_blog_file(blog_file)
+    return blog
+
+def consume(chunks):
+    for chunk in chunks:
+        pass
+
+def time_stage(setup, func, repeat):
+    """
+    Call setup() then time func(setup_result) repeat times.
+    Return list of elapsed times in seconds.
+    blogpost messages are discarded while func runs.
+    """
+    times = []
+    for i in range(repeat):
+        arg = setup()
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            start = timeit.default_timer()
+            func(arg)
+            times.append(timeit.default_timer() - start)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    return times
+
+def asciidoc_available():
+    try:
+        asciidocapi.AsciiDocAPI()
+    except asciidocapi.AsciiDocError:
+        return False
+    return True
+
+def run_benchmarks(sizes, repeat, stages):
+    """
+    Return list of result dictionaries, one per stage, document format
+    and size.
+    """
+    options = blogpost.Namespace(
+            dry_run = False,
+            verbose = 0,
+            media = True,
+            media_jobs = 4,
+            force_media = False,
+            categories = '',
+            proxy = None,
+            connect_timeout = None,
+            read_timeout = None,
+            retries = 3,
+            max_requests = 16,
+            gzip_requests = 0,
+            attributes = [],
+            asciidoc_opts = [],
+            asciidoc = 'asciidoc',
+        )
+    blogpost.OPTIONS = options
+    has_asciidoc = asciidoc_available()
+    if 'asciidoc2html' in stages and not has_asciidoc:
+        message('asciidoc not found: skipping asciidoc2html')
+    results = []
+    tmpdir = tempfile.mkdtemp(prefix=PROG)
+    try:
+        images = make_images(tmpdir, max(sizes))
+        for size in sizes:
+            txt_file = os.path.join(tmpdir, 'doc%d.txt' % size)
+            rmu_file = os.path.join(tmpdir, 'doc%d.rmu' % size)
+            html_file = os.path.join(tmpdir, 'doc%d.html' % size)
+            write_file(txt_file, asciidoc_document(size))
+            write_file(rmu_file, rimu_document(size))
+            html = html_document(size)
+            write_file(html_file, html)
+
+            def content_blog(blog_file=html_file):
+                blog = new_blog(options, blog_file)
+                blog.content = StringIO.StringIO(html)
+                return blog
+
+            # Record the media files as uploaded (dry run) so
+            # process_media() is timed without a server.
+            media_blog = content_blog()
+            media_blog.options = blogpost.Namespace(**options.__dict__)
+            media_blog.options.dry_run = True
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                media_blog.process_media()
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            media_blog.options = options
+
+            def media_setup():
+                media_blog.content = StringIO.StringIO(html)
+                return media_blog
+
+            def cache_blog():
+                blog = new_blog(options, html_file)
+                blog.media = media_blog.media
+                blog.dependencies = dict((os.path.join(tmpdir, name),
+                        ((512, 0, 0), 'd41d8cd98f00b204e9800998ecf8427e'))
+                        for name in images[:size])
+                return blog
+
+            cases = [
+                ('sanitize_html', 'html', content_blog,
+                    lambda blog: consume(blog.sanitize_html())),
+                ('process_media', 'html', media_setup,
+                    lambda blog: blog.process_media()),
+                ('get_parameters', 'asciidoc',
+                    lambda: new_blog(options, txt_file),
+                    lambda blog: blog.get_parameters()),
+                ('get_parameters', 'rimu',
+                    lambda: new_blog(options, rmu_file),
+                    lambda blog: blog.get_parameters()),
+                ('set_title_from_blog_file', 'asciidoc',
+                    lambda: new_blog(options, txt_file),
+                    lambda blog: blog.set_title_from_blog_file()),
+                ('set_title_from_blog_file', 'rimu',
+                    lambda: content_blog(rmu_file),
+                    lambda blog: blog.set_title_from_blog_file()),
+                ('save_cache', 'html', cache_blog,
+                    lambda blog: blog.save_cache()),
+                ('load_cache', 'html', cache_blog,
+                    lambda blog: blog.load_cache()),
+            ]
+            if has_asciidoc:
+                cases.insert(0, ('asciidoc2html', 'asciidoc',
+                    lambda: new_blog(options, txt_file),
+                    lambda blog: blog.asciidoc2html()))
+            for stage, fmt, setup, func in cases:
+                if stage not in stages:
+                    continue
+                if stage == 'load_cache' and 'save_cache' not in stages:
+                    cache_blog().save_cache()
+                times = time_stage(setup, func, repeat)
+                times.sort()
+                result = dict(
+                    stage = stage,
+                    format = fmt,
+                    size = size,
+                    bytes = os.path.getsize({'asciidoc': txt_file,
+                        'rimu': rmu_file, 'html': html_file}[fmt]),
+                    repeat = repeat,
+                    min = times[0],
+                    median = times[len(times) // 2],
+                )
+                message('%-26s %-9s %6d %10.6f' %
+                        (stage, fmt, size, result['min']))
+                results.append(result)
+    finally:
+        shutil.rmtree(tmpdir)
+    return results
+
+def compare(old_file, new_file):
+    """
+    Print the ratio of new to old minimum times for each stage.
+    """
+    def load(filename):
+        f = open(filename)
+        try:
+            data = json.load(f)
+        finally:
+            f.close()
+        return dict(((r['stage'], r['format'], r['size']), r)
+                for r in data['results']), data['version']
+    old, old_version = load(old_file)
+    new, new_version = load(new_file)
+    print '%-26s %-9s %6s %10s %10s %7s' % ('stage', 'format', 'size',
+            old_version, new_version, 'ratio')
+    for key in sorted(new):
+        if key not in old:
+            continue
+        old_min, new_min = old[key]['min'], new[key]['min']
+        ratio = new_min / old_min if old_min else float('inf')
+        print '%-26s %-9s %6d %10.6f %10.6f %7.2f' % (key + (old_min,
+                new_min, ratio))
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='usage: %prog [OPTIONS]',
+        description='Time the blogpost processing stages on synthetic '
+            'documents and write the results as JSON.')
+    parser.add_option('--compare', nargs=2,
+        dest='compare', default=None, metavar='OLD NEW',
+        help='compare two JSON result files')
+    parser.add_option('-o', '--output',
+        dest='output', default=None, metavar='FILE',
+        help='write JSON results to FILE (default stdout)')
+    parser.add_option('-r', '--repeat', type='int',
+        dest='repeat', default=5, metavar='N',
+        help='time each stage N times')
+    parser.add_option('-s', '--sizes',
+        dest='sizes', default='10,100,1000', metavar='SIZES',
+        help='comma separated document sizes in sections')
+    parser.add_option('--stages',
+        dest='stages', default=','.join(STAGES), metavar='STAGES',
+        help='comma separated stages to run')
+    options, args = parser.parse_args()
+    if options.compare:
+        compare(*options.compare)
+        sys.exit(0)
+    try:
+        sizes = [int(s) for s in options.sizes.split(',')]
+    except ValueError:
+        parser.error('invalid --sizes: %s' % options.sizes)
+    stages = options.stages.split(',')
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error('invalid stage: %s' % stage)
+    if options.repeat < 1:
+        parser.error('--repeat must be at least 1')
+    results = run_benchmarks(sizes, options.repeat, stages)
+    data = dict(
+        version = blogpost.VERSION,
+        python = platform.python_version(),
+        platform = platform.platform(),
+        date = time.strftime('%Y-%m-%dT%H:%M:%S'),
+        results = results,
+    )
+    if options.output:
+        f = open(options.output, 'w')
+    else:
+        f = sys.stdout
+    try:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+    finally:
+        if f is not sys.stdout:
+            f.close()
@@ -0,0 +1,966 @@
+#!/usr/bin/env python
+"""
+Local stand-in WordPress XML-RPC and REST API server for testing and
+benchmarking.
+
+Implements the XML-RPC methods used by wordpresslib.WordPressClient
+(metaWeblog.*, mt.*, wp.*Page*, wp.newCategory, blogger.*) and the REST
+API routes used by wordpresslib.WordPressRestClient (posts, pages,
+categories, media and users/me under /wp-json or ?rest_route=) against
+an in-memory blog with optional latency, bandwidth limiting and failure
+injection. Like WordPress it keeps HTTP/1.1 connections alive and
+supports system.multicall and gzip compressed requests and responses
+(unless disabled). Uploaded media files are served at their URLs.
+Response headers and bodies can be sent separately (split writes) to
+exercise clients that read partial responses.
+
+Server statistics (requests, connections, bytes and per-method call
+counts) are returned by the fakewp.getStats XML-RPC method and cleared
+by fakewp.resetStats.
+"""
+
+import sys
+import os
+import re
+import time
+import random
+import threading
+import json
+import base64
+import urlparse
+import xmlrpclib
+import SocketServer
+import SimpleXMLRPCServer
+
+
+PROG = os.path.basename(os.path.splitext(__file__)[0])
+SPLIT_WRITE_DELAY = 0.01    # Seconds between split response writes.
+
+
+class Stats(object):
+    """
+    Thread-safe server statistics.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.lock.acquire()
+        try:
+            self.counters = dict(requests=0, connections=0,
+                    bytes_received=0, bytes_sent=0, faults=0, drops=0, busy=0,
+                    gzip_requests=0)
+            self.calls = {}
+        finally:
+            self.lock.release()
+
+    def add(self, key, n=1):
+        self.lock.acquire()
+        try:
+            self.counters[key] += n
+        finally:
+            self.lock.release()
+
+    def call(self, method):
+        self.lock.acquire()
+        try:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        finally:
+            self.lock.release()
+
+    def get(self):
+        self.lock.acquire()
+        try:
+            result = dict(self.counters)
+            result['calls'] = dict(self.calls)
+            return result
+        finally:
+            self.lock.release()
+
+
+class ThrottledFile(object):
+    """
+    Wraps a connection's socket file object, counts the bytes read from
+    or written to it and, if bandwidth is not None, delays the transfer
+    to bandwidth bytes per second.
+    """
+
+    def __init__(self, f, stats, key, bandwidth):
+        self.f = f
+        self.stats = stats
+        self.key = key
+        self.bandwidth = bandwidth
+
+    def transferred(self, n):
+        self.stats.add(self.key, n)
+        if self.bandwidth:
+            time.sleep(float(n) / self.bandwidth)
+
+    def read(self, *args):
+        data = self.f.read(*args)
+        self.transferred(len(data))
+        return data
+
+    def readline(self, *args):
+        data = self.f.readline(*args)
+        self.transferred(len(data))
+        return data
+
+    def write(self, data):
+        self.transferred(len(data))
+        self.f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+class RestFault(Exception):
+    """
+    REST API error response.
+    """
+
+    def __init__(self, status, code, message):
+        Exception.__init__(self, message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class RequestHandler(SimpleXMLRPCServer.SimpleXMLRPCRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    rpc_paths = ('/', '/RPC2', '/xmlrpc.php')
+
+    def setup(self):
+        SimpleXMLRPCServer.SimpleXMLRPCRequestHandler.setup(self)
+        server = self.server
+        server.stats.add('connections')
+        self.rfile = ThrottledFile(self.rfile, server.stats,
+                'bytes_received', server.bandwidth)
+        self.wfile = ThrottledFile(self.wfile, server.stats,
+                'bytes_sent', server.bandwidth)
+        if not server.gzip:
+            self.encode_threshold = None    # Do not compress responses.
+
+    def end_headers(self):
+        SimpleXMLRPCServer.SimpleXMLRPCRequestHandler.end_headers(self)
+        if self.server.split_write:
+            # Make sure the headers and body arrive in separate reads.
+            self.wfile.flush()
+            time.sleep(SPLIT_WRITE_DELAY)
+
+    def decode_request_content(self, data):
+        encoding = self.headers.get('content-encoding', 'identity').lower()
+        if encoding != 'identity':
+            self.server.stats.add('gzip_requests')
+            if not self.server.gzip:
+                # Like WordPress parse the undecoded body and fail.
+                response = xmlrpclib.dumps(
+                        xmlrpclib.Fault(-32700, 'parse error. not well formed'),
+                        methodresponse=True)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/xml')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+                return None
+        return SimpleXMLRPCServer.SimpleXMLRPCRequestHandler.\
+                decode_request_content(self, data)
+
+    def do_POST(self):
+        if self.is_rest():
+            self.serve(self.do_REST)
+        else:
+            self.serve(lambda: SimpleXMLRPCServer
+                    .SimpleXMLRPCRequestHandler.do_POST(self))
+
+    def do_DELETE(self):
+        self.serve(self.do_REST)
+
+    def serve(self, handler):
+        """
+        Handle a request with handler() unless a failure is injected.
+        """
+        server = self.server
+        server.stats.add('requests')
+        overloaded = not server.enter()
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+            if server.inject(server.drop_rate):
+                # Simulate a dropped connection.
+                server.stats.add('drops')
+                self.close_connection = 1
+                return
+            if overloaded or server.inject(server.busy_rate):
+                # Simulate an overloaded server.
+                server.stats.add('busy')
+                self.rfile.read(int(self.headers.get('content-length', 0)))
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            handler()
+        finally:
+            server.leave()
+
+    def is_rest(self):
+        return self.path.startswith('/wp-json/') or 'rest_route=' in self.path
+
+    def do_REST(self):
+        """
+        Handle a REST API request.
+        """
+        server = self.server
+        path, sep, query = self.path.partition('?')
+        query = dict(urlparse.parse_qsl(query))
+        route = query.pop('rest_route', None) or path[len('/wp-json'):]
+        body = self.rfile.read(int(self.headers.get('content-length', 0)))
+        try:
+            if not self.headers.get('authorization', '').startswith('Basic '):
+                raise RestFault(401, 'rest_not_logged_in',
+                        'You are not currently logged in.')
+            encoding = self.headers.get('content-encoding', 'identity')
+            if encoding.lower() != 'identity':
+                server.stats.add('gzip_requests')
+                if server.gzip:
+                    try:
+                        body = xmlrpclib.gzip_decode(body)
+                    except ValueError:
+                        raise RestFault(400, 'rest_invalid_json',
+                                'Invalid JSON body passed.')
+                # Else like WordPress parse the undecoded body and fail.
+            status, result = server.blog.rest(self.command, route, query,
+                    body, self.headers)
+        except RestFault, e:
+            status, result = e.status, dict(code=e.code, message=e.message,
+                    data=dict(status=e.status))
+        data = json.dumps(result)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        if self.encode_threshold is not None \
+                and len(data) > self.encode_threshold \
+                and self.accept_encodings().get('gzip', 0):
+            data = xmlrpclib.gzip_encode(data)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.is_rest():
+            self.serve(self.do_REST)
+            return
+        # Serve uploaded media files.
+        server = self.server
+        server.stats.add('requests')
+        if server.latency:
+            time.sleep(server.latency)
+        data = None
+        prefix = '/wp-content/uploads/'
+        if self.path.startswith(prefix):
+            data = server.blog.media_data(self.path[len(prefix):])
+        if data is None:
+            self.report_404()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            SimpleXMLRPCServer.SimpleXMLRPCRequestHandler.log_message(
+                    self, format, *args)
+
+
+class FakeWordPress(object):
+    """
+    In-memory WordPress blog exposing the XML-RPC and REST APIs.
+    Posts and pages are dictionaries of the XML-RPC post structure fields.
+    """
+
+    def __init__(self, url, server):
+        self.url = url.rstrip('/')
+        self.server = server
+        self.lock = threading.RLock()
+        self.next_id = 1
+        self.posts = {}         # Posts and pages keyed by id.
+        self.categories = {}    # Category names keyed by id.
+        self.media = {}         # Media file structs keyed by name.
+        self.methods = {
+            'blogger.deletePost': self.blogger_deletePost,
+            'blogger.getUserInfo': self.blogger_getUserInfo,
+            'blogger.getUsersBlogs': self.blogger_getUsersBlogs,
+            'metaWeblog.editPost': self.metaWeblog_editPost,
+            'metaWeblog.getPost': self.metaWeblog_getPost,
+            'metaWeblog.getRecentPosts': self.metaWeblog_getRecentPosts,
+            'metaWeblog.newMediaObject': self.metaWeblog_newMediaObject,
+            'metaWeblog.newPost': self.metaWeblog_newPost,
+            'mt.getCategoryList': self.mt_getCategoryList,
+            'mt.getPostCategories': self.mt_getPostCategories,
+            'mt.getTrackbackPings': self.mt_getTrackbackPings,
+            'mt.publishPost': self.mt_publishPost,
+            'mt.setPostCategories': self.mt_setPostCategories,
+            'mt.supportedMethods': self.mt_supportedMethods,
+            'pingback.extensions.getPingbacks': self.pingback_getPingbacks,
+            'wp.deletePage': self.wp_deletePage,
+            'wp.editPage': self.wp_editPage,
+            'wp.getMediaLibrary': self.wp_getMediaLibrary,
+            'wp.getPage': self.wp_getPage,
+            'wp.getPages': self.wp_getPages,
+            'wp.getPosts': self.wp_getPosts,
+            'wp.newCategory': self.wp_newCategory,
+            'wp.newPage': self.wp_newPage,
+            'fakewp.getStats': self.fakewp_getStats,
+            'fakewp.resetStats': self.fakewp_resetStats,
+        }
+        # REST API (method, route pattern, handler) tuples.
+        self.routes = [(method, re.compile('^%s$' % pattern), handler)
+            for method, pattern, handler in (
+                ('GET', r'/wp/v2/(posts|pages)', self.rest_getPosts),
+                ('POST', r'/wp/v2/(posts|pages)', self.rest_newPost),
+                ('GET', r'/wp/v2/(posts|pages)/(\d+)', self.rest_getPost),
+                ('POST', r'/wp/v2/(posts|pages)/(\d+)', self.rest_editPost),
+                ('DELETE', r'/wp/v2/(posts|pages)/(\d+)',
+                    self.rest_deletePost),
+                ('GET', r'/wp/v2/categories', self.rest_getCategories),
+                ('POST', r'/wp/v2/categories', self.rest_newCategory),
+                ('GET', r'/wp/v2/media', self.rest_getMedia),
+                ('POST', r'/wp/v2/media', self.rest_newMedia),
+                ('GET', r'/wp/v2/users/me', self.rest_getUser),
+            )]
+
+    def _listMethods(self):
+        return sorted(self.methods.keys())
+
+    def _dispatch(self, method, params):
+        if method not in self.methods:
+            raise xmlrpclib.Fault(-32601,
+                    'server error. requested method %s does not exist.' % method)
+        if not method.startswith('fakewp.'):
+            self.server.stats.call(method)
+            if self.server.inject(self.server.fault_rate):
+                self.server.stats.add('faults')
+                raise xmlrpclib.Fault(500, 'Injected failure: %s' % method)
+        self.lock.acquire()
+        try:
+            return self.methods[method](*params)
+        finally:
+            self.lock.release()
+
+    # Helpers.
+
+    def new_id(self):
+        result = self.next_id
+        self.next_id += 1
+        return result
+
+    def get(self, post_id, post_type):
+        post = self.posts.get(int(post_id))
+        if post is None or post['post_type'] != post_type:
+            raise xmlrpclib.Fault(404, 'Invalid post ID.')
+        return post
+
+    def new(self, content, post_type, publish):
+        post_id = self.new_id()
+        post = dict(
+            postid = str(post_id),
+            post_type = post_type,
+            title = '',
+            description = '',
+            mt_text_more = '',
+            mt_excerpt = '',
+            mt_allow_comments = 1,
+            mt_allow_pings = 1,
+            categories = [],
+            dateCreated = xmlrpclib.DateTime(time.gmtime()),
+            publish = bool(publish),
+        )
+        self.edit(post, content, publish)
+        self.posts[post_id] = post
+        return post_id
+
+    def edit(self, post, content, publish):
+        for name in ('title', 'description', 'mt_text_more', 'mt_excerpt',
+                'mt_allow_pings', 'dateCreated'):
+            if name in content:
+                post[name] = content[name]
+        post['publish'] = bool(publish)
+        post['permaLink'] = post['link'] = '%s/?p=%s' % (self.url, post['postid'])
+        post['modified'] = time.time()
+
+    def post_struct(self, post):
+        result = dict(post)
+        del result['post_type'], result['publish'], result['modified']
+        result['userid'] = '1'
+        return result
+
+    def page_struct(self, post):
+        result = self.post_struct(post)
+        result['page_id'] = result.pop('postid')
+        return result
+
+    # blogger.*
+
+    def blogger_deletePost(self, appkey, post_id, user, password):
+        self.get(post_id, 'post')
+        del self.posts[int(post_id)]
+        return True
+
+    def blogger_getUserInfo(self, appkey, user, password):
+        return dict(userid='1', firstname='Fake', lastname='WordPress',
+                nickname=user, email='%s@localhost' % user)
+
+    def blogger_getUsersBlogs(self, appkey, user, password):
+        return [dict(blogid='1', blogName='fakewp', isAdmin=True,
+                url=self.url + '/')]
+
+    # metaWeblog.*
+
+    def metaWeblog_newPost(self, blog_id, user, password, content, publish):
+        return str(self.new(content, 'post', publish))
+
+    def metaWeblog_editPost(self, post_id, user, password, content, publish):
+        self.edit(self.get(post_id, 'post'), content, publish)
+        return True
+
+    def metaWeblog_getPost(self, post_id, user, password):
+        return self.post_struct(self.get(post_id, 'post'))
+
+    def metaWeblog_getRecentPosts(self, blog_id, user, password, count):
+        ids = sorted([k for k, v in self.posts.items()
+                if v['post_type'] == 'post'], reverse=True)[:count]
+        return [self.post_struct(self.posts[k]) for k in ids]
+
+    def metaWeblog_newMediaObject(self, blog_id, user, password, media):
+        filename = self.new_media(media['name'], media.get('type', ''),
+                media['bits'].data)
+        return dict(file=filename, url=self.media[filename]['link'],
+                type=media.get('type', ''))
+
+    def new_media(self, filename, mime_type, data):
+        """
+        Store uploaded media file data, return its (unique) file name.
+        """
+        name, ext = os.path.splitext(filename)
+        i = 0
+        while filename in self.media:
+            # WordPress renames uploads that clash with existing files.
+            i += 1
+            filename = '%s-%d%s' % (name, i, ext)
+        url = '%s/wp-content/uploads/%s' % (self.url, filename)
+        self.media[filename] = dict(
+            attachment_id = str(self.new_id()),
+            date_created_gmt = xmlrpclib.DateTime(time.gmtime()),
+            parent = 0,
+            link = url,
+            title = name,
+            caption = '',
+            description = '',
+            type = mime_type,
+            metadata = dict(file=filename, filesize=len(data)),
+            data = data,
+        )
+        return filename
+
+    def media_data(self, filename):
+        """
+        Return the contents of uploaded media file filename or None.
+        """
+        self.lock.acquire()
+        try:
+            media = self.media.get(filename)
+            return media and media['data']
+        finally:
+            self.lock.release()
+
+    # mt.*
+
+    def mt_getCategoryList(self, blog_id, user, password):
+        return [dict(categoryId=str(k), categoryName=v)
+                for k, v in sorted(self.categories.items())]
+
+    def mt_getPostCategories(self, post_id, user, password):
+        result = []
+        for name in self.get(post_id, 'post')['categories']:
+            for k, v in self.categories.items():
+                if v == name:
+                    result.append(dict(categoryId=str(k), categoryName=v,
+                            isPrimary=not result))
+        return result
+
+    def mt_setPostCategories(self, post_id, user, password, categories):
+        post = self.get(post_id, 'post')
+        names = []
+        for cat in categories:
+            # Accept category names as well as ids (editPost passes the
+            # names returned by getPost).
+            cat_id = str(cat['categoryId'])
+            if cat_id.isdigit() and int(cat_id) in self.categories:
+                names.append(self.categories[int(cat_id)])
+            elif cat_id in self.categories.values():
+                names.append(cat_id)
+        post['categories'] = names
+        post['modified'] = time.time()
+        return True
+
+    def mt_getTrackbackPings(self, post_id):
+        self.get(post_id, 'post')
+        return []
+
+    def mt_publishPost(self, post_id, user, password):
+        post = self.get(post_id, 'post')
+        post['publish'] = True
+        post['modified'] = time.time()
+        return 1
+
+    def mt_supportedMethods(self):
+        return [m for m in self._listMethods() if m.startswith('mt.')]
+
+    def pingback_getPingbacks(self, url):
+        return []
+
+    # wp.*
+
+    def wp_newPage(self, blog_id, user, password, content, publish):
+        return str(self.new(content, 'page', publish))
+
+    def wp_editPage(self, blog_id, page_id, user, password, content, publish):
+        self.edit(self.get(page_id, 'page'), content, publish)
+        return True
+
+    def wp_getMediaLibrary(self, blog_id, user, password, filter={}):
+        items = sorted(self.media.values(),
+                key=lambda v: int(v['attachment_id']), reverse=True)
+        if 'parent_id' in filter:
+            items = [v for v in items if v['parent'] == filter['parent_id']]
+        offset = filter.get('offset', 0)
+        items = items[offset:offset + filter.get('number', 10)]
+        result = []
+        for v in items:
+            v = dict(v)
+            del v['data']
+            result.append(v)
+        return result
+
+    def wp_getPage(self, blog_id, page_id, user, password):
+        return self.page_struct(self.get(page_id, 'page'))
+
+    def wp_getPages(self, blog_id, user, password):
+        return [self.page_struct(v) for k, v in sorted(self.posts.items())
+                if v['post_type'] == 'page' and v['publish']]
+
+    def wp_getPosts(self, blog_id, user, password, filter={}, fields=None):
+        # The fields argument is accepted but all fields are returned.
+        post_type = filter.get('post_type', 'post')
+        posts = [v for v in self.posts.values() if v['post_type'] == post_type]
+        if 'post_status' in filter:
+            posts = [v for v in posts if filter['post_status'] ==
+                    (v['publish'] and 'publish' or 'draft')]
+        if filter.get('orderby') == 'modified':
+            key = lambda v: (v['modified'], int(v['postid']))
+        else:
+            key = lambda v: (str(v['dateCreated']), int(v['postid']))
+        posts.sort(key=key, reverse=filter.get('order', 'DESC') == 'DESC')
+        offset = filter.get('offset', 0)
+        posts = posts[offset:offset + filter.get('number', 10)]
+        return [dict(
+                post_id = v['postid'],
+                post_title = v['title'],
+                post_status = v['publish'] and 'publish' or 'draft',
+                post_type = v['post_type'],
+                post_date_gmt = v['dateCreated'],
+                post_modified_gmt = xmlrpclib.DateTime(time.gmtime(v['modified'])),
+                link = v['link'],
+                terms = [dict(taxonomy='category', name=name)
+                    for name in v['categories']],
+            ) for v in posts]
+
+    def wp_deletePage(self, blog_id, user, password, page_id):
+        self.get(page_id, 'page')
+        del self.posts[int(page_id)]
+        return True
+
+    def wp_newCategory(self, blog_id, user, password, category):
+        if category['name'] in self.categories.values():
+            raise xmlrpclib.Fault(500, 'The category already exists.')
+        cat_id = self.new_id()
+        self.categories[cat_id] = category['name']
+        return cat_id
+
+    # REST API.
+
+    def rest(self, method, route, query, body, headers):
+        """
+        Dispatch REST API request, return (status, JSON result). The
+        result is limited to the comma separated _fields in query.
+        """
+        for route_method, pattern, handler in self.routes:
+            mo = pattern.match(route)
+            if mo and route_method == method:
+                break
+        else:
+            raise RestFault(404, 'rest_no_route',
+                    'No route was found matching the URL and request method.')
+        name = '%s %s' % (method, re.sub(r'/\d+', '/{id}', route))
+        self.server.stats.call(name)
+        if self.server.inject(self.server.fault_rate):
+            self.server.stats.add('faults')
+            raise RestFault(500, 'injected_failure',
+                    'Injected failure: %s' % name)
+        data = body
+        if headers.get('content-type', '').startswith('application/json'):
+            try:
+                data = json.loads(body)
+            except ValueError:
+                raise RestFault(400, 'rest_invalid_json',
+                        'Invalid JSON body passed.')
+        self.lock.acquire()
+        try:
+            status, result = handler(query, data, headers, *mo.groups())
+        finally:
+            self.lock.release()
+        if '_fields' in query:
+            fields = query['_fields'].split(',')
+            select = lambda v: dict((k, v[k]) for k in fields if k in v)
+            if isinstance(result, list):
+                result = [select(v) for v in result]
+            else:
+                result = select(result)
+        return status, result
+
+    def rest_get(self, post_id, post_type):
+        post = self.posts.get(int(post_id))
+        if post is None or post['post_type'] != post_type:
+            raise RestFault(404, 'rest_post_invalid_id', 'Invalid post ID.')
+        return post
+
+    def rest_page(self, items, query):
+        """
+        Return the items of the page selected by the per_page, page and
+        offset query parameters.
+        """
+        per_page = int(query.get('per_page', 10))
+        if not 1 <= per_page <= 100:
+            raise RestFault(400, 'rest_invalid_param',
+                    'Invalid parameter(s): per_page')
+        if 'offset' in query:
+            offset = int(query['offset'])
+        else:
+            offset = (int(query.get('page', 1)) - 1) * per_page
+        return items[offset:offset + per_page]
+
+    def rest_date(self, t):
+        """
+        Return struct_time t as a REST API date string.
+        """
+        return time.strftime('%Y-%m-%dT%H:%M:%S', t)
+
+    def rest_post(self, post):
+        """
+        Return the REST API object of post.
+        """
+        content = post['description']
+        if post['mt_text_more']:
+            content += '<!--more-->' + post['mt_text_more']
+        date = self.rest_date(time.strptime(str(post['dateCreated']),
+                '%Y%m%dT%H:%M:%S'))
+        result = dict(
+            id = int(post['postid']),
+            type = post['post_type'],
+            status = post['publish'] and 'publish' or 'draft',
+            title = dict(raw=post['title'], rendered=post['title']),
+            content = dict(raw=content, rendered=content),
+            excerpt = dict(raw=post['mt_excerpt'],
+                    rendered=post['mt_excerpt']),
+            author = 1,
+            date = date,
+            date_gmt = date,
+            modified_gmt = self.rest_date(time.gmtime(post['modified'])),
+            link = post['link'],
+            comment_status = post['mt_allow_comments'] and 'open' or 'closed',
+            ping_status = post['mt_allow_pings'] and 'open' or 'closed',
+        )
+        if post['post_type'] == 'post':
+            result['categories'] = [k for name in post['categories']
+                    for k, v in self.categories.items() if v == name]
+        return result
+
+    def rest_edit(self, post, data):
+        """
+        Update post with the fields of REST API request data.
+        """
+        content = {}
+        if 'title' in data:
+            content['title'] = data['title']
+        if 'content' in data:
+            content['description'], sep, content['mt_text_more'] = \
+                    data['content'].partition('<!--more-->')
+        if 'excerpt' in data:
+            content['mt_excerpt'] = data['excerpt']
+        if 'ping_status' in data:
+            content['mt_allow_pings'] = int(data['ping_status'] == 'open')
+        if 'date_gmt' in data:
+            content['dateCreated'] = xmlrpclib.DateTime(
+                    time.strptime(data['date_gmt'], '%Y-%m-%dT%H:%M:%S'))
+        status = data.get('status', post['publish'] and 'publish')
+        publish = status == 'publish'
+        if 'categories' in data and post['post_type'] == 'post':
+            for cat_id in data['categories']:
+                if int(cat_id) not in self.categories:
+                    raise RestFault(400, 'rest_invalid_param',
+                            'Invalid parameter(s): categories')
+            post['categories'] = [self.categories[int(cat_id)]
+                    for cat_id in data['categories']]
+        self.edit(post, content, publish)
+
+    def rest_getPosts(self, query, data, headers, route):
+        post_type = route[:-1]
+        posts = [v for v in self.posts.values() if v['post_type'] == post_type]
+        status = query.get('status', 'publish')
+        if status != 'any':
+            statuses = status.split(',')
+            posts = [v for v in posts
+                    if (v['publish'] and 'publish' or 'draft') in statuses]
+        orderby = query.get('orderby', 'date')
+        if orderby == 'modified':
+            key = lambda v: (v['modified'], int(v['postid']))
+        elif orderby == 'id':
+            key = lambda v: int(v['postid'])
+        else:
+            key = lambda v: (str(v['dateCreated']), int(v['postid']))
+        posts.sort(key=key, reverse=query.get('order', 'desc') == 'desc')
+        return 200, [self.rest_post(v) for v in self.rest_page(posts, query)]
+
+    def rest_newPost(self, query, data, headers, route):
+        post_id = self.new({}, route[:-1], False)
+        post = self.posts[post_id]
+        try:
+            self.rest_edit(post, data)
+        except RestFault:
+            del self.posts[post_id]
+            raise
+        return 201, self.rest_post(post)
+
+    def rest_getPost(self, query, data, headers, route, post_id):
+        return 200, self.rest_post(self.rest_get(post_id, route[:-1]))
+
+    def rest_editPost(self, query, data, headers, route, post_id):
+        post = self.rest_get(post_id, route[:-1])
+        self.rest_edit(post, data)
+        return 200, self.rest_post(post)
+
+    def rest_deletePost(self, query, data, headers, route, post_id):
+        post = self.rest_get(post_id, route[:-1])
+        del self.posts[int(post_id)]
+        return 200, self.rest_post(post)
+
+    def rest_getCategories(self, query, data, headers):
+        return 200, self.rest_page([dict(id=k, name=v, description='')
+                for k, v in sorted(self.categories.items())], query)
+
+    def rest_newCategory(self, query, data, headers):
+        if data['name'] in self.categories.values():
+            raise RestFault(400, 'term_exists',
+                    'A term with the name provided already exists.')
+        cat_id = self.new_id()
+        self.categories[cat_id] = data['name']
+        return 201, dict(id=cat_id, name=data['name'],
+                description=data.get('description', ''))
+
+    def rest_media(self, media):
+        """
+        Return the REST API object of media file struct media.
+        """
+        return dict(
+            id = int(media['attachment_id']),
+            source_url = media['link'],
+            title = dict(rendered=media['title']),
+            post = media['parent'] or None,
+            mime_type = media['type'],
+            date_gmt = self.rest_date(time.strptime(
+                    str(media['date_created_gmt']), '%Y%m%dT%H:%M:%S')),
+            media_details = dict(media['metadata']),
+        )
+
+    def rest_getMedia(self, query, data, headers):
+        items = sorted(self.media.values(),
+                key=lambda v: int(v['attachment_id']), reverse=True)
+        if 'parent' in query:
+            items = [v for v in items if v['parent'] == int(query['parent'])]
+        if 'mime_type' in query:
+            items = [v for v in items if v['type'] == query['mime_type']]
+        if 'media_type' in query:
+            items = [v for v in items
+                    if v['type'].split('/')[0] == query['media_type']]
+        return 200, [self.rest_media(v) for v in self.rest_page(items, query)]
+
+    def rest_newMedia(self, query, data, headers):
+        mo = re.search(r'filename="?([^";]+)"?',
+                headers.get('content-disposition', ''))
+        if not mo:
+            raise RestFault(400, 'rest_upload_no_content_disposition',
+                    'No Content-Disposition supplied.')
+        if not data:
+            raise RestFault(400, 'rest_upload_no_data', 'No data supplied.')
+        filename = self.new_media(os.path.basename(mo.group(1)),
+                headers.get('content-type', ''), data)
+        return 201, self.rest_media(self.media[filename])
+
+    def rest_getUser(self, query, data, headers):
+        user = base64.b64decode(
+                headers['authorization'].split()[1]).split(':')[0]
+        return 200, dict(id=1, first_name='Fake', last_name='WordPress',
+                nickname=user, email='%s@localhost' % user)
+
+    # fakewp.*
+
+    def fakewp_getStats(self):
+        return self.server.stats.get()
+
+    def fakewp_resetStats(self):
+        self.server.stats.reset()
+        return True
+
+
+class Server(SocketServer.ThreadingMixIn,
+        SimpleXMLRPCServer.SimpleXMLRPCServer):
+    """
+    Fake WordPress XML-RPC server.
+    latency is the delay in seconds added to each HTTP request, bandwidth
+    limits transfers to bytes per second (None for unlimited), fault_rate
+    is the probability an XML-RPC call fails with a fault, drop_rate
+    the probability a request is dropped without a response and
+    busy_rate the probability a request is refused with HTTP 503.
+    Requests are also refused with HTTP 503 while more than capacity
+    (if not None) requests are in progress. If gzip is False compressed
+    requests fail with a parse error fault and responses are not
+    compressed. If split_write is True response headers are sent
+    SPLIT_WRITE_DELAY seconds before response bodies.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128    # Accept bursts of concurrent connections.
+
+    def __init__(self, address, latency=0, bandwidth=None, fault_rate=0,
+            drop_rate=0, multicall=True, seed=None, verbose=False,
+            busy_rate=0, capacity=None, gzip=True, split_write=False):
+        SimpleXMLRPCServer.SimpleXMLRPCServer.__init__(self, address,
+                requestHandler=RequestHandler, logRequests=verbose,
+                allow_none=True)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.fault_rate = fault_rate
+        self.drop_rate = drop_rate
+        self.busy_rate = busy_rate
+        self.capacity = capacity
+        self.gzip = gzip
+        self.split_write = split_write
+        self.in_progress = 0    # Requests being processed.
+        self.verbose = verbose
+        self.stats = Stats()
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.url = 'http://%s:%d/xmlrpc.php' % self.server_address
+        self.rest_url = 'http://%s:%d/wp-json' % self.server_address
+        self.blog = FakeWordPress('http://%s:%d' % self.server_address, self)
+        self.register_instance(self.blog)
+        self.register_introspection_functions()
+        if multicall:
+            self.register_multicall_functions()
+
+    def enter(self):
+        """
+        Start processing a request, return False if the server is over
+        capacity.
+        """
+        self.random_lock.acquire()
+        try:
+            self.in_progress += 1
+            return self.capacity is None or self.in_progress <= self.capacity
+        finally:
+            self.random_lock.release()
+
+    def leave(self):
+        self.random_lock.acquire()
+        try:
+            self.in_progress -= 1
+        finally:
+            self.random_lock.release()
+
+    def inject(self, rate):
+        """
+        Return True with probability rate.
+        """
+        if not rate:
+            return False
+        self.random_lock.acquire()
+        try:
+            return self.random.random() < rate
+        finally:
+            self.random_lock.release()
+
+    def start(self):
+        """
+        Serve requests in a background thread.
+        """
+        t = threading.Thread(target=self.serve_forever)
+        t.setDaemon(True)
+        t.start()
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='usage: %prog [OPTIONS]',
+        description='Run a local stand-in WordPress XML-RPC server.')
+    parser.add_option('-b', '--bandwidth', type='int',
+        dest='bandwidth', default=None, metavar='BYTES',
+        help='limit transfers to BYTES per second')
+    parser.add_option('--busy-rate', type='float',
+        dest='busy_rate', default=0, metavar='RATE',
+        help='fraction of requests refused with HTTP 503')
+    parser.add_option('--capacity', type='int',
+        dest='capacity', default=None, metavar='REQUESTS',
+        help='refuse requests with HTTP 503 beyond REQUESTS in progress')
+    parser.add_option('--drop-rate', type='float',
+        dest='drop_rate', default=0, metavar='RATE',
+        help='fraction of requests dropped without a response')
+    parser.add_option('--fault-rate', type='float',
+        dest='fault_rate', default=0, metavar='RATE',
+        help='fraction of calls that return a fault')
+    parser.add_option('-l', '--latency', type='float',
+        dest='latency', default=0, metavar='SECONDS',
+        help='delay added to each request')
+    parser.add_option('--no-gzip',
+        action='store_false', dest='gzip', default=True,
+        help='do not support gzip compressed requests and responses')
+    parser.add_option('--no-multicall',
+        action='store_false', dest='multicall', default=True,
+        help='do not support system.multicall')
+    parser.add_option('-p', '--port', type='int',
+        dest='port', default=8080, metavar='PORT',
+        help='listen on PORT (default 8080)')
+    parser.add_option('--seed', type='int',
+        dest='seed', default=None, metavar='SEED',
+        help='failure injection random seed')
+    parser.add_option('--split-write',
+        action='store_true', dest='split_write', default=False,
+        help='send response headers and bodies separately')
+    parser.add_option('-v', '--verbose',
+        action='store_true', dest='verbose', default=False,
+        help='log requests')
+    options, args = parser.parse_args()
+    server = Server(('127.0.0.1', options.port), options.latency,
+            options.bandwidth, options.fault_rate, options.drop_rate,
+            options.multicall, options.seed, options.verbose,
+            options.busy_rate, options.capacity, options.gzip,
+            options.split_write)
+    sys.stderr.write('%s: serving %s and %s\n' % (PROG, server.url,
+            server.rest_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""
+wordpresslib transport tests against a local fakewp server that sends
+response headers and bodies separately (split writes), so the clients
+must cope with responses that arrive in more than one read.
+
+    python bench/test_transport.py
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+import httplib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+import wordpresslib
+import fakewp
+import bench_post
+
+
+class SplitWriteTestCase(unittest.TestCase):
+    """
+    Starts a split write fakewp server and writes media files to a
+    temporary directory.
+    """
+
+    def setUp(self):
+        self.server = fakewp.Server(('127.0.0.1', 0), split_write=True)
+        self.server.start()
+        self.tmpdir = tempfile.mkdtemp(prefix='test_transport')
+
+    def tearDown(self):
+        # Close the clients' keep-alive connections to end the server's
+        # request handler threads.
+        wordpresslib.connectionPool.clear()
+        wordpresslib.asyncConnectionPool.clear()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+    def media_file(self, name, size):
+        filename = os.path.join(self.tmpdir, name)
+        f = open(filename, 'wb')
+        try:
+            f.write(os.urandom(size))
+        finally:
+            f.close()
+        return filename
+
+
+class ReadBodyTestCase(unittest.TestCase):
+    """
+    AsyncTransport response bodies read in several pieces, an empty read
+    is more data to come unless the server has closed the connection.
+    """
+
+    def read(self, headers, pieces):
+        transport = wordpresslib.AsyncTransport('http://127.0.0.1/')
+        conn = wordpresslib.AsyncConnection(None)
+        conn.status = 200
+        conn.headers = headers
+        for i, data in enumerate(pieces):
+            eof = data is None
+            if transport._readBody(conn, data or '', eof):
+                return ''.join(conn.chunks), i
+        return None, None
+
+    def test_content_length(self):
+        headers = {'content-length': '6'}
+        self.assertEqual(self.read(headers, ['', 'abc', '', 'def']),
+                ('abcdef', 3))
+        self.assertRaises(httplib.IncompleteRead, self.read, headers,
+                ['', 'abc', None])
+
+    def test_chunked(self):
+        headers = {'transfer-encoding': 'chunked'}
+        self.assertEqual(self.read(headers,
+                ['', '3\r\nabc\r', '', '\n3\r\ndef\r\n0\r\n', '\r\n']),
+                ('abcdef', 4))
+        self.assertRaises(httplib.IncompleteRead, self.read, headers,
+                ['', '3\r\nabc\r\n', None])
+
+    def test_no_length(self):
+        self.assertEqual(self.read({}, ['', 'abc', '', 'def', None]),
+                ('abcdef', 4))
+
+
+class ClientTests(object):
+    """
+    Tests of the client() and async_client() WordPress clients.
+    """
+
+    def new_post(self, client, i):
+        post = wordpresslib.WordPressPost()
+        post.title = 'Post %d' % i
+        post.description = '<p>Post %d.</p>' % i
+        return client.newPost(post, True)
+
+    def test_calls(self):
+        client = self.client()
+        post_id = self.new_post(client, 0)
+        self.assertEqual(client.getPost(post_id).title, 'Post 0')
+        # Large enough for a gzip compressed response.
+        for i in range(1, 20):
+            self.new_post(client, i)
+        self.assertEqual(len(list(client.getRecentPosts(20))), 20)
+
+    def test_async_media(self):
+        client = self.async_client()
+        sizes = (10, 1000, 100000)
+        calls = [client.newMediaObject(self.media_file('m%d.png' % size,
+                size)) for size in sizes]
+        client.run()
+        for call, size in zip(calls, sizes):
+            url = call.get()
+            self.assertEqual(len(self.server.blog.media_data(
+                    url.rsplit('/', 1)[1])), size)
+
+
+class XmlRpcTestCase(ClientTests, SplitWriteTestCase):
+
+    def client(self):
+        return wordpresslib.WordPressClient(self.server.url, 'admin',
+                'secret', readTimeout=5)
+
+    def async_client(self):
+        return wordpresslib.AsyncWordPressClient(self.server.url, 'admin',
+                'secret', readTimeout=5)
+
+    def test_async_calls(self):
+        client = self.async_client()
+        calls = [self.new_post(client, i) for i in range(20)]
+        client.run()
+        post_ids = [call.get() for call in calls]
+        self.assertEqual(len(set(post_ids)), 20)
+        self.assertEqual(client.getPost(post_ids[0]).get().title, 'Post 0')
+        self.assertEqual(len(client.getRecentPosts(20).get()), 20)
+
+
+class RestTestCase(ClientTests, SplitWriteTestCase):
+    """
+    REST API clients, only newMediaObject() is asynchronous.
+    """
+
+    def client(self):
+        return wordpresslib.WordPressRestClient(self.server.rest_url,
+                'admin', 'secret', readTimeout=5)
+
+    def async_client(self):
+        return wordpresslib.AsyncWordPressRestClient(self.server.rest_url,
+                'admin', 'secret', readTimeout=5)
+
+
+class BlogpostTestCase(SplitWriteTestCase):
+    """
+    'blogpost.py post' with concurrent media uploads.
+    """
+
+    api = 'xmlrpc'
+
+    def conf_file(self):
+        conf_file = os.path.join(self.tmpdir, 'blogpost.conf')
+        if self.api == 'rest':
+            url = self.server.rest_url
+        else:
+            url = self.server.url
+        bench_post.write_file(conf_file,
+                'API = %r\nURL = %r\nUSERNAME = %r\nPASSWORD = %r\n' %
+                (self.api, url, 'admin', 'secret'))
+        return conf_file
+
+    def test_post(self):
+        site = os.path.join(self.tmpdir, 'site')
+        os.mkdir(site)
+        blog_files = bench_post.make_site(site, 3, 4, 50000)
+        result = bench_post.run_pass(self.server, self.conf_file(),
+                blog_files, ['--media-jobs', '4'])
+        self.assertEqual(result['status'], 0)
+        self.assertEqual(len(self.server.blog.media), 12)
+        self.assertEqual(len(self.server.blog.posts), 3)
+
+
+class RestBlogpostTestCase(BlogpostTestCase):
+
+    api = 'rest'
+
+
+if __name__ == '__main__':
+    unittest.main()
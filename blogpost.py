@@ -8,10 +8,6 @@ Email:     srackham@gmail.com
 
 """
 
-# Suppress warning: "the md5 module is deprecated; use hashlib instead"
-import warnings
-warnings.simplefilter('ignore',DeprecationWarning)
-
 import sys
 import os
 import time
@@ -19,15 +15,31 @@ import StringIO
 import re
 import xmlrpclib
 import pickle
-import md5
+import sqlite3
+import hashlib
+import tempfile
 import calendar
 import subprocess
+import glob
+import signal
+import socket
+import select
+import urllib2
+import urlparse
+import multiprocessing
+import threading
+import json
+import copy
+from multiprocessing.pool import ThreadPool
+# time.strptime() is not thread-safe until _strptime has been imported
+# (Python issue 7980).
+import _strptime
 
 import wordpresslib # http://www.blackbirdblog.it/programmazione/progetti/28
 import asciidocapi
 
 
-VERSION = '0.9.6'
+VERSION = '0.9.7'
 PROG = os.path.basename(os.path.splitext(__file__)[0])
 
 
@@ -43,6 +55,23 @@ URL = None      # Wordpress XML-RPC URL (don't forget to append /xmlrpc.php)
 USERNAME = None # Wordpress login name.
 PASSWORD = None # Wordpress password.
 
+# Wordpress API: 'xmlrpc' or 'rest'. With 'rest' URL is the REST API root
+# (e.g. http://example.com/wp-json) and PASSWORD an application password.
+API = 'xmlrpc'
+
+# Rendered HTML cache directory (disabled if None). The cache can be
+# shared by multiple users and machines.
+RENDER_CACHE_DIR = None
+RENDER_CACHE_SIZE = 256*1024*1024   # Maximum render cache size in bytes.
+
+# Site index database file (disabled if None). The index replaces the
+# per blog file .blogpost cache files.
+SITE_INDEX_FILE = None
+
+# Seconds the weblog category list kept in the site index is used before
+# it is fetched again (names that are not found are always refetched).
+CATEGORIES_TTL = 24*60*60
+
 
 ######################################################################
 # End of configuration file parameters.
@@ -63,14 +92,18 @@ class Namespace(object):
     # This is here so unpickling <0.9.1 cache files still works.
     def __setstate__(self, state):
         self.categories = []        # Attribute added at version 0.9.1
+        self.signature = None       # Attribute added at version 0.9.7
+        self.stat = None            # Attribute added at version 0.9.7
+        self.dependencies = {}      # Attribute added at version 0.9.7
         self.__dict__.update(state)
         self.__class__ = Cache      # Cache class name change in 0.9.1
 
 def errmsg(msg):
-    sys.stderr.write(('%s: %s\n' % (PROG,msg)).encode(sys.stderr.encoding))
+    sys.stderr.write(('%s: %s\n' % (PROG,msg)).encode(sys.stderr.encoding or 'utf-8'))
 
 def infomsg(msg):
-    print '%s: %s' % (PROG,msg)
+    # A single write so messages from concurrent threads do not interleave.
+    sys.stdout.write('%s: %s\n' % (PROG,msg))
 
 def warning(msg):
     infomsg('WARNING: '+msg)
@@ -83,6 +116,19 @@ def verbose(msg):
     if OPTIONS.verbose or OPTIONS.dry_run:
         infomsg(msg)
 
+def timed(phase, func, *args, **kwargs):
+    """
+    Return func(*args, **kwargs). If the --timings option is set the
+    call's elapsed and CPU times are added to phase.
+    """
+    if TIMINGS is None:
+        return func(*args, **kwargs)
+    wall, cpu = time.time(), time.clock()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        TIMINGS.add(phase, time.time() - wall, time.clock() - cpu)
+
 def load_conf(conf_file):
     """
     Import optional configuration file which is used to override global
@@ -118,6 +164,15 @@ def shell(cmd):
 ###########
 
 OPTIONS = None  # Parsed command-line options OptionParser object.
+ASCIIDOC_API = None # Preloaded asciidocapi.AsciiDocAPI (see asciidoc_api()).
+ASCIIDOC_LOCK = threading.Lock()    # Guards loading ASCIIDOC_API.
+RENDER_CACHE = None # RenderCache object (None if render caching disabled).
+BACKEND_SIGNATURES = {}     # Memoized backend_signature() values.
+TIMINGS = None  # Timings object (None if --timings is not set).
+SITE_INDEX = None   # SiteIndex object (None if the site index is disabled).
+CATEGORIES = None   # CategoryCatalogue shared by all blog files.
+MEDIA_STORE = None  # MediaStore shared by all blog files.
+MEDIA_LIBRARY = None    # MediaLibrary (None if --reuse-media is not set).
 
 
 ####################
@@ -126,30 +181,329 @@ OPTIONS = None  # Parsed command-line options OptionParser object.
 
 class BlogpostException(Exception): pass
 
+# The document conversion functions are module-level (rather than
+# Blogpost methods) so they can be run in worker processes.
+
+def docformat(blog_file):
+    """
+    Return blog_file document format: 'html', 'rimu' or 'asciidoc'.
+    """
+    if os.path.splitext(blog_file)[1].lower() in ('.htm','.html'):
+        return 'html'
+    elif os.path.splitext(blog_file)[1].lower() == '.rmu':
+        return 'rimu'
+    else:
+        return 'asciidoc'
+
+def is_blog_file(filename):
+    """
+    Return True if filename has an AsciiDoc, Rimu Markup or HTML blog
+    file name extension.
+    """
+    return os.path.splitext(filename)[1].lower() in ('.txt', '.adoc',
+            '.asciidoc', '.asc', '.rmu', '.htm', '.html')
+
+def asciidoc_api():
+    """
+    Return an asciidocapi.AsciiDocAPI with cleared options and attributes.
+    asciidoc is imported once per process and each document is rendered
+    in a forked child of this process, so the asciidoc module does not
+    have to be reloaded for every document. Each call returns a copy of
+    the preloaded ASCIIDOC_API (sharing its asciidoc module) so threads
+    can set options and render concurrently.
+    """
+    global ASCIIDOC_API
+    ASCIIDOC_LOCK.acquire()
+    try:
+        if ASCIIDOC_API is None:
+            ASCIIDOC_API = asciidocapi.AsciiDocAPI(fork=True)
+    finally:
+        ASCIIDOC_LOCK.release()
+    asciidoc = copy.copy(ASCIIDOC_API)
+    asciidoc.options = asciidocapi.Options()
+    asciidoc.attributes = {}
+    asciidoc.messages = []
+    return asciidoc
+
+def asciidoc2html(blog_file, doctype):
+    """
+    Convert AsciiDoc blog_file to Wordpress compatible HTML.
+    """
+    asciidoc = asciidoc_api()
+    asciidoc.options('--no-header-footer')
+    asciidoc.options('--doctype', doctype)
+    asciidoc.options('--attribute', 'blogpost')
+    for attr in OPTIONS.attributes:
+        asciidoc.options('--attribute', attr)
+    for opt in OPTIONS.asciidoc_opts:
+        print '%r' % opt
+        opt = opt.partition(' ')
+        if opt[2]:
+            s = opt[2]
+            s = s.strip()
+            if (s.startswith('"') and s.endswith('"')
+                    or s.startswith("'") and s.endswith("'")):
+                # Strip quotes.
+                s = s[1:-1]
+            asciidoc.options(opt[0], s)
+        else:
+            asciidoc.options(opt[0])
+    if OPTIONS.verbose > 1:
+        asciidoc.options('--verbose')
+
+    if OPTIONS.asciidoc == 'asciidoctor':
+        args = ''
+        for opt in asciidoc.options.values:
+            args = args + opt[0] + ' '
+            if not opt[1] is None:
+                args = args + opt[1] + ' '
+        result = shell('asciidoctor %s -o - "%s"' % (args, blog_file))[0]
+        result.decode('utf8')   # Check the output is valid UTF-8.
+        return result
+    else:
+        verbose('asciidoc: options: %r' % asciidoc.options.values)
+        outfile = StringIO.StringIO()
+        asciidoc.execute(blog_file, outfile, backend='wordpress')
+        result = outfile.getvalue()
+        result.decode('utf8')   # Check the output is valid UTF-8.
+        for s in asciidoc.messages:
+            infomsg('asciidoc: %s' % s)
+        return result
+
+def rimu2html(blog_file):
+    """
+    Convert Rimu Markup blog_file to HTML.
+    """
+    return shell('rimuc "%s"' % blog_file)[0]
+
+def file_checksum(filename):
+    """
+    Return MD5 checksum of file filename.
+    The file is read in chunks so memory use does not depend on its size.
+    """
+    h = hashlib.md5()
+    f = open(filename, 'rb')
+    try:
+        while True:
+            chunk = f.read(1024*1024)
+            if not chunk: break
+            h.update(chunk)
+    finally:
+        f.close()
+    return h.hexdigest()
+
+def url_checksum(url):
+    """
+    Return MD5 checksum of the file at url.
+    The file is downloaded in chunks so memory use does not depend on its
+    size.
+    """
+    handlers = []
+    if OPTIONS.proxy:
+        handlers.append(urllib2.ProxyHandler(
+            {'http': OPTIONS.proxy, 'https': OPTIONS.proxy}))
+    timeout = OPTIONS.read_timeout
+    if timeout is None:
+        timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+    h = hashlib.md5()
+    f = urllib2.build_opener(*handlers).open(url, timeout=timeout)
+    try:
+        while True:
+            chunk = f.read(1024*1024)
+            if not chunk: break
+            h.update(chunk)
+    finally:
+        f.close()
+    return h.hexdigest()
+
+def file_stat(filename):
+    """
+    Return file filename stat signature (size, modification time, inode).
+    """
+    st = os.stat(filename)
+    return (st.st_size, st.st_mtime, st.st_ino)
+
+def stat_checksum(filename, stat, checksum):
+    """
+    Return (stat, checksum) tuple for file filename, where stat and
+    checksum are the file's previously saved stat signature and MD5
+    checksum. The file is only read if its stat signature has changed.
+    """
+    current = file_stat(filename)
+    if checksum is not None and current == stat:
+        return (stat, checksum)
+    return (current, timed('checksum', file_checksum, filename))
+
+def read_file(filename):
+    """
+    Return the contents of file filename.
+    """
+    f = open(filename, 'rb')
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+def read_cache_file(cache_file):
+    """
+    Return Cache unpickled from .blogpost cache file cache_file.
+    """
+    f = open(cache_file, 'rb')
+    try:
+        return pickle.load(f)
+    finally:
+        f.close()
+
+def include_files(blog_file):
+    """
+    Return list of files included by AsciiDoc blog_file include:: and
+    include1:: macros (recursively). Include targets are relative to the
+    including file; attribute references are resolved from -a options
+    and preceding attribute entries, targets that cannot be resolved are
+    skipped.
+    """
+    attrs = {}
+    for attr in OPTIONS.attributes:
+        name, _, value = attr.partition('=')
+        attrs[name] = value
+    result = []
+    def scan(filename):
+        for line in open(filename):
+            mo = re.match(r'^:(?P<name>[-\w]+):\s+(?P<value>.*?)\s*$', line)
+            if mo:
+                attrs.setdefault(mo.group('name'), mo.group('value'))
+                continue
+            mo = re.match(r'^include1?::(?P<target>\S.*?)\[.*\]\s*$', line)
+            if not mo:
+                continue
+            target = re.sub(r'{([-\w]+)}',
+                    lambda m: attrs.get(m.group(1), m.group(0)),
+                    mo.group('target'))
+            if '{' in target:
+                verbose('unresolved include: %s: %s' % (filename, target))
+                continue
+            target = os.path.join(os.path.dirname(filename), target)
+            target = os.path.abspath(target)
+            if target not in result and os.path.isfile(target):
+                result.append(target)
+                scan(target)
+    scan(blog_file)
+    return result
+
+def backend_signature(fmt):
+    """
+    Return a string that changes when the HTML generated for document
+    format fmt could change: the asciidoc implementation (or rimuc)
+    version and the wordpress backend configuration files.
+    """
+    if fmt in BACKEND_SIGNATURES:
+        return BACKEND_SIGNATURES[fmt]
+    h = hashlib.sha1()
+    if fmt == 'rimu':
+        cmd = 'rimuc'
+    else:
+        cmd = OPTIONS.asciidoc
+    if cmd == 'asciidoc':
+        asciidoc = asciidoc_api()
+        h.update('asciidoc %s\0' % asciidoc.asciidoc.VERSION)
+        dirs = [os.path.dirname(asciidoc.cmd), '/etc/asciidoc']
+        home_dir = os.environ.get('HOME')
+        if home_dir is not None:
+            dirs.insert(0, os.path.join(home_dir, '.asciidoc'))
+        for d in dirs:
+            for conf in ('backends/wordpress/wordpress.conf',
+                    'wordpress.conf', 'html4.conf', 'asciidoc.conf'):
+                # Hash the contents, not the location, of the file.
+                filename = os.path.join(d, conf)
+                if os.path.isfile(filename):
+                    h.update('%s\0%s\0' % (conf, read_file(filename)))
+    else:
+        path = asciidocapi.find_in_path(cmd)
+        if path:
+            st = os.stat(path)
+            h.update('%s %s %d %d\0' % (cmd, path, st.st_size, st.st_mtime))
+    BACKEND_SIGNATURES[fmt] = h.hexdigest()
+    return BACKEND_SIGNATURES[fmt]
+
+def render_key(blog_file, doctype):
+    """
+    Return render cache key for blog_file: a hash of everything that
+    determines the rendered HTML.
+    """
+    h = hashlib.sha1()
+    h.update('%s\0%s\0%s\0' % (VERSION, docformat(blog_file), doctype))
+    h.update('%r\0%r\0%s\0' %
+            (OPTIONS.attributes, OPTIONS.asciidoc_opts, OPTIONS.asciidoc))
+    h.update(backend_signature(docformat(blog_file)))
+    h.update(os.path.basename(blog_file) + '\0')
+    h.update(read_file(blog_file))
+    if docformat(blog_file) == 'asciidoc':
+        # Include file names relative to the blog file so the key does
+        # not change when the blog is moved.
+        blog_dir = os.path.dirname(os.path.abspath(blog_file))
+        for filename in include_files(blog_file):
+            h.update('\0%s\0' % os.path.relpath(filename, blog_dir))
+            h.update(read_file(filename))
+    return h.hexdigest()
+
+def render(blog_file, doctype):
+    """
+    Return blog_file converted to Wordpress compatible HTML.
+    AsciiDoc and Rimu conversions are cached in RENDER_CACHE.
+    """
+    fmt = docformat(blog_file)
+    if fmt == 'html':
+        return read_file(blog_file)
+    key = None
+    if RENDER_CACHE is not None:
+        key = render_key(blog_file, doctype)
+        html = RENDER_CACHE.get(key)
+        if html is not None:
+            verbose('render cache hit: %s' % blog_file)
+            return html
+    if fmt == 'rimu':
+        html = rimu2html(blog_file)
+    else:
+        html = asciidoc2html(blog_file, doctype)
+    if key is not None:
+        RENDER_CACHE.put(key, html)
+    return html
+
 class Media(object):
 
     def __init__(self, filename):
         self.filename = filename # Client file name.
         self.checksum = None     # Client file MD5 checksum.
+        self.stat = None         # Client file stat signature (see file_stat()).
         self.url = None          # WordPress media file URL.
 
-    def upload(self, blog):
+    def __setstate__(self, state):
+        self.stat = None         # Attribute added at version 0.9.7
+        self.__dict__.update(state)
+
+    def check(self, blog):
         """
-        Upload media file to WordPress server if it is new or has changed.
+        Return the file's current (stat, checksum) tuple (see
+        stat_checksum()) if it is new or has changed since it was
+        uploaded (or the --force-media option is set), else return None.
         """
-        checksum = md5.new(open(self.filename,'rb').read()).hexdigest()
+        stat, checksum = stat_checksum(self.filename, self.stat, self.checksum)
         if not (blog.options.force_media
                 or self.checksum is None
                 or self.checksum != checksum):
             infomsg('skipping unmodified: %s' % self.filename)
-        else:
-            infomsg('uploading: %s...' % self.filename)
-            if not blog.options.dry_run:
-                self.url =  blog.server.newMediaObject(self.filename)
-                infomsg('url: %s' % self.url)
-            else:
-                self.url = self.filename  # Dummy value for debugging.
-            self.checksum = checksum
+            self.stat = stat
+            return None
+        return (stat, checksum)
+
+    def set_url(self, url, stat, checksum):
+        """
+        Record that the file with stat signature stat and checksum has
+        been uploaded to url.
+        """
+        self.url = url
+        self.checksum = checksum
+        self.stat = stat
 
 
 class Cache(Namespace):
@@ -159,10 +513,1038 @@ class Cache(Namespace):
     pass
 
 
+class Journal(object):
+    """
+    Write-ahead journal of a blog file's server operations that are not
+    yet recorded in its cache: post creation intents, created post IDs
+    and uploaded media files. Each record is a line of JSON that is
+    synced to disk before the journal returns, so an interrupted post
+    can be resumed without repeating completed operations. The journal
+    file is deleted once the cache has been saved.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def exists(self):
+        return os.path.isfile(self.filename)
+
+    def records(self):
+        """
+        Return the list of journal record dictionaries (a partly written
+        last record is ignored).
+        """
+        if not self.exists():
+            return []
+        result = []
+        for line in open(self.filename):
+            try:
+                result.append(json.loads(line))
+            except ValueError:
+                break
+        return result
+
+    def append(self, op, **fields):
+        """
+        Durably append a record for operation op.
+        """
+        fields['op'] = op
+        f = open(self.filename, 'ab')
+        try:
+            f.write(json.dumps(fields, sort_keys=True) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+
+    def delete(self):
+        if self.exists():
+            os.unlink(self.filename)
+
+
+class RenderCache(object):
+    """
+    Content addressed on-disk cache of rendered HTML.
+
+    Entries are files named by their render_key() in the cache directory
+    and are written atomically, so a cache directory can be shared
+    between concurrent processes and machines. Entry modification times
+    record their last use; when the cache grows beyond max_size bytes
+    the least recently used entries are evicted.
+
+    The cache size is only measured (by walking the cache directory)
+    on the first put() and when the running total of the sizes since
+    then exceeds max_size. Eviction frees an extra tenth of max_size so
+    the next walk is not due for a while.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.size = None    # Estimated cache size (None if unknown).
+        # Entries are created with the permissions of a normal file so
+        # users sharing the cache can read each other's entries.
+        umask = os.umask(0)
+        os.umask(umask)
+        self.mode = 0666 & ~umask
+
+    def entry_file(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        Return cached HTML or None if there is no entry for key.
+        """
+        entry = self.entry_file(key)
+        try:
+            html = read_file(entry)
+            os.utime(entry, None)   # Mark as recently used.
+        except (IOError, OSError):
+            return None
+        return html
+
+    def put(self, key, html):
+        """
+        Add entry for key, then evict entries if the cache is too big.
+        """
+        entry = self.entry_file(key)
+        try:
+            if not os.path.isdir(os.path.dirname(entry)):
+                os.makedirs(os.path.dirname(entry))
+        except OSError:
+            pass    # Created by another process.
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(entry))
+            try:
+                os.write(fd, html)
+            finally:
+                os.close(fd)
+            os.chmod(tmp, self.mode)
+            os.rename(tmp, entry)
+        except (IOError, OSError), e:
+            warning('render cache: %s' % e)
+            return
+        if self.size is not None:
+            self.size += len(html)
+        if self.size is None or self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until the total size is no
+        more than nine tenths of self.max_size if it is more than
+        self.max_size. Update the estimated cache size.
+        """
+        entries = []
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for name in filenames:
+                entry = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(entry)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry))
+                total += st.st_size
+        entries.sort()
+        limit = total
+        if total > self.max_size:
+            limit = self.max_size * 9 / 10
+        for mtime, size, entry in entries:
+            if total <= limit:
+                break
+            verbose('render cache: evicting: %s' % entry)
+            try:
+                os.unlink(entry)
+            except OSError:
+                pass    # Deleted by another process.
+            total -= size
+        self.size = total
+
+
+class SiteIndex(object):
+    """
+    SQLite database of blog file cache data (see Cache) for a whole site,
+    a faster and queryable alternative to per blog file .blogpost cache
+    files. Posts are keyed by absolute blog file name. The index also
+    holds the WordPress server post metadata fetched by the sync command.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS posts (
+            blog_file TEXT PRIMARY KEY,
+            id INTEGER,
+            url TEXT,
+            title TEXT,
+            status TEXT,
+            post_type TEXT,
+            doctype TEXT,
+            created_at INTEGER,
+            updated_at INTEGER,
+            checksum TEXT,
+            stat TEXT,
+            signature TEXT,
+            dependencies TEXT
+        );
+        CREATE INDEX IF NOT EXISTS posts_id ON posts (id);
+        CREATE INDEX IF NOT EXISTS posts_status ON posts (status, post_type);
+        CREATE TABLE IF NOT EXISTS media (
+            blog_file TEXT,
+            src TEXT,
+            filename TEXT,
+            checksum TEXT,
+            stat TEXT,
+            url TEXT,
+            PRIMARY KEY (blog_file, src)
+        );
+        CREATE INDEX IF NOT EXISTS media_src ON media (src);
+        CREATE INDEX IF NOT EXISTS media_filename ON media (filename);
+        CREATE TABLE IF NOT EXISTS media_store (
+            checksum TEXT PRIMARY KEY,
+            url TEXT,
+            filename TEXT,
+            uploaded_at INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS categories (
+            blog_file TEXT,
+            name TEXT,
+            PRIMARY KEY (blog_file, name)
+        );
+        CREATE INDEX IF NOT EXISTS categories_name ON categories (name);
+        CREATE TABLE IF NOT EXISTS remote_posts (
+            id INTEGER PRIMARY KEY,
+            post_type TEXT,
+            title TEXT,
+            status TEXT,
+            url TEXT,
+            created_at INTEGER,
+            modified_at INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS remote_posts_type
+            ON remote_posts (post_type, created_at);
+        CREATE TABLE IF NOT EXISTS remote_categories (
+            id INTEGER,
+            name TEXT,
+            PRIMARY KEY (id, name)
+        );
+        CREATE INDEX IF NOT EXISTS remote_categories_name
+            ON remote_categories (name);
+        CREATE TABLE IF NOT EXISTS properties (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        );
+        '''
+
+    # query() filter names and the posts table columns they match.
+    QUERY_COLUMNS = {
+        'file': 'blog_file',
+        'title': 'title',
+        'url': 'url',
+        'status': 'status',
+        'type': 'post_type',
+        'doctype': 'doctype',
+    }
+
+    def __init__(self, filename):
+        """
+        Open the index database file filename, creating it if it does not
+        exist (in which case self.created is True).
+        """
+        self.filename = filename
+        self.created = not os.path.isfile(filename)
+        # A single connection is shared by the upload threads.
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.text_factory = str
+        # Also adds tables missing from indexes created by older versions.
+        self.db.executescript(self.SCHEMA)
+        if self.db.execute('SELECT 1 FROM media_store LIMIT 1').fetchone() is None:
+            # Fill the media store of an index created by an older version.
+            self.db.execute('INSERT OR IGNORE INTO media_store'
+                    ' SELECT checksum, url, filename, NULL FROM media'
+                    ' WHERE checksum IS NOT NULL AND url IS NOT NULL')
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def get(self, blog_file):
+        """
+        Return Cache for blog_file or None if blog_file is not indexed.
+        """
+        self.lock.acquire()
+        try:
+            row = self.db.execute('SELECT id, url, title, status, post_type,'
+                    ' doctype, created_at, updated_at, checksum, stat,'
+                    ' signature, dependencies FROM posts WHERE blog_file = ?',
+                    (blog_file,)).fetchone()
+            if row is None:
+                return None
+            media = {}
+            for src, filename, checksum, stat, url in self.db.execute(
+                    'SELECT src, filename, checksum, stat, url FROM media'
+                    ' WHERE blog_file = ?', (blog_file,)):
+                media_obj = Media(filename)
+                media_obj.checksum = checksum
+                media_obj.stat = self.load_stat(stat)
+                media_obj.url = url
+                media[src] = media_obj
+            categories = [name for (name,) in self.db.execute(
+                    'SELECT name FROM categories WHERE blog_file = ?'
+                    ' ORDER BY rowid', (blog_file,))]
+        finally:
+            self.lock.release()
+        dependencies = {}
+        for filename, (stat, checksum) in json.loads(row[11] or '{}').items():
+            dependencies[filename.encode('utf-8')] = \
+                    (stat and tuple(stat), checksum and checksum.encode('utf-8'))
+        return Cache(
+                id = row[0],
+                url = row[1],
+                title = row[2],
+                status = row[3],
+                post_type = row[4],
+                doctype = row[5],
+                created_at = row[6],
+                updated_at = row[7],
+                checksum = row[8],
+                stat = self.load_stat(row[9]),
+                signature = row[10],
+                dependencies = dependencies,
+                media = media,
+                categories = categories,
+            )
+
+    def put(self, blog_file, cache):
+        """
+        Add or replace the cache data for blog_file.
+        """
+        self.lock.acquire()
+        try:
+            try:
+                self.db.execute('DELETE FROM media WHERE blog_file = ?',
+                        (blog_file,))
+                self.db.execute('DELETE FROM categories WHERE blog_file = ?',
+                        (blog_file,))
+                self.db.execute('INSERT OR REPLACE INTO posts VALUES'
+                        ' (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (blog_file, cache.id, cache.url, cache.title,
+                        cache.status, cache.post_type, cache.doctype,
+                        cache.created_at, cache.updated_at, cache.checksum,
+                        self.dump_stat(cache.stat), cache.signature,
+                        json.dumps(cache.dependencies)))
+                self.db.executemany('INSERT INTO media VALUES'
+                        ' (?, ?, ?, ?, ?, ?)',
+                        [(blog_file, src, m.filename, m.checksum,
+                            self.dump_stat(m.stat), m.url)
+                            for src, m in cache.media.items()])
+                # Media imported from cache files join the media store.
+                self.db.executemany('INSERT OR IGNORE INTO media_store VALUES'
+                        ' (?, ?, ?, NULL)',
+                        [(m.checksum, m.url, m.filename)
+                            for m in cache.media.values()
+                            if m.checksum is not None and m.url is not None])
+                self.db.executemany('INSERT OR IGNORE INTO categories'
+                        ' VALUES (?, ?)',
+                        [(blog_file, name) for name in cache.categories])
+                self.db.commit()
+            except:
+                self.db.rollback()
+                raise
+        finally:
+            self.lock.release()
+
+    def delete(self, blog_file):
+        """
+        Delete blog_file from the index.
+        """
+        self.lock.acquire()
+        try:
+            for table in ('posts', 'media', 'categories'):
+                self.db.execute('DELETE FROM %s WHERE blog_file = ?' % table,
+                        (blog_file,))
+            self.db.commit()
+        finally:
+            self.lock.release()
+
+    def contains(self, blog_file):
+        self.lock.acquire()
+        try:
+            return self.db.execute('SELECT 1 FROM posts WHERE blog_file = ?',
+                    (blog_file,)).fetchone() is not None
+        finally:
+            self.lock.release()
+
+    def query(self, filters):
+        """
+        Return list of (blog_file, id, title, url, status, post_type,
+        categories) tuples for indexed posts matching all filters, a list
+        of (name, value) tuples. Names are 'id', 'category', 'media' (the
+        media file source or file name) and the QUERY_COLUMNS keys, values
+        other than id are glob patterns.
+        """
+        where = []
+        params = []
+        for name, value in filters:
+            if name == 'id':
+                where.append('id = ?')
+                params.append(int(value))
+            elif name == 'category':
+                where.append('blog_file IN (SELECT blog_file FROM categories'
+                        ' WHERE name GLOB ?)')
+                params.append(value)
+            elif name == 'media':
+                where.append('blog_file IN (SELECT blog_file FROM media'
+                        ' WHERE src GLOB ? OR filename GLOB ?)')
+                params += [value, value]
+            else:
+                where.append('%s GLOB ?' % self.QUERY_COLUMNS[name])
+                params.append(value)
+        sql = 'SELECT blog_file, id, title, url, status, post_type FROM posts'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY blog_file'
+        self.lock.acquire()
+        try:
+            result = []
+            for row in self.db.execute(sql, params).fetchall():
+                categories = [name for (name,) in self.db.execute(
+                        'SELECT name FROM categories WHERE blog_file = ?'
+                        ' ORDER BY rowid', (row[0],))]
+                result.append(row + (categories,))
+            return result
+        finally:
+            self.lock.release()
+
+    def import_cache_files(self, directory):
+        """
+        Import the .blogpost cache files in directory and its
+        subdirectories that are not already indexed.
+        Return the number of files imported.
+        """
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(directory):
+            # Map cache file names to the blog files they belong to.
+            blog_files = {}
+            for name in sorted(filenames, reverse=True):
+                if is_blog_file(name):
+                    blog_files[os.path.splitext(name)[0] + '.blogpost'] = name
+            for name in sorted(filenames):
+                if name not in blog_files:
+                    continue    # Not a cache file or no blog file.
+                cache_file = os.path.join(dirpath, name)
+                blog_file = os.path.abspath(
+                        os.path.join(dirpath, blog_files[name]))
+                if self.contains(blog_file):
+                    continue
+                verbose('importing cache: %s' % cache_file)
+                try:
+                    cache = read_cache_file(cache_file)
+                except Exception, e:
+                    warning('%s: %s' % (cache_file, e))
+                    continue
+                self.put(blog_file, cache)
+                count += 1
+        return count
+
+    def get_property(self, name, default=None):
+        self.lock.acquire()
+        try:
+            row = self.db.execute('SELECT value FROM properties WHERE name = ?',
+                    (name,)).fetchone()
+        finally:
+            self.lock.release()
+        if row is None:
+            return default
+        return json.loads(row[0])
+
+    def set_property(self, name, value):
+        self.lock.acquire()
+        try:
+            self.db.execute('INSERT OR REPLACE INTO properties VALUES (?, ?)',
+                    (name, json.dumps(value)))
+            self.db.commit()
+        finally:
+            self.lock.release()
+
+    def get_media_url(self, checksum):
+        """
+        Return the URL of the uploaded media file with MD5 checksum or
+        None if there is none.
+        """
+        self.lock.acquire()
+        try:
+            row = self.db.execute('SELECT url FROM media_store'
+                    ' WHERE checksum = ?', (checksum,)).fetchone()
+        finally:
+            self.lock.release()
+        return row and row[0]
+
+    def put_media_url(self, checksum, url, filename):
+        """
+        Record the URL of uploaded media file filename with MD5 checksum.
+        """
+        self.lock.acquire()
+        try:
+            self.db.execute('INSERT OR REPLACE INTO media_store VALUES'
+                    ' (?, ?, ?, ?)', (checksum, url, filename, int(time.time())))
+            self.db.commit()
+        finally:
+            self.lock.release()
+
+    def put_remote_posts(self, posts):
+        """
+        Add or replace the server post metadata in posts, a list of
+        wordpresslib.WordPressPost objects returned by getPosts().
+        """
+        self.lock.acquire()
+        try:
+            try:
+                for post in posts:
+                    self.db.execute('INSERT OR REPLACE INTO remote_posts VALUES'
+                            ' (?, ?, ?, ?, ?, ?, ?)',
+                            (post.id, post.postType, post.title, post.status,
+                            post.permaLink,
+                            post.date and calendar.timegm(post.date),
+                            post.modified and calendar.timegm(post.modified)))
+                    self.db.execute('DELETE FROM remote_categories WHERE id = ?',
+                            (post.id,))
+                    self.db.executemany('INSERT OR IGNORE INTO remote_categories'
+                            ' VALUES (?, ?)',
+                            [(post.id, name) for name in post.categories])
+                self.db.commit()
+            except:
+                self.db.rollback()
+                raise
+        finally:
+            self.lock.release()
+
+    def clear_remote_posts(self, post_type):
+        """
+        Delete the server post metadata of post_type posts.
+        """
+        self.lock.acquire()
+        try:
+            self.db.execute('DELETE FROM remote_categories WHERE id IN'
+                    ' (SELECT id FROM remote_posts WHERE post_type = ?)',
+                    (post_type,))
+            self.db.execute('DELETE FROM remote_posts WHERE post_type = ?',
+                    (post_type,))
+            self.db.commit()
+        finally:
+            self.lock.release()
+
+    def remote_posts(self, post_type, filters):
+        """
+        Return list of (id, title, url, status, created_at, modified_at,
+        categories) tuples for synced post_type posts matching all filters,
+        a list of (name, value) tuples, newest first. Names are 'id',
+        'category', 'title', 'status', 'url' (glob pattern values), 'since'
+        and 'until' (UTC creation time in seconds).
+        """
+        where = ['post_type = ?']
+        params = [post_type]
+        for name, value in filters:
+            if name == 'id':
+                where.append('id = ?')
+                params.append(int(value))
+            elif name == 'category':
+                where.append('id IN (SELECT id FROM remote_categories'
+                        ' WHERE name GLOB ?)')
+                params.append(value)
+            elif name == 'since':
+                where.append('created_at >= ?')
+                params.append(value)
+            elif name == 'until':
+                where.append('created_at < ?')
+                params.append(value)
+            else:
+                assert name in ('title', 'status', 'url')
+                where.append('%s GLOB ?' % name)
+                params.append(value)
+        sql = ('SELECT id, title, url, status, created_at, modified_at'
+                ' FROM remote_posts WHERE ' + ' AND '.join(where) +
+                ' ORDER BY created_at DESC, id DESC')
+        self.lock.acquire()
+        try:
+            result = []
+            for row in self.db.execute(sql, params).fetchall():
+                categories = [name for (name,) in self.db.execute(
+                        'SELECT name FROM remote_categories WHERE id = ?'
+                        ' ORDER BY rowid', (row[0],))]
+                result.append(row + (categories,))
+            return result
+        finally:
+            self.lock.release()
+
+    def load_stat(self, stat):
+        if stat is None:
+            return None
+        return tuple(json.loads(stat))
+
+    def dump_stat(self, stat):
+        if stat is None:
+            return None
+        return json.dumps(stat)
+
+
+class CategoryCatalogue(object):
+    """
+    The weblog categories (wordpresslib.WordPressCategory objects) keyed by
+    lower-cased name. The catalogue is saved in the site index (if there
+    is one) and fetched from the server when it is older than ttl seconds
+    or, at most once per run, when a name is not found.
+    """
+
+    def __init__(self, site_index=None, ttl=None):
+        self.site_index = site_index
+        if ttl is None:
+            ttl = CATEGORIES_TTL
+        self.ttl = ttl
+        self.categories = None
+        self.fetched = None     # When the categories were fetched.
+        self.refreshed = False  # True if fetched from the server this run.
+        self.lock = threading.RLock()
+
+    def load(self, server):
+        """
+        Load the saved catalogue or fetch it if it is missing or expired.
+        """
+        if self.categories is not None:
+            return
+        if self.site_index is not None:
+            saved = self.site_index.get_property('categories')
+            if saved is not None and time.time() - saved['fetched'] < self.ttl:
+                self.fetched = saved['fetched']
+                self.categories = {}
+                for id, name in saved['categories']:
+                    self.add(id, name.encode('utf-8'))
+                verbose('loaded %d categories from site index' %
+                        len(self.categories))
+                return
+        self.refresh(server)
+
+    def refresh(self, server):
+        """
+        Fetch the categories from the server.
+        """
+        verbose('fetching categories...')
+        self.categories = {}
+        for cat in server.getCategoryList():
+            self.categories[cat.name.lower()] = cat
+        self.fetched = time.time()
+        self.refreshed = True
+        self.save()
+
+    def save(self):
+        if self.site_index is not None and not OPTIONS.dry_run:
+            self.site_index.set_property('categories', {
+                'fetched': self.fetched,
+                'categories': [(cat.id, cat.name)
+                    for cat in self.categories.values() if cat.id is not None],
+            })
+
+    def add(self, id, name):
+        cat = wordpresslib.WordPressCategory()
+        cat.id = id
+        cat.name = name
+        self.categories[name.lower()] = cat
+        return cat
+
+    def all(self, server, refresh=False):
+        """
+        Return list of all categories.
+        """
+        self.lock.acquire()
+        try:
+            if refresh and not self.refreshed:
+                self.refresh(server)
+            else:
+                self.load(server)
+            return self.categories.values()
+        finally:
+            self.lock.release()
+
+    def get(self, server, name):
+        """
+        Return category with matching name (case insensitive) or None.
+        """
+        self.lock.acquire()
+        try:
+            self.load(server)
+            cat = self.categories.get(name.lower())
+            if cat is None and not self.refreshed:
+                # Created since the catalogue was fetched?
+                self.refresh(server)
+                cat = self.categories.get(name.lower())
+            return cat
+        finally:
+            self.lock.release()
+
+    def create(self, server, names):
+        """
+        Create categories names with a single server request.
+        Return list of the new categories.
+        """
+        self.lock.acquire()
+        try:
+            for name in names:
+                infomsg('creating new category: %s...' % name)
+            if OPTIONS.dry_run:
+                ids = [None] * len(names)
+            else:
+                ids = server.newCategories(names)
+            result = [self.add(id, name) for id, name in zip(ids, names)]
+            self.save()
+            return result
+        finally:
+            self.lock.release()
+
+
+class MediaStore(object):
+    """
+    The server URLs of uploaded media files keyed by file content MD5
+    checksum and shared by all blog files, so a file used by many posts
+    (under any name) is uploaded once. The store is saved in the site
+    index (if there is one), otherwise it holds the media recorded in
+    the cache files loaded by this run.
+    """
+
+    def __init__(self, site_index=None):
+        self.site_index = site_index
+        self.urls = {}          # Media URLs keyed by checksum.
+        self.uploading = set()  # Checksums of files being uploaded.
+        self.fresh = set()      # Checksums of files uploaded this run.
+        self.lock = threading.Condition()
+
+    def add(self, checksum, url):
+        """
+        Record media URL without saving it (see upload()).
+        """
+        self.lock.acquire()
+        try:
+            self.urls.setdefault(checksum, url)
+        finally:
+            self.lock.release()
+
+    BUSY = 'busy'   # get() result for files being uploaded.
+
+    def get(self, checksum, fresh=False):
+        """
+        Return the URL of the uploaded media file with checksum. If fresh
+        is True only files uploaded by this run are returned.
+        Return BUSY if the file is being uploaded by another caller (see
+        wait()) or None if there is no such file, in which case the
+        caller must upload it then call uploaded() or failed().
+        """
+        self.lock.acquire()
+        try:
+            if checksum in self.uploading:
+                return self.BUSY
+            if fresh:
+                url = checksum in self.fresh and self.urls[checksum] or None
+            else:
+                url = self.urls.get(checksum)
+                if url is None and self.site_index is not None:
+                    url = self.site_index.get_media_url(checksum)
+                    if url is not None:
+                        self.urls[checksum] = url
+            if url is None:
+                self.uploading.add(checksum)
+            return url
+        finally:
+            self.lock.release()
+
+    def wait(self, checksum):
+        """
+        Wait until the media file with checksum is not being uploaded.
+        Callers must not wait while they are uploading files.
+        """
+        self.lock.acquire()
+        try:
+            while checksum in self.uploading:
+                self.lock.wait()
+        finally:
+            self.lock.release()
+
+    def uploaded(self, checksum, url, filename):
+        """
+        Record the URL of the newly uploaded media file with checksum.
+        Waiting callers are released before the URL is saved in the site
+        index, so they are not left waiting if saving it fails.
+        """
+        self.lock.acquire()
+        try:
+            self.urls[checksum] = url
+            self.fresh.add(checksum)
+            self.uploading.discard(checksum)
+            self.lock.notifyAll()
+        finally:
+            self.lock.release()
+        if self.site_index is not None and not OPTIONS.dry_run:
+            self.site_index.put_media_url(checksum, url, filename)
+
+    def failed(self, checksum):
+        """
+        Give up uploading the media file with checksum.
+        """
+        self.lock.acquire()
+        try:
+            self.uploading.discard(checksum)
+            self.lock.notifyAll()
+        finally:
+            self.lock.release()
+
+
+class MediaLibrary(object):
+    """
+    The WordPress server media library, fetched once per run to find the
+    server copies of media files whose cache data has been lost. Local
+    files are matched to server files by name (ignoring the -N suffix
+    WordPress adds to clashing names) and size, matches are confirmed by
+    the MD5 checksum of the downloaded server file.
+    """
+
+    BATCH = 100     # Items fetched per wp.getMediaLibrary call.
+
+    def __init__(self):
+        self.items = None   # wordpresslib.WordPressMediaItem lists keyed by key().
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(filename):
+        root, ext = os.path.splitext(os.path.basename(filename))
+        return (re.sub(r'-\d+$', '', root) + ext).lower()
+
+    def load(self, server):
+        """
+        Fetch the media library if it has not been fetched.
+        """
+        self.lock.acquire()
+        try:
+            if self.items is not None:
+                return
+            verbose('fetching media library...')
+            self.items = {}
+            count = 0
+            while True:
+                batch = list(server.getMediaLibrary(
+                    {'number': self.BATCH, 'offset': count}))
+                for item in batch:
+                    name = item.file or urlparse.urlparse(item.url).path
+                    self.items.setdefault(self.key(name), []).append(item)
+                count += len(batch)
+                if len(batch) < self.BATCH:
+                    break
+            verbose('fetched %d media library items' % count)
+        finally:
+            self.lock.release()
+
+    def find(self, server, filename, checksum):
+        """
+        Return URL of the server media file with the same contents as
+        local file filename (MD5 checksum is its checksum) or None.
+        """
+        self.load(server)
+        size = os.path.getsize(filename)
+        for item in self.items.get(self.key(filename), []):
+            if item.size is not None and item.size != size:
+                continue
+            verbose('checking media library file: %s' % item.url)
+            try:
+                if timed('url_checksum', url_checksum, item.url) == checksum:
+                    return item.url
+            except (IOError, socket.error), e:
+                warning('%s: %s' % (item.url, e))
+        return None
+
+
+class Timings(object):
+    """
+    Accumulated elapsed and process CPU times of named processing phases.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.phases = {}    # [calls, wall, cpu] lists keyed by phase name.
+
+    def add(self, phase, wall, cpu):
+        self.lock.acquire()
+        try:
+            t = self.phases.setdefault(phase, [0, 0.0, 0.0])
+            t[0] += 1
+            t[1] += wall
+            t[2] += cpu
+        finally:
+            self.lock.release()
+
+    def results(self):
+        """
+        Return dictionary of phase times and the total elapsed time.
+        """
+        self.lock.acquire()
+        try:
+            return dict(
+                total = time.time() - self.started,
+                phases = dict((phase, dict(calls=t[0], wall=t[1], cpu=t[2]))
+                    for phase, t in self.phases.items()),
+            )
+        finally:
+            self.lock.release()
+
+    def summary(self):
+        """
+        Print phase times, slowest first. CPU times are those of the
+        whole process, so phases run by concurrent threads are counted
+        more than once.
+        """
+        results = self.results()
+        infomsg('timings:')
+        infomsg('  %-28s %6s %10s %12s' %
+                ('phase', 'calls', 'wall', 'process cpu'))
+        for phase, t in sorted(results['phases'].items(),
+                key=lambda item: item[1]['wall'], reverse=True):
+            infomsg('  %-28s %6d %10.3f %12.3f' %
+                    (phase, t['calls'], t['wall'], t['cpu']))
+        infomsg('  %-28s %6s %10.3f' % ('total', '', results['total']))
+
+    def write(self, filename):
+        """
+        Write phase times to JSON file filename.
+        """
+        f = open(filename, 'w')
+        try:
+            json.dump(self.results(), f, indent=2, sort_keys=True)
+            f.write('\n')
+        finally:
+            f.close()
+
+
+class TimedServer(object):
+    """
+    wordpresslib.WordPressClient wrapper that times server method calls.
+    """
+
+    def __init__(self, server):
+        self.server = server
+
+    def __getattr__(self, name):
+        attr = getattr(self.server, name)
+        if not callable(attr):
+            return attr
+        return lambda *args, **kwargs: \
+            timed('server.' + name, attr, *args, **kwargs)
+
+
+class Watcher(object):
+    """
+    Waits for changes to the files in a set of directories. Uses the
+    Linux inotify API (via ctypes) if it is available, otherwise the stat
+    signatures of the watched files and directories are polled.
+    """
+
+    POLL_INTERVAL = 1.0     # Seconds between polls.
+    # inotify event mask: IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE,
+    # IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE.
+    INOTIFY_EVENTS = 0x002 | 0x004 | 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+
+    def __init__(self):
+        self.files = []     # Watched file names.
+        self.dirs = {}      # inotify watch descriptors keyed by directory.
+        self.stats = None   # Polled stat signatures keyed by file name.
+        self.fd = None      # inotify file descriptor (None if polling).
+        self.libc = None
+        try:
+            import ctypes, ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                    use_errno=True)
+            fd = libc.inotify_init()
+        except (ImportError, OSError, AttributeError):
+            fd = -1
+        if fd >= 0:
+            self.libc, self.fd = libc, fd
+            verbose('watching files with inotify')
+        else:
+            verbose('watching files by polling')
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def watch(self, filenames, dirs=()):
+        """
+        Watch filenames, the directories containing them (so files
+        replaced by renames are detected) and directories dirs (for
+        created files) instead of the files previously watched.
+        """
+        self.files = sorted(filenames)
+        dirs = set(dirs) | set(os.path.dirname(f) for f in self.files)
+        if self.fd is not None:
+            for d in sorted(set(self.dirs) - dirs):
+                self.libc.inotify_rm_watch(self.fd, self.dirs.pop(d))
+            for d in sorted(dirs):
+                if d in self.dirs or not os.path.isdir(d):
+                    continue
+                wd = self.libc.inotify_add_watch(self.fd, d,
+                        self.INOTIFY_EVENTS)
+                if wd < 0:
+                    # Typically the max_user_watches limit.
+                    warning('inotify failed (falling back to polling): %s' % d)
+                    self.close()
+                    break
+                self.dirs[d] = wd
+        if self.fd is None:
+            self.dirs = dict.fromkeys(dirs)
+            self.stats = self.poll()
+
+    def poll(self):
+        """
+        Return stat signatures of the watched files and directories.
+        """
+        result = {}
+        for filename in self.files + sorted(self.dirs):
+            try:
+                result[filename] = file_stat(filename)
+            except OSError:
+                result[filename] = None
+        return result
+
+    def wait(self, timeout=None):
+        """
+        Wait up to timeout seconds (forever if None) for a change.
+        Return True if something changed, False if timed out.
+        """
+        if self.fd is not None:
+            ready = select.select([self.fd], [], [], timeout)[0]
+            if not ready:
+                return False
+            os.read(self.fd, 65536)  # Discard the queued events.
+            return True
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            interval = self.POLL_INTERVAL
+            if deadline is not None:
+                interval = min(interval, deadline - time.time())
+                if interval <= 0:
+                    return False
+            time.sleep(interval)
+            stats = self.poll()
+            if stats != self.stats:
+                self.stats = stats
+                return True
+
+
 class Blogpost(object):
 
     # Valid blog parameter names.
     PARAMETER_NAMES = ('categories','status','title','doctype','posttype')
+    SYNC_BATCH = 100    # Posts fetched per sync wp.getPosts call.
+    SYNC_FIELDS = ['post_title', 'post_status', 'post_type', 'post_date_gmt',
+            'post_modified_gmt', 'link', 'terms']
+    RECOVER_BATCH = 20  # Recent posts searched by recover_created().
+    RECOVER_SKEW = 600  # Allowed client/server clock difference in seconds.
 
     def __init__(self, server_url, username, password, options):
         # options contains the command-line options attributes.
@@ -179,31 +1561,65 @@ class Blogpost(object):
         self.updated_at = None  # Seconds since epoch in UTC.
         self.media = {}  # Contains Media objects keyed by document src path.
         self.categories = []    # List of category names.
+        self.opt_categories = options.categories  # --categories option value.
         # Client-side blog data.
         self.blog_file = None
         self.checksum = None    # self.blog_file MD5 checksum.
+        self.stat = None        # self.blog_file stat signature.
+        self.signature = None   # render_signature() when last posted.
+        self.dependencies = {}  # dependency_manifest() when last posted.
+        self.media_changed = False  # Set if process_media() uploads media.
         self.cache_file = None  # Cache file containing persistant blog data.
+        self.journal = None     # Journal of operations not yet cached.
+        self.create_intent = None   # Unconfirmed journaled post creation.
         self.media_dir = None
         self.content = None     # File-like object containing blog content.
         self.parameters = {}    # AsciiDoc attribute parameter values.
-        # XML-RPC server.
+        # XML-RPC (or REST API) server.
         self.server = None              # wordpresslib.WordPressClient.
-        self.server_url = server_url    # WordPress XML-RPC server URL.
+        self.async_server = None        # wordpresslib.AsyncWordPressClient.
+        self.server_url = server_url    # WordPress server URL.
         self.username = username        # WordPress account user name.
         self.password = password        # WordPress account password.
         verbose('wordpress server: %s:%s@%s' %
             (self.username, self.password, self.server_url))
-        self.server = wordpresslib.WordPressClient(
-            self.server_url, self.username, self.password, self.options.proxy)
+        if API == 'rest':
+            client = wordpresslib.WordPressRestClient
+        else:
+            client = wordpresslib.WordPressClient
+        self.server = client(
+            self.server_url, self.username, self.password, self.options.proxy,
+            self.options.connect_timeout, self.options.read_timeout,
+            retries=self.options.retries,
+            maxRequests=self.options.max_requests,
+            gzipThreshold=self.options.gzip_requests or None)
         self.server.selectBlog(0)
+        if TIMINGS is not None:
+            self.server = TimedServer(self.server)
+
+    def get_async_server(self):
+        """
+        Return the asynchronous server client used for concurrent requests
+        (see send_media()), it is created when first used.
+        """
+        if self.async_server is None:
+            if API == 'rest':
+                client = wordpresslib.AsyncWordPressRestClient
+            else:
+                client = wordpresslib.AsyncWordPressClient
+            self.async_server = client(
+                self.server_url, self.username, self.password,
+                self.options.proxy, self.options.connect_timeout,
+                self.options.read_timeout,
+                retries=self.options.retries,
+                maxRequests=self.options.max_requests,
+                maxConnections=self.options.media_jobs,
+                gzipThreshold=self.options.gzip_requests or None)
+            self.async_server.selectBlog(0)
+        return self.async_server
 
     def docformat(self):
-        if os.path.splitext(self.blog_file)[1].lower() in ('.htm','.html'):
-            return 'html'
-        elif os.path.splitext(self.blog_file)[1].lower() == '.rmu':
-            return 'rimu'
-        else:
-            return 'asciidoc'
+        return docformat(self.blog_file)
 
     def is_page(self):
         return self.post_type == 'page'
@@ -217,6 +1633,7 @@ class Blogpost(object):
             if self.media_dir is None:
                 self.media_dir = os.path.abspath(os.path.dirname(blog_file))
             self.cache_file = os.path.splitext(blog_file)[0] + '.blogpost'
+            self.journal = Journal(self.cache_file + '.journal')
 
     def set_title_from_blog_file(self):
         """
@@ -246,89 +1663,104 @@ class Blogpost(object):
         """
         Convert AsciiDoc blog_file to Wordpress compatible HTML content.
         """
-        asciidoc = asciidocapi.AsciiDocAPI()
-        asciidoc.options('--no-header-footer')
-        asciidoc.options('--doctype', self.doctype)
-        asciidoc.options('--attribute', 'blogpost')
-        for attr in OPTIONS.attributes:
-            asciidoc.options('--attribute', attr)
-        for opt in OPTIONS.asciidoc_opts:
-            print '%r' % opt
-            opt = opt.partition(' ')
-            if opt[2]:
-                s = opt[2]
-                s = s.strip()
-                if (s.startswith('"') and s.endswith('"')
-                        or s.startswith("'") and s.endswith("'")):
-                    # Strip quotes.
-                    s = s[1:-1]
-                asciidoc.options(opt[0], s)
-            else:
-                asciidoc.options(opt[0])
-        if OPTIONS.verbose > 1:
-            asciidoc.options('--verbose')
-
-        if OPTIONS.asciidoc == 'asciidoctor':
-            args = ''
-            for opt in asciidoc.options.values:
-                args = args + opt[0] + ' '
-                if not opt[1] is None:
-                    args = args + opt[1] + ' '
-            result = shell('asciidoctor %s -o - "%s"' % (args, self.blog_file))[0]
-            result = unicode(result,'utf8')
-            self.content = StringIO.StringIO(result.encode('utf8'))
-        else:
-            verbose('asciidoc: options: %r' % asciidoc.options.values)
-            outfile = StringIO.StringIO()
-            asciidoc.execute(self.blog_file, outfile, backend='wordpress')
-            result = outfile.getvalue()
-            result = unicode(result,'utf8')
-            self.content = StringIO.StringIO(result.encode('utf8'))
-            for s in asciidoc.messages:
-                infomsg('asciidoc: %s' % s)
+        self.content = StringIO.StringIO(asciidoc2html(self.blog_file, self.doctype))
 
     def rimu2html(self):
-        html = shell('rimuc "%s"' % self.blog_file)[0]
-        self.content = StringIO.StringIO(html)
+        self.content = StringIO.StringIO(rimu2html(self.blog_file))
 
-    def sanitize_html(self):
+    def render(self):
         """
-        Convert HTML content to HTML that plays well with Wordpress.
-        This involves removing all line breaks apart from those in
-        <pre></pre> blocks.
+        Convert blog_file to Wordpress compatible HTML content.
         """
-        result = ''
+        self.content = StringIO.StringIO(render(self.blog_file, self.doctype))
+
+    def sanitize_html(self, urls=None):
+        """
+        Generate the HTML content as chunks of HTML that plays well with
+        Wordpress. This involves removing all line breaks apart from those
+        in <pre></pre> blocks and, if urls is not None, replacing media file
+        references with the WordPress URLs returned by process_media().
+        The first <!--more--> tag (which may span lines) is generated as a
+        None chunk. The content is processed line by line in a single pass.
+        """
+        if urls:
+            lines = (self.media_rexp.sub(lambda mo: '<%s="%s"' %
+                        (mo.group('tag'), urls[mo.group('src')]), line)
+                    for line in self.content)
+        else:
+            lines = iter(self.content)
+        more = False
+        pending = ''    # Chunks ending in the start of a more tag.
         firstline = True
-        for line in self.content:
+        for line in lines:
             if firstline and line and re.match(r'^<h1>.*</h1>$', line):
                 # If the first line is an h1 header drop it because
                 # Wordpress generates its own post title.
                 # This applies to Rimu generated documents.
-                pass
+                chunks = []
             elif line.startswith('<pre'):
-                line = ' ' + line
+                chunks = [' ' + line]
                 while '</pre>' not in line:
-                    result += line
-                    line = self.content.next()
-                result += line
+                    line = next(lines, None)
+                    if line is None:
+                        break
+                    chunks.append(line)
             elif line.startswith('src="data:'):
-                line = ' ' + line
+                chunks = [' ' + line]
                 while not line.strip().endswith('">'):
-                    result += line
-                    line = self.content.next()
-                result += line
+                    line = next(lines, None)
+                    if line is None:
+                        break
+                    chunks.append(line)
             else:
-                result += ' ' + line.strip()
-            if firstline: firstline = False
-        self.content = StringIO.StringIO(result)
+                chunks = [' ' + line.strip()]
+            firstline = False
+            for chunk in chunks:
+                if not more:
+                    chunk = pending + chunk
+                    pending = ''
+                    mo = re.search(r'<!--\s*more\s*-->', chunk)
+                    if mo:
+                        more = True
+                        yield chunk[:mo.start()]
+                        yield None
+                        chunk = chunk[mo.end():]
+                    elif re.search(r'<!--\s*(m(o(r(e\s*-?)?)?)?)?$', chunk):
+                        # Possibly a more tag split across lines.
+                        pending = chunk
+                        continue
+                yield chunk
+        if pending:
+            yield pending
+
+    def cache_exists(self):
+        """
+        Return True if the blog file has been cached.
+        """
+        if SITE_INDEX is not None and self.blog_file is not None \
+                and SITE_INDEX.contains(self.blog_file):
+            return True
+        return self.cache_file is not None and os.path.isfile(self.cache_file)
 
     def load_cache(self):
         """
-        Load cache file and update self with cache data.
+        Load cache data from the site index (if enabled) or the cache file
+        and update self with cache data.
+        A cache file that has not been indexed is imported into the index.
         """
-        if self.cache_file is not None and os.path.isfile(self.cache_file):
+        cache = None
+        if SITE_INDEX is not None and self.blog_file is not None:
+            verbose('reading index: %s' % self.blog_file)
+            cache = SITE_INDEX.get(self.blog_file)
+        if cache is None and self.cache_file is not None \
+                and os.path.isfile(self.cache_file):
             verbose('reading cache: %s' % self.cache_file)
-            cache = pickle.load(open(self.cache_file))
+            cache = read_cache_file(self.cache_file)
+            if SITE_INDEX is not None and self.blog_file is not None \
+                    and not self.options.dry_run:
+                verbose('importing cache: %s' % self.cache_file)
+                SITE_INDEX.put(self.blog_file, cache)
+        if cache is not None:
             self.url = cache.url
             self.id = cache.id
             self.title = cache.title
@@ -342,14 +1774,24 @@ class Blogpost(object):
             self.updated_at = cache.updated_at
             self.media = cache.media
             self.checksum = cache.checksum
+            self.stat = cache.stat
             self.categories = cache.categories
+            self.signature = cache.signature
+            self.dependencies = cache.dependencies
+            if MEDIA_STORE is not None:
+                for media_obj in self.media.values():
+                    if media_obj.checksum is not None and media_obj.url:
+                        MEDIA_STORE.add(media_obj.checksum, media_obj.url)
 
     def save_cache(self):
         """
-        Write cache file.
+        Write cache data to the site index (if enabled) or the cache file.
         """
         if self.cache_file is not None:
-            verbose('writing cache: %s' % self.cache_file)
+            if SITE_INDEX is not None:
+                verbose('writing index: %s' % self.blog_file)
+            else:
+                verbose('writing cache: %s' % self.cache_file)
             if not self.options.dry_run:
                 cache = Cache(
                         url = self.url,
@@ -362,8 +1804,14 @@ class Blogpost(object):
                         updated_at = self.updated_at,
                         media = self.media,
                         checksum = self.checksum,
+                        stat = self.stat,
                         categories = self.categories,
+                        signature = self.signature,
+                        dependencies = self.dependencies,
                     )
+                if SITE_INDEX is not None:
+                    SITE_INDEX.put(self.blog_file, cache)
+                    return
                 f = open(self.cache_file, 'w')
                 try:
                     pickle.dump(cache, f)
@@ -372,12 +1820,88 @@ class Blogpost(object):
 
     def delete_cache(self):
         """
-        Delete cache file.
+        Delete cache file and site index entry.
         """
+        if SITE_INDEX is not None and self.blog_file is not None \
+                and SITE_INDEX.contains(self.blog_file):
+            infomsg('deleting index entry: %s' % self.blog_file)
+            if not self.options.dry_run:
+                SITE_INDEX.delete(self.blog_file)
         if self.cache_file is not None and os.path.isfile(self.cache_file):
             infomsg('deleting cache file: %s' % self.cache_file)
             if not self.options.dry_run:
                 os.unlink(self.cache_file)
+        if self.journal is not None and not self.options.dry_run:
+            self.journal.delete()
+
+    def journal_record(self, op, **fields):
+        """
+        Record server operation op in the journal.
+        """
+        if self.journal is not None and not self.options.dry_run:
+            self.journal.append(op, **fields)
+
+    def resume(self):
+        """
+        Recover the server operations recorded in the journal by an
+        interrupted post: the created post ID (if creation was not
+        confirmed the server is searched by recover_created()) and the
+        uploaded media file URLs (they are added to the media store).
+        """
+        records = self.journal and self.journal.records()
+        if not records:
+            return
+        infomsg('resuming interrupted post: %s' % self.blog_file)
+        media = dict((media_obj.filename, media_obj)
+                for media_obj in self.media.values())
+        for record in records:
+            if record['op'] == 'create':
+                self.create_intent = record
+            elif record['op'] == 'created':
+                self.create_intent = None
+                if self.id is None:
+                    self.id = record['id']
+            elif record['op'] == 'media':
+                verbose('journaled upload: %s' % record['filename'])
+                if MEDIA_STORE is not None:
+                    MEDIA_STORE.add(record['checksum'], record['url'])
+                media_obj = media.get(record['filename'])
+                if media_obj is not None:
+                    media_obj.set_url(record['url'], tuple(record['stat']),
+                            record['checksum'])
+        if self.id is None and self.create_intent is not None:
+            self.id = self.recover_created(self.create_intent)
+            if self.id is not None:
+                self.journal_record('created', id=self.id)
+        if self.id is not None:
+            infomsg('resuming %s %s' % (self.post_type, self.id))
+
+    def recover_created(self, intent):
+        """
+        Return the ID of the post created by the journaled create
+        operation intent if the server created it before the post was
+        interrupted, else return None. The post is the newest one with
+        the intended type and title created since the operation started.
+        """
+        verbose('searching server for %s: %s' %
+                (intent['post_type'], intent['title']))
+        since = intent['time'] - self.RECOVER_SKEW
+        try:
+            posts = self.server.getPosts(
+                    {'post_type': intent['post_type'],
+                     'number': self.RECOVER_BATCH,
+                     'orderby': 'date', 'order': 'DESC'},
+                    ['post_title', 'post_type', 'post_date_gmt'])
+            for post in posts:
+                if post.title != intent['title']:
+                    continue
+                if post.date is not None and calendar.timegm(post.date) < since:
+                    break
+                return post.id
+        except wordpresslib.WordPressException, e:
+            warning('unable to search server for interrupted post: %s' %
+                    e.message)
+        return None
 
     def get_parameters(self):
         '''
@@ -426,10 +1950,13 @@ class Blogpost(object):
                     die('%s: missing required attribute: blogpost-%s' %
                         (os.path.basename(self.blog_file), name))
 
+    media_rexp = re.compile(r'(?i)<(?P<tag>(a\b[^>]* href)|(img\b[^>]* src))="(?P<src>.+?)"')
+
     def process_media(self):
         """
-        Upload images referenced in the HTML content and replace content urls
-        with WordPress urls.
+        Upload images referenced in the HTML content and return a dictionary
+        of the WordPress urls that replace the content urls (see
+        sanitize_html()).
 
         Source urls are considered relative to self.media_dir.
         Processes <a> and <img> tags provided they reference files with
@@ -438,6 +1965,9 @@ class Blogpost(object):
         Caches the names and checksum of uploaded files in self.cache_file.  If
         self.cache_file is None then caching is not used and no cache file
         written.
+
+        Media files are checksummed by self.options.media_jobs threads
+        then the new and modified ones are uploaded by upload_media().
         """
         # All these extensions may not be supported by your WordPress server,
         # Check with your hoster if you get an 'Invalid file type' error.
@@ -446,39 +1976,136 @@ class Blogpost(object):
             'pdf','doc','odt',
             'mp3','ogg','wav','m4a','mov','wmv','avi','mpg',
         )
-        result = StringIO.StringIO()
-        rexp = re.compile(r'(?i)<(?P<tag>(a\b[^>]* href)|(img\b[^>]* src))="(?P<src>.+?)"')
+        # Find the referenced media files.
+        urls = {}       # Replacement URLs keyed by src.
+        uploads = []    # Media objects to upload if new or modified.
+        pos = self.content.tell()
         for line in self.content:
-            lineout = ''
-            while True:
-                mo = rexp.search(line)
-                if not mo: break
-                tag = mo.group('tag')
+            for mo in self.media_rexp.finditer(line):
                 src = mo.group('src')
+                if src in urls: continue
+                urls[src] = src
                 if src.startswith('data:'): continue    # Skip embedded images.
-                url = src
                 if os.path.splitext(src)[1][1:].lower() in media_exts:
                     media_obj = self.media.get(src)
                     media_file = os.path.join(self.media_dir, src)
                     if not os.path.isfile(media_file):
                         if media_obj:
-                            url =  media_obj.url
+                            urls[src] = media_obj.url
                             infomsg('missing media file: %s' % media_file)
-                        else:
-                            url = src
                     else:
                         if not media_obj:
                             media_obj = Media(media_file)
                             self.media[src] = media_obj
-                        media_obj.upload(self)
-                        url =  media_obj.url
-                        self.updated_at = int(time.time())
-                lineout += line[:mo.start()] + ('<%s="%s"' % (tag, url))
-                line = line[mo.end():]
-            lineout += line
-            result.write(lineout)
-        result.seek(0)
-        self.content = result
+                        uploads.append((src, media_obj))
+        self.content.seek(pos)
+        # Checksum media files concurrently then upload the new and
+        # modified ones.
+        if uploads:
+            pool = ThreadPool(min(self.options.media_jobs, len(uploads)))
+            try:
+                checked = pool.map(lambda (src, media_obj):
+                        media_obj.check(self), uploads)
+            finally:
+                pool.terminate()
+            changed = [(media_obj,) + result
+                    for (src, media_obj), result in zip(uploads, checked)
+                    if result is not None]
+            if changed:
+                timed('upload_media', self.upload_media, changed)
+            for (src, media_obj), result in zip(uploads, checked):
+                urls[src] = media_obj.url
+                if result is not None:
+                    self.media_changed = True
+            self.updated_at = int(time.time())
+        return urls
+
+    def upload_media(self, changed):
+        """
+        Upload new and modified media files changed, a list of (Media,
+        stat, checksum) tuples (see Media.check()), that are not already
+        in the media store (see MediaStore) or, if the --reuse-media
+        option is set, the server media library (--force-media uploads
+        files not uploaded by this run). Files with the same contents are
+        uploaded once. Files being uploaded by other threads are waited
+        for after this post's files have been uploaded.
+        """
+        store = MEDIA_STORE or MediaStore(SITE_INDEX)
+        fresh = self.options.force_media
+        while changed:
+            uploads = {}    # (Media, stat) lists keyed by checksum.
+            busy = []       # Files being uploaded by other threads.
+            try:
+                for media_obj, stat, checksum in changed:
+                    if checksum in uploads:
+                        uploads[checksum].append((media_obj, stat))
+                        continue
+                    url = store.get(checksum, fresh)
+                    if url is MediaStore.BUSY:
+                        busy.append((media_obj, stat, checksum))
+                        continue
+                    if url is not None:
+                        infomsg('reusing uploaded: %s' % media_obj.filename)
+                    else:
+                        uploads[checksum] = [(media_obj, stat)]
+                        if MEDIA_LIBRARY is not None and not fresh:
+                            url = MEDIA_LIBRARY.find(self.server,
+                                    media_obj.filename, checksum)
+                        if url is not None:
+                            infomsg('reusing server media library file: %s' %
+                                    media_obj.filename)
+                            del uploads[checksum]
+                            store.uploaded(checksum, url, media_obj.filename)
+                            self.journal_record('media',
+                                    filename=media_obj.filename,
+                                    checksum=checksum, url=url, stat=stat)
+                    if url is not None:
+                        media_obj.set_url(url, stat, checksum)
+            except:
+                for checksum in uploads:
+                    store.failed(checksum)
+                raise
+            self.send_media(store, uploads)
+            for media_obj, stat, checksum in busy:
+                store.wait(checksum)
+            changed = busy
+
+    def send_media(self, store, uploads):
+        """
+        Upload media files uploads, lists of (Media, stat) tuples keyed
+        by checksum, and record them in the media store. The first file
+        of each list is uploaded, concurrently (self.options.media_jobs at
+        a time) by the asynchronous server client in this thread. The
+        uploads are timed as server.newMediaObject calls (the first
+        get() waits for most of them).
+        """
+        calls = {}  # AsyncCalls keyed by checksum.
+        for checksum, files in uploads.items():
+            media_obj = files[0][0]
+            infomsg('uploading: %s...' % media_obj.filename)
+            if not self.options.dry_run:
+                calls[checksum] = self.get_async_server().newMediaObject(
+                        media_obj.filename)
+        error = None
+        for checksum, files in uploads.items():
+            media_obj = files[0][0]
+            if self.options.dry_run:
+                url = media_obj.filename    # Dummy value for debugging.
+            else:
+                try:
+                    url = timed('server.newMediaObject', calls[checksum].get)
+                except Exception:
+                    store.failed(checksum)
+                    error = error or sys.exc_info()
+                    continue
+                infomsg('url: %s' % url)
+            store.uploaded(checksum, url, media_obj.filename)
+            for media_obj, stat in files:
+                media_obj.set_url(url, stat, checksum)
+                self.journal_record('media', filename=media_obj.filename,
+                        checksum=checksum, url=url, stat=stat)
+        if error is not None:
+            raise error[0], error[1], error[2]
 
     def get_post(self):
         """
@@ -523,11 +2150,15 @@ class Blogpost(object):
         for media_obj in self.media.values():
             print 'media:      %s' % media_obj.url
 
-    def list(self):
+    def list(self, filters=[]):
         """
-        List recent posts.
-        Information from WordPress server not from client-side cache.
+        List posts matching filters (see SiteIndex.remote_posts()) from the
+        site index. If there is no site index or the --remote option is set
+        list recent posts from the WordPress server.
         """
+        if SITE_INDEX is not None and not self.options.remote:
+            self.list_index(filters)
+            return
         if self.is_page():
             posts = self.server.getRecentPages()
         else:
@@ -544,6 +2175,77 @@ class Blogpost(object):
                 time.strftime('%c', time.localtime(calendar.timegm(post.date)))
             print
 
+    def list_index(self, filters):
+        """
+        List posts matching filters from the site index post metadata
+        synced from the WordPress server.
+        """
+        if SITE_INDEX.get_property('synced.%s' % self.post_type) is None:
+            die('site index has not been synced: use the sync command or --remote option')
+        def localtime(t):
+            if t is None:
+                return ''
+            return time.strftime('%c', time.localtime(t))
+        for id, title, url, status, created_at, modified_at, categories in \
+                SITE_INDEX.remote_posts(self.post_type, filters):
+            print 'title:      %s' % title
+            print 'id:         %s' % id
+            print 'url:        %s' % url
+            print 'type:       %s' % self.post_type
+            if not self.is_page():
+                print 'categories: %s' % ','.join(categories)
+            print 'status:     %s' % status
+            print 'created:    %s' % localtime(created_at)
+            print 'modified:   %s' % localtime(modified_at)
+            print
+
+    def sync(self):
+        """
+        Update the site index post metadata with posts and pages created
+        or modified on the WordPress server since the last sync.
+        Posts are fetched newest modification first, SYNC_BATCH at a time,
+        until a post older than the last sync is reached. The --force
+        option discards the synced metadata and fetches all posts (this
+        also drops posts that have been deleted from the server).
+        """
+        for post_type in ('post', 'page'):
+            key = 'synced.%s' % post_type
+            since = SITE_INDEX.get_property(key)
+            if self.options.force:
+                since = None
+            infomsg('syncing %ss...' % post_type)
+            latest = since or 0
+            posts = []
+            offset = 0
+            while True:
+                batch = list(self.server.getPosts(
+                    {'post_type': post_type, 'number': self.SYNC_BATCH,
+                     'offset': offset, 'orderby': 'modified', 'order': 'DESC'},
+                    self.SYNC_FIELDS))
+                offset += len(batch)
+                done = len(batch) < self.SYNC_BATCH
+                for post in batch:
+                    if not post.modified:
+                        # No modification date: treat the post as changed.
+                        posts.append(post)
+                        continue
+                    modified = calendar.timegm(post.modified)
+                    # Posts modified in the same second as the last sync are
+                    # fetched again in case they were missed.
+                    if since is not None and modified < since:
+                        done = True
+                        break
+                    posts.append(post)
+                    latest = max(latest, modified)
+                if done:
+                    break
+            infomsg('fetched %d %ss' % (len(posts), post_type))
+            if not self.options.dry_run:
+                if since is None:
+                    SITE_INDEX.clear_remote_posts(post_type)
+                SITE_INDEX.put_remote_posts(posts)
+                SITE_INDEX.set_property(key, latest)
+
     def delete(self):
         """
         Delete post with ID self.id.
@@ -560,90 +2262,202 @@ class Blogpost(object):
         self.delete_cache()
 
     # DEPRECATED: create and update commands.
-    def create(self):
+    def create(self, html=None):
         assert(self.id is None)
-        self.post()
+        return self.post(html)
 
     # DEPRECATED: create and update commands.
-    def update(self):
+    def update(self, html=None):
         assert(self.id is not None)
-        self.post()
+        return self.post(html)
 
     def dump(self):
-        if self.docformat() == 'rimu':
-            self.rimu2html()
-        else:
-            self.asciidoc2html()
+        timed('render', self.render)
         print self.content.read()
 
-    def post(self):
+    def post(self, html=None, unmodified=None):
         """
         Update an existing Wordpress post if post_id is not None,
         else create a new post.
+        If html is not None it is used as the (previously rendered) blog
+        content. If unmodified is not None it is the is_unmodified()
+        result (already computed by the caller).
+        Return False if the post was skipped because it was unmodified.
+        Server operations are journaled so an interrupted post can be
+        resumed (see resume()).
         """
+        self.resume()
+        if unmodified is None:
+            unmodified = timed('is_unmodified', self.is_unmodified)
+        if unmodified:
+            infomsg('skipping unmodified: %s' % self.blog_file)
+            return False
         # Create wordpresslib.WordPressPost object.
         if self.id is not None:
             post = self.get_post()
         else:
             post = wordpresslib.WordPressPost()
         # Generate blog content from blog file.
-        if self.docformat() == 'html':
-            self.content = open(self.blog_file)
-        elif self.docformat() == 'rimu':
-            self.rimu2html()
+        if html is None:
+            timed('render', self.render)
         else:
-            self.asciidoc2html()
+            self.content = StringIO.StringIO(html)
         if not self.title:
             self.set_title_from_blog_file()
         if not self.title:
             die('missing title: use --title option')
         post.title = self.title
         # Conditionally upload media files.
+        urls = None
         if self.options.media:
-            self.process_media()
-        # Make HTML WordPress friendly.
-        self.sanitize_html()
-        # Set post content.
-        s = re.split(r'<!--\s*more\s*-->', self.content.read(), maxsplit=1)
-        post.description = s[0]
-        if len(s) == 2:
-            post.textMore = s[1]
+            urls = timed('process_media', self.process_media)
+        # Make HTML WordPress friendly and set post content.
+        description, text_more = timed('sanitize_html', self.post_content, urls)
+        post.description = description
+        if text_more is not None:
+            post.textMore = text_more
         # Create/update post.
-        # Only update if blog file has changed.
-        checksum = md5.new(open(self.blog_file,'rb').read()).hexdigest()
-        if not (self.options.force
-                or self.checksum is None
-                or self.checksum != checksum):
+        stat, checksum = stat_checksum(self.blog_file, self.stat, self.checksum)
+        if (self.signature is None
+                and not (self.options.force
+                    or self.media_changed
+                    or self.checksum is None
+                    or self.checksum != checksum)):
+            # The cache predates dependency manifests so is_unmodified()
+            # could not tell, fall back to comparing blog file checksums.
             infomsg('skipping unmodified: %s' % self.blog_file)
+            posted = False
         else:
-            self.checksum = checksum
             action = 'updating' if self.id else 'creating'
             infomsg("%s %s %s '%s'..." % \
                     (action, self.status, self.post_type, self.title))
             if not self.options.dry_run:
                 if self.id is None:
+                    self.journal_record('create', post_type=self.post_type,
+                            title=self.title, time=int(time.time()))
                     if self.is_page():
                         self.id = self.server.newPage(post, self.is_published())
                     else:
-                        self.id = self.server.newPost(post, self.is_published())
+                        self.id = self.server.newPost(post, self.is_published(),
+                                fetch=True)
+                    self.journal_record('created', id=self.id)
                 else:
+                    # Fetch the post in the same request as the edit.
                     if self.is_page():
-                        self.server.editPage(self.id, post, self.is_published())
+                        self.server.editPage(self.id, post, self.is_published(),
+                                fetch=True)
                     else:
-                        self.server.editPost(self.id, post, self.is_published())
+                        self.server.editPost(self.id, post, self.is_published(),
+                                fetch=True)
             infomsg('id: %s' % self.id)
             # Get post so we can find what it's url and creation date is.
             post = self.get_post()
             infomsg('url: %s' % post.permaLink)
             self.updated_at = int(time.time())
-        self.save_cache()
+            posted = True
+        self.checksum = checksum
+        self.stat = stat
+        self.signature = self.render_signature()
+        self.dependencies = self.dependency_manifest()
+        timed('save_cache', self.save_cache)
+        if self.journal is not None and not self.options.dry_run:
+            self.journal.delete()
+        return posted
+
+    def post_content(self, urls):
+        """
+        Return (description, text_more) tuple of WordPress friendly HTML
+        content split at the <!--more--> tag (text_more is None if there is
+        no <!--more--> tag). urls is passed to sanitize_html().
+        """
+        description = []
+        text_more = None
+        chunks = description
+        for chunk in self.sanitize_html(urls):
+            if chunk is None:
+                text_more = chunks = []
+            else:
+                chunks.append(chunk)
+        if text_more is not None:
+            text_more = ''.join(text_more)
+        return (''.join(description), text_more)
+
+    def render_signature(self):
+        """
+        Return a hash of the post parameters and the rendering options
+        and backend that determine the posted content.
+        """
+        h = hashlib.md5()
+        h.update(repr((self.title, self.status, self.post_type, self.doctype,
+                OPTIONS.attributes, OPTIONS.asciidoc_opts, OPTIONS.asciidoc,
+                self.options.media, self.media_dir)))
+        if self.docformat() != 'html':
+            h.update(backend_signature(self.docformat()))
+        return h.hexdigest()
+
+    def dependency_manifest(self):
+        """
+        Return dictionary of (stat, checksum) tuples (see stat_checksum())
+        keyed by the names of the files (other than the blog file) that
+        the post content depends on: the files included by the blog file
+        and the uploaded media files.
+        """
+        result = {}
+        if self.docformat() == 'asciidoc':
+            for filename in include_files(self.blog_file):
+                stat, checksum = self.dependencies.get(filename, (None, None))
+                result[filename] = stat_checksum(filename, stat, checksum)
+        for media_obj in self.media.values():
+            if media_obj.checksum is not None:
+                result[media_obj.filename] = (media_obj.stat, media_obj.checksum)
+        return result
+
+    def is_unmodified(self):
+        """
+        Return True if the post does not need updating: it has been posted
+        and neither the blog file, its dependency manifest nor its render
+        signature have changed since. Nothing is rendered or sent to the
+        server and files are only read if their stat signatures have
+        changed (changed stat signatures of unmodified files are saved to
+        the cache file).
+        """
+        if (self.options.force or self.options.force_media
+                or self.id is None or self.signature is None
+                or not os.path.isfile(self.blog_file)):
+            return False
+        blog_stat, checksum = stat_checksum(self.blog_file, self.stat,
+                self.checksum)
+        if checksum != self.checksum:
+            return False
+        stats = {}  # Current dependency stat signatures.
+        for filename, (dep_stat, dep_checksum) in self.dependencies.items():
+            if not os.path.isfile(filename):
+                verbose('missing dependency: %s' % filename)
+                return False
+            stat, checksum = stat_checksum(filename, dep_stat, dep_checksum)
+            if checksum != dep_checksum:
+                verbose('modified dependency: %s' % filename)
+                return False
+            stats[filename] = stat
+        if self.signature != self.render_signature():
+            verbose('modified parameters: %s' % self.blog_file)
+            return False
+        touched = [f for f in stats if stats[f] != self.dependencies[f][0]]
+        if touched or blog_stat != self.stat:
+            # Save stat signatures so unmodified files are not reread.
+            self.stat = blog_stat
+            for filename in touched:
+                self.dependencies[filename] = \
+                    (stats[filename], self.dependencies[filename][1])
+            self.save_cache()
+        return True
 
     def list_categories(self):
         """
         Print alphabetized list of weblog categories.
         """
-        categories = self.server.getCategoryList()
-        categories = sorted(categories,
+        catalogue = CATEGORIES or CategoryCatalogue(SITE_INDEX)
+        categories = sorted(catalogue.all(self.server, refresh=True),
             lambda x,y: cmp(x.name.lower(), y.name.lower()))
         for cat in categories:
             print '%s (%s)' % (cat.name, cat.id)
@@ -652,64 +2466,38 @@ class Blogpost(object):
         """
         Set weblog post categories based on --categories option value.
         """
-        def get_cat(name, categories):
-            """
-            Return first category with matching name (case insensitive).
-            Return None if not found.
-            """
-            for cat in categories:
-                if name.lower() == cat.name.lower():
-                    return cat
-
-        def del_cat(id, categories):
-            """
-            Delete category with id from categories list.
-            """
-            for i,cat in enumerate(categories):
-                if cat.id == id:
-                    del categories[i]
-                    break
-
-        def new_cat(name):
-            """
-            Add a new weblog category.
-            """
-            infomsg('creating new category: %s...' % name)
-            cat = wordpresslib.WordPressCategory()
-            cat.name = name
-            if not self.options.dry_run:
-                cat.id = self.server.newCategory(name)
-            return cat
-
-        all_cats = self.server.getCategoryList()
-        post_cats = list(self.server.getPostCategories(self.id))
-        opt_cats = OPTIONS.categories.strip()
+        catalogue = CATEGORIES or CategoryCatalogue(SITE_INDEX)
+        opt_cats = self.opt_categories.strip()
         if opt_cats:
             minus = opt_cats.startswith('-')
             plus = opt_cats.startswith('+')
             if opt_cats[0] in '+-':
                 opt_cats = opt_cats[1:]
             opt_cats = [s.strip() for s in opt_cats.split(',')]
+            if minus or plus:
+                post_cats = list(self.server.getPostCategories(self.id))
+            else:
+                post_cats = []
+            post_names = set(cat.name.lower() for cat in post_cats)
             if minus:
                 for name in opt_cats:
-                    cat = get_cat(name, all_cats)
+                    cat = catalogue.get(self.server, name)
                     if not cat:
                         die('no such category: %s' % name)
-                    del_cat(cat.id, post_cats)
-            elif plus:
-                for name in opt_cats:
-                    cat = get_cat(name, all_cats)
-                    if not cat:
-                        cat = new_cat(name)
-                    if not get_cat(name, post_cats):
-                        post_cats.append(cat)
+                    post_cats = [c for c in post_cats if c.id != cat.id]
             else:
-                post_cats = []
+                # Create missing categories with a single request.
+                missing = []
                 for name in opt_cats:
-                    cat = get_cat(name, all_cats)
-                    if not cat:
-                        cat = new_cat(name)
-                    post_cats.append(cat)
+                    if not catalogue.get(self.server, name) and \
+                            name.lower() not in [m.lower() for m in missing]:
+                        missing.append(name)
+                if missing:
+                    catalogue.create(self.server, missing)
+                for name in opt_cats:
+                    if name.lower() not in post_names:
+                        post_cats.append(catalogue.get(self.server, name))
+                        post_names.add(name.lower())
             cat_names = [cat.name for cat in post_cats]
             infomsg('assigning categories: %s' % ','.join(cat_names))
             if not self.options.dry_run:
@@ -718,21 +2506,460 @@ class Blogpost(object):
             self.categories = cat_names
             self.save_cache()
 
+def new_blog(blog_file):
+    """
+    Return a Blogpost for blog_file (which may be None) initialized
+    from the blogpost cache file, the blog file attribute parameters and
+    the command-line options.
+    """
+    blog = Blogpost(URL, USERNAME, PASSWORD, OPTIONS)
+    if OPTIONS.media_dir is not None:
+        blog.media_dir = OPTIONS.media_dir
+    blog.set_blog_file(blog_file)
+    timed('load_cache', blog.load_cache)
+    timed('get_parameters', blog.get_parameters)
+    blog.check_mandatory_parameters()
+    blog.title = blog.parameters.get('title', blog.title)
+    if OPTIONS.title is not None:
+        blog.title = OPTIONS.title
+    if OPTIONS.post_id is not None:
+        blog.id = OPTIONS.post_id
+    blog.post_type = blog.parameters.get('posttype', blog.post_type)
+    if OPTIONS.pages:
+        blog.post_type = 'page'
+    if blog.post_type is None:
+        blog.post_type = 'post'     # Default.
+    blog.status = blog.parameters.get('status', blog.status)
+    if OPTIONS.publish:
+        blog.status = 'published'
+    if OPTIONS.unpublish:
+        blog.status = 'unpublished'
+    if blog.status is None:
+        blog.status = 'published'   # Default.
+    blog.doctype = blog.parameters.get('doctype', blog.doctype)
+    if OPTIONS.doctype is not None:
+        blog.doctype = OPTIONS.doctype
+    if blog.doctype is None:
+        blog.doctype = 'article'    # Default.
+    blog.opt_categories = blog.parameters.get('categories', OPTIONS.categories)
+    return blog
+
+def run_command(command, blog_file, args=[]):
+    """
+    Execute a command on a single blog_file (which may be None), args are
+    the command arguments.
+    """
+    blog = new_blog(blog_file)
+    if command == 'info':
+        if not blog.cache_exists():
+            die('missing cache file: %s' % blog.cache_file)
+        blog.info()
+    elif command == 'categories':
+        if blog.opt_categories:
+            blog.set_categories()
+        else:
+            blog.list_categories()
+    elif command == 'list':
+        blog.list(list_filters(args))
+    elif command == 'sync':
+        blog.sync()
+    elif command == 'delete':
+        if blog.id is None:
+            die('missing cache file: specify --post-id instead')
+        blog.delete()
+    elif command == 'dump':
+        blog.dump()
+    elif command in ('post','create','update'):
+        if blog.id is not None and command == 'create':
+            die('document has been previously posted, use update command')
+        if blog.id is None and command == 'update':
+            die('missing cache file: specify --post-id instead')
+        if command == 'update' or \
+                command == 'post' and blog.id is not None:
+            blog.update()
+        if command == 'create' or \
+                command == 'post' and blog.id is None:
+            blog.create()
+        if blog.opt_categories:
+            blog.set_categories()
+    else:
+        assert(False)
+
+
+#################################
+# Multiple blog file processing #
+#################################
+
+def init_worker(options, render_cache):
+    """
+    Render process pool worker initializer.
+    """
+    global OPTIONS, RENDER_CACHE
+    OPTIONS = options
+    RENDER_CACHE = render_cache
+    # Leave keyboard interrupts to the parent process.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def render_task(task):
+    """
+    Render process pool task: task is a (index, blog_file, doctype) tuple.
+    Return (index, html, error, times) tuple, html is None if there was an
+    error, times is the (wall, cpu) rendering time.
+    """
+    index, blog_file, doctype = task
+    wall, cpu = time.time(), time.clock()
+    try:
+        html, error = render(blog_file, doctype), None
+    except asciidocapi.AsciiDocError, e:
+        errmsg(e.message)
+        html, error = None, e.message
+    except SystemExit:
+        # die() has already reported the error.
+        html, error = None, 'render failed'
+    except Exception, e:
+        # Report the error rather than failing the whole batch.
+        errmsg('ERROR: %s: %s' % (blog_file, e))
+        html, error = None, str(e) or e.__class__.__name__
+    return (index, html, error, (time.time() - wall, time.clock() - cpu))
+
+def post_task(blog, html, unmodified):
+    """
+    Upload thread pool task: post the rendered blog (unmodified is its
+    is_unmodified() result).
+    Return the summary status string.
+    """
+    try:
+        if blog.post(html, unmodified):
+            status = 'posted'
+        else:
+            status = 'unmodified'
+        if blog.opt_categories:
+            blog.set_categories()
+        return status
+    except wordpresslib.WordPressException, e:
+        errmsg('ERROR: %s: %s' % (blog.blog_file, e.message))
+        return 'failed: %s' % e.message
+    except SystemExit:
+        # die() has already reported the error.
+        return 'failed'
+    except Exception, e:
+        # Report the error rather than failing the whole batch.
+        errmsg('ERROR: %s: %s' % (blog.blog_file, e))
+        return 'failed: %s' % (str(e) or e.__class__.__name__)
+
+def post_blogs(blog_files, renderers, uploaders):
+    """
+    Post blog files: they are rendered by the renderers process pool and
+    as each is rendered it is passed to the uploaders thread pool which
+    uploads its media and creates or updates the post.
+    Return dictionary of summary status strings keyed by blog file.
+    """
+    summary = {}    # Status strings and AsyncResults keyed by blog_file.
+    blogs = []
+    for blog_file in blog_files:
+        try:
+            blogs.append(new_blog(blog_file))
+        except SystemExit:
+            summary[blog_file] = 'failed'
+    # Unmodified blog files are not rendered (post_task() skips the post
+    # but still sets the categories).
+    modified = []
+    for blog in blogs:
+        if timed('is_unmodified', blog.is_unmodified):
+            summary[blog.blog_file] = \
+                uploaders.apply_async(post_task, (blog, None, True))
+        else:
+            modified.append(blog)
+    blogs = modified
+    tasks = [(i, blog.blog_file, blog.doctype)
+            for i,blog in enumerate(blogs)]
+    for i, html, error, times in renderers.imap_unordered(render_task, tasks):
+        if TIMINGS is not None:
+            TIMINGS.add('render', *times)
+        blog = blogs[i]
+        if html is None:
+            summary[blog.blog_file] = 'failed: %s' % error
+        else:
+            summary[blog.blog_file] = \
+                uploaders.apply_async(post_task, (blog, html, False))
+    for blog_file, status in summary.items():
+        if not isinstance(status, basestring):
+            summary[blog_file] = status.get()
+    return summary
+
+def print_summary(blog_files, summary):
+    """
+    Print the post_blogs() summary in blog_files order.
+    Return True if any of them failed.
+    """
+    failed = False
+    infomsg('summary:')
+    for blog_file in blog_files:
+        status = summary[blog_file]
+        if status.startswith('failed'):
+            failed = True
+        infomsg('  %s: %s' % (blog_file, status))
+    return failed
+
+def post_blog_files(blog_files):
+    """
+    Post multiple blog files.
+    The blog files are rendered by a pool of OPTIONS.jobs processes, as
+    each is rendered it is passed to a pool of OPTIONS.upload_jobs
+    threads which upload its media and create or update the post.
+    A summary is printed on completion.
+    """
+    renderers = multiprocessing.Pool(OPTIONS.jobs, init_worker,
+            (OPTIONS, RENDER_CACHE))
+    uploaders = ThreadPool(OPTIONS.upload_jobs)
+    try:
+        summary = post_blogs(blog_files, renderers, uploaders)
+        renderers.close()
+        uploaders.close()
+        uploaders.join()
+    finally:
+        renderers.terminate()
+        uploaders.terminate()
+    if print_summary(blog_files, summary):
+        sys.exit(1)
+
+def watch_files(blog_file):
+    """
+    Return the set of files that the blog_file post depends on: the blog
+    file, the files it includes and its media files (recorded in the
+    site index or cache file when it was last posted).
+    """
+    result = set([blog_file])
+    if docformat(blog_file) == 'asciidoc' and os.path.isfile(blog_file):
+        result.update(include_files(blog_file))
+    cache = None
+    if SITE_INDEX is not None:
+        cache = SITE_INDEX.get(blog_file)
+    cache_file = os.path.splitext(blog_file)[0] + '.blogpost'
+    if cache is None and os.path.isfile(cache_file):
+        cache = read_cache_file(cache_file)
+    if cache is not None:
+        result.update(os.path.abspath(media_obj.filename)
+                for media_obj in cache.media.values())
+    return result
+
+def watch_stats(filenames):
+    """
+    Return dictionary of filenames stat signatures (None if missing).
+    """
+    result = {}
+    for filename in filenames:
+        try:
+            result[filename] = file_stat(filename)
+        except OSError:
+            result[filename] = None
+    return result
+
+def watch_blog_files(blog_files, patterns):
+    """
+    Post blog_files then watch them (and new files matching the BLOG_FILE
+    glob patterns) and repost the blog files whose watch_files() change.
+    Bursts of changes are debounced: blog files are reposted once nothing
+    has changed for OPTIONS.debounce seconds. The render processes,
+    upload threads and server connections are kept for the life of the
+    command.
+    """
+    renderers = multiprocessing.Pool(OPTIONS.jobs, init_worker,
+            (OPTIONS, RENDER_CACHE))
+    uploaders = ThreadPool(OPTIONS.upload_jobs)
+    watcher = Watcher()
+    # Directories watched for new blog files.
+    dirs = set(os.path.dirname(os.path.abspath(p)) for p in patterns)
+    try:
+        depends = {}    # watch_files() sets keyed by blog file.
+        stats = watch_stats(blog_files) # Last seen watched file signatures.
+        watching = None # Files the watcher is watching.
+        pending = blog_files
+        while True:
+            if pending:
+                try:
+                    print_summary(pending,
+                            post_blogs(pending, renderers, uploaders))
+                except (Exception, SystemExit), e:
+                    # Keep watching: the files are reposted when they next
+                    # change (die() has already reported SystemExit errors).
+                    if not isinstance(e, SystemExit):
+                        errmsg('ERROR: %s' % e)
+                for blog_file in pending:
+                    depends[blog_file] = watch_files(blog_file)
+                watched = set.union(set(), *depends.values())
+                new = watch_stats(watched - set(stats))
+                stats = dict((f, stats.get(f, new.get(f))) for f in watched)
+                infomsg('watching %d files (press Ctrl+C to stop)...' %
+                        len(stats))
+            if set(stats) != watching:
+                watching = set(stats)
+                watcher.watch(watching, dirs)
+            watcher.wait()
+            while watcher.wait(OPTIONS.debounce):
+                pass
+            current = watch_stats(stats)
+            changed = set(f for f in current if current[f] != stats[f])
+            stats = current
+            for blog_file in depends.keys():
+                if not os.path.isfile(blog_file):
+                    infomsg('missing BLOG_FILE: %s' % blog_file)
+                    del depends[blog_file]
+            pending = []
+            for pattern in patterns:
+                if os.path.isfile(pattern):
+                    names = [pattern]
+                else:
+                    names = sorted(glob.glob(pattern))
+                for name in names:
+                    name = os.path.abspath(name)
+                    if name in pending or not os.path.isfile(name):
+                        continue
+                    if name not in depends:
+                        stats.update(watch_stats([name]))
+                        pending.append(name)
+                    elif depends[name] & changed:
+                        pending.append(name)
+    except KeyboardInterrupt:
+        infomsg('stopped watching')
+    finally:
+        watcher.close()
+        renderers.terminate()
+        uploaders.terminate()
+
+def dump_blog_files(blog_files):
+    """
+    Render multiple blog files in a pool of OPTIONS.jobs processes and
+    print them in blog_files order.
+    """
+    blogs = [new_blog(blog_file) for blog_file in blog_files]
+    renderers = multiprocessing.Pool(OPTIONS.jobs, init_worker,
+            (OPTIONS, RENDER_CACHE))
+    failed = False
+    try:
+        tasks = [(i, blog.blog_file, blog.doctype)
+                for i,blog in enumerate(blogs)]
+        for i, html, error, times in renderers.imap(render_task, tasks):
+            if TIMINGS is not None:
+                TIMINGS.add('render', *times)
+            if html is None:
+                failed = True
+            else:
+                print html
+        renderers.close()
+    finally:
+        renderers.terminate()
+    if failed:
+        sys.exit(1)
+
+def query_index(args):
+    """
+    Print the site index posts matching the query command NAME=VALUE
+    filter arguments.
+    """
+    filters = []
+    for arg in args:
+        name, sep, value = arg.partition('=')
+        if not sep or (name not in SiteIndex.QUERY_COLUMNS
+                and name not in ('category','id','media')):
+            die('invalid query filter: %s' % arg)
+        if name == 'id' and not value.isdigit():
+            die('invalid query filter: %s' % arg)
+        filters.append((name, value))
+    for blog_file, id, title, url, status, post_type, categories in \
+            SITE_INDEX.query(filters):
+        print 'file:       %s' % blog_file
+        print 'title:      %s' % title
+        print 'id:         %s' % id
+        print 'url:        %s' % url
+        if post_type != 'page':
+            print 'categories: %s' % ','.join(categories)
+        print 'status:     %s' % status
+        print 'type:       %s' % post_type
+        print
+
+def list_filters(args):
+    """
+    Return list command NAME=VALUE filter arguments as a list of (name,
+    value) tuples for SiteIndex.remote_posts(). The since and until dates
+    (YYYY-MM-DD local time) are converted to seconds.
+    """
+    filters = []
+    for arg in args:
+        name, sep, value = arg.partition('=')
+        if not sep or name not in ('category','id','since','status',
+                'title','until','url'):
+            die('invalid list filter: %s' % arg)
+        if name == 'id' and not value.isdigit():
+            die('invalid list filter: %s' % arg)
+        if name in ('since','until'):
+            try:
+                value = int(time.mktime(time.strptime(value, '%Y-%m-%d')))
+            except ValueError:
+                die('invalid list filter date: %s' % arg)
+        filters.append((name, value))
+    return filters
+
+def execute(command, blog_files, args):
+    """
+    Execute command on blog_files (which may be empty), args are the
+    command arguments.
+    """
+    if command == 'query':
+        query_index(args)
+    elif command == 'watch':
+        watch_blog_files(blog_files, args)
+    elif len(blog_files) > 1:
+        if command == 'dump':
+            dump_blog_files(blog_files)
+        else:
+            post_blog_files(blog_files)
+    elif blog_files:
+        run_command(command, blog_files[0])
+    else:
+        run_command(command, None, args)
+
+def expand_blog_files(args):
+    """
+    Return list of absolute blog file names from command arguments.
+    Arguments that are not file names are expanded as glob patterns.
+    """
+    result = []
+    for arg in args:
+        if os.path.isfile(arg):
+            names = [arg]
+        else:
+            names = sorted(f for f in glob.glob(arg) if os.path.isfile(f))
+            if not names:
+                die('missing BLOG_FILE: %s' % arg)
+        for name in names:
+            name = os.path.abspath(name)
+            if name not in result:
+                result.append(name)
+    return result
+
 if __name__ != '__main__':
     # So we can import and use as a library.
     OPTIONS = Namespace(
                 dry_run = False,
                 verbose = False,
                 media = True,
-                categories = ''
+                media_jobs = 4,
+                categories = '',
+                proxy = None,
+                connect_timeout = None,
+                read_timeout = None,
+                retries = 3,
+                max_requests = 16,
+                gzip_requests = 0,
             )
 else:
     # DEPRECATED: create and update commands.
-    long_commands = ('create','categories','delete','dump','info','list','post','update')
-    short_commands = {'c':'create', 'cat':'categories', 'd':'delete', 'i':'info', 'l':'list', 'p':'post', 'u':'update'}
-    description = """A Wordpress command-line weblog client for AsciiDoc. COMMAND can be one of: categories, delete, dump, info, list, post. BLOG_FILE is AsciiDoc (or optionally HTML) text file."""
+    long_commands = ('create','categories','delete','dump','info','list','post','query','sync','update','watch')
+    short_commands = {'c':'create', 'cat':'categories', 'd':'delete', 'i':'info', 'l':'list', 'p':'post', 'q':'query', 'u':'update', 'w':'watch'}
+    description = """A Wordpress command-line weblog client for AsciiDoc. COMMAND can be one of: categories, delete, dump, info, list, post, query, sync, watch. BLOG_FILE is AsciiDoc (or optionally HTML) text file, the dump, post and watch commands accept multiple BLOG_FILE names and glob patterns, the list and query commands accept NAME=VALUE filters."""
     from optparse import OptionParser
-    parser = OptionParser(usage='usage: %prog [OPTIONS] COMMAND [BLOG_FILE]',
+    parser = OptionParser(usage='usage: %prog [OPTIONS] COMMAND [BLOG_FILE...]',
         version='%s %s' % (PROG,VERSION),
         description=description)
     parser.add_option('-a', '--attribute',
@@ -747,6 +2974,12 @@ else:
     parser.add_option('-c', '--categories',
         dest='categories', default='', metavar='CATEGORIES',
         help='comma separated list of post categories')
+    parser.add_option('--connect-timeout', type='float',
+        dest='connect_timeout', default=None, metavar='SECONDS',
+        help='set server connection timeout')
+    parser.add_option('--debounce', type='float',
+        dest='debounce', default=0.5, metavar='SECONDS',
+        help='set watch command quiet period before reposting')
     parser.add_option('-d', '--doctype',
         dest='doctype', default=None, metavar='DOCTYPE',
         help='document type (article, book, manpage, html)')
@@ -759,12 +2992,27 @@ else:
     parser.add_option('--force-media',
         action='store_true', dest='force_media', default=False,
         help='force media files to upload')
+    parser.add_option('--gzip-requests', type='int',
+        dest='gzip_requests', default=0, metavar='BYTES',
+        help='gzip compress server requests larger than BYTES')
+    parser.add_option('--index',
+        dest='index', default=None, metavar='FILE',
+        help='set site index database file')
+    parser.add_option('-j', '--jobs', type='int',
+        dest='jobs', default=multiprocessing.cpu_count(), metavar='JOBS',
+        help='number of concurrent blog file render processes')
     parser.add_option('--mandatory-parameters',
         dest='mandatory_parameters', default='', metavar='PARAMETERS',
         help='comma separated list of required attribute parameter names')
+    parser.add_option('--max-requests', type='int',
+        dest='max_requests', default=16, metavar='REQUESTS',
+        help='limit adaptive number of concurrent server requests')
     parser.add_option('--media-dir',
         dest='media_dir', default=None, metavar='MEDIA_DIR',
         help='set location of media files')
+    parser.add_option('--media-jobs', type='int',
+        dest='media_jobs', default=4, metavar='JOBS',
+        help='number of concurrent media file upload threads')
     parser.add_option('-M', '--no-media',
         action='store_false', dest='media', default=True,
         help='do not process document media objects')
@@ -779,15 +3027,43 @@ else:
     parser.add_option('--post-id', type='int',
         dest='post_id', default=None, metavar='POST_ID',
         help='blog post ID number')
+    parser.add_option('--profile',
+        dest='profile', default=None, metavar='FILE',
+        help='write cProfile statistics of the main and upload threads '
+            'to FILE')
     parser.add_option('--proxy',
         dest='proxy', default=None, metavar='URL',
         help='set a proxy server')
+    parser.add_option('--read-timeout', type='float',
+        dest='read_timeout', default=None, metavar='SECONDS',
+        help='set server response timeout')
+    parser.add_option('--remote',
+        action='store_true', dest='remote', default=False,
+        help='list posts from the server not the site index')
+    parser.add_option('--render-cache',
+        dest='render_cache', default=None, metavar='DIRECTORY',
+        help='set rendered HTML cache directory')
+    parser.add_option('--retries', type='int',
+        dest='retries', default=3, metavar='RETRIES',
+        help='set retries of server calls after transient failures')
+    parser.add_option('--reuse-media',
+        action='store_true', dest='reuse_media', default=False,
+        help='reuse matching files from the server media library')
     parser.add_option('-t', '--title',
         dest='title', default=None, metavar='TITLE',
         help='set post TITLE')
+    parser.add_option('--timings',
+        action='store_true', dest='timings', default=False,
+        help='print processing phase timings')
+    parser.add_option('--timings-file',
+        dest='timings_file', default=None, metavar='FILE',
+        help='write processing phase timings to JSON FILE')
     parser.add_option('-u', '--unpublish',
         action='store_true', dest='unpublish', default=False,
         help='set post status to unpublished')
+    parser.add_option('--upload-jobs', type='int',
+        dest='upload_jobs', default=4, metavar='JOBS',
+        help='number of concurrent blog file upload threads')
     parser.add_option('-U', '--publish',
         action='store_true', dest='publish', default=False,
         help='set post status to published')
@@ -808,29 +3084,54 @@ else:
     if command not in long_commands:
         die('invalid command: %s' % command)
     blog_file = None
-    if len(args) == 1 and command in ('categories','delete','list'):
+    blog_files = []
+    if command in ('list','query'):
+        # Zero or more NAME=VALUE filters.
+        pass
+    elif len(args) == 1 and command in ('categories','delete','sync'):
         # No command arguments.
         pass
-    elif len(args) == 2 and command in ('create','categories','delete','dump','info','update','post'):
+    elif len(args) >= 2 and command in ('dump','post','watch'):
+        # One or more BLOG_FILE names or glob patterns.
+        blog_files = expand_blog_files(args[1:])
+        blog_file = blog_files[0]
+    elif len(args) == 2 and command in ('create','categories','delete','info','update'):
         # Single command argument BLOG_FILE
         blog_file = args[1]
-    else:
-        die('too few or too many arguments')
-    if blog_file is not None:
         if not os.path.isfile(blog_file):
             die('missing BLOG_FILE: %s' % blog_file)
         blog_file = os.path.abspath(blog_file)
+        blog_files = [blog_file]
+    else:
+        die('too few or too many arguments')
+    if len(blog_files) > 1:
+        if OPTIONS.title is not None:
+            die('--title is incompatible with multiple BLOG_FILEs')
+        if OPTIONS.post_id is not None:
+            die('--post-id is incompatible with multiple BLOG_FILEs')
+    if OPTIONS.jobs < 1 or OPTIONS.upload_jobs < 1 or OPTIONS.media_jobs < 1:
+        die('--jobs, --upload-jobs and --media-jobs must be greater than zero')
+    if OPTIONS.debounce < 0:
+        die('--debounce must not be negative')
+    if OPTIONS.retries < 0:
+        die('--retries must not be negative')
+    if OPTIONS.max_requests < 0:
+        die('--max-requests must not be negative')
+    if OPTIONS.gzip_requests < 0:
+        die('--gzip-requests must not be negative')
+    if OPTIONS.media_dir is not None and not os.path.isdir(OPTIONS.media_dir):
+        die('missing media directory: %s' % OPTIONS.media_dir)
     # DEPRECATED: doctype 'html'.
     if OPTIONS.doctype not in (None,'article','book','manpage','html'):
         die('invalid DOCTYPE: %s' % OPTIONS.doctype)
     if OPTIONS.categories and \
-            (command not in ('create','update','categories','post')
+            (command not in ('create','update','categories','post','watch')
              or not (blog_file or OPTIONS.post_id)):
         die('--categories is not applicable')
     if command == 'categories' and blog_file and not OPTIONS.categories:
         die('missing --categories option')
     # --post-id option checks.
-    if command not in ('delete','update','categories','post') and OPTIONS.post_id is not None:
+    if command not in ('delete','update','categories','post','watch') and OPTIONS.post_id is not None:
         die('--post-id is incompatible with %s command' % command)
     if command == 'delete':
         if blog_file is None and OPTIONS.post_id is None:
@@ -849,78 +3150,79 @@ else:
         load_conf(OPTIONS.conf_file)
     # Validate configuration file parameters.
     if URL is None:
-        die('Wordpress XML-RPC URL has not been set in configuration file')
+        die('Wordpress URL has not been set in configuration file')
+    if API not in ('xmlrpc','rest'):
+        die('invalid API configuration file parameter: %s' % API)
     if USERNAME is None:
         die('Wordpress USERNAME has not been set in configuration file')
     if PASSWORD is None:
         die('Wordpress PASSWORD has not been set in configuration file')
+    if OPTIONS.render_cache is not None:
+        RENDER_CACHE_DIR = OPTIONS.render_cache
+    if RENDER_CACHE_DIR is not None:
+        RENDER_CACHE = RenderCache(os.path.abspath(RENDER_CACHE_DIR),
+                RENDER_CACHE_SIZE)
+    if OPTIONS.index is not None:
+        SITE_INDEX_FILE = OPTIONS.index
+    if SITE_INDEX_FILE is not None:
+        SITE_INDEX = SiteIndex(os.path.abspath(SITE_INDEX_FILE))
+        if SITE_INDEX.created:
+            # Import the existing cache files of the site.
+            count = SITE_INDEX.import_cache_files(
+                    os.path.dirname(SITE_INDEX.filename))
+            infomsg('created site index: %s (imported %d cache files)' %
+                    (SITE_INDEX.filename, count))
+    elif command in ('query','sync'):
+        die('%s command requires a site index: set SITE_INDEX_FILE or use --index' % command)
+    CATEGORIES = CategoryCatalogue(SITE_INDEX, CATEGORIES_TTL)
+    MEDIA_STORE = MediaStore(SITE_INDEX)
+    if OPTIONS.reuse_media:
+        MEDIA_LIBRARY = MediaLibrary()
+    if command == 'list' and args[1:] and (SITE_INDEX is None or OPTIONS.remote):
+        die('list filters require a site index and are incompatible with --remote')
+    if OPTIONS.timings or OPTIONS.timings_file is not None:
+        TIMINGS = Timings()
+    if OPTIONS.max_requests:
+        wordpresslib.concurrencyLimit(URL, OPTIONS.max_requests).listener = \
+            verbose
     # Do the work.
     try:
-        blog = Blogpost(URL, USERNAME, PASSWORD, OPTIONS)
-        if OPTIONS.media_dir is not None:
-            if not os.path.isdir(OPTIONS.media_dir):
-                die('missing media directory: %s' % OPTIONS.media_dir)
-            blog.media_dir = OPTIONS.media_dir
-        blog.set_blog_file(blog_file)
-        blog.load_cache()
-        blog.get_parameters()
-        blog.check_mandatory_parameters()
-        blog.title = blog.parameters.get('title', blog.title)
-        if OPTIONS.title is not None:
-            blog.title = OPTIONS.title
-        if OPTIONS.post_id is not None:
-            blog.id = OPTIONS.post_id
-        blog.post_type = blog.parameters.get('posttype', blog.post_type)
-        if OPTIONS.pages:
-            blog.post_type = 'page'
-        if blog.post_type is None:
-            blog.post_type = 'post'     # Default.
-        blog.status = blog.parameters.get('status', blog.status)
-        if OPTIONS.publish:
-            blog.status = 'published'
-        if OPTIONS.unpublish:
-            blog.status = 'unpublished'
-        if blog.status is None:
-            blog.status = 'published'   # Default.
-        blog.doctype = blog.parameters.get('doctype', blog.doctype)
-        if OPTIONS.doctype is not None:
-            blog.doctype = OPTIONS.doctype
-        if blog.doctype is None:
-            blog.doctype = 'article'    # Default.
-        OPTIONS.categories = blog.parameters.get('categories', OPTIONS.categories)
-        # Handle commands.
-        if command == 'info':
-            if not os.path.isfile(blog.cache_file):
-                die('missing cache file: %s' % blog.cache_file)
-            blog.info()
-        elif command == 'categories':
-            if OPTIONS.categories:
-                blog.set_categories()
+        try:
+            if OPTIONS.profile is not None:
+                import cProfile, pstats
+                profilers = [cProfile.Profile()]
+                def profile_thread(frame, event, arg):
+                    # Called once by each new thread: profile the thread
+                    # with its own profiler (they are merged at exit).
+                    profiler = cProfile.Profile()
+                    profilers.append(profiler)
+                    profiler.enable()
+                threading.setprofile(profile_thread)
+                try:
+                    profilers[0].runcall(execute, command, blog_files,
+                            args[1:])
+                finally:
+                    threading.setprofile(None)
+                    stats = pstats.Stats(profilers[0])
+                    for profiler in profilers[1:]:
+                        stats.add(profiler)
+                    stats.dump_stats(OPTIONS.profile)
             else:
-                blog.list_categories()
-        elif command == 'list':
-            blog.list()
-        elif command == 'delete':
-            if blog.id is None:
-                die('missing cache file: specify --post-id instead')
-            blog.delete()
-        elif command == 'dump':
-            blog.dump()
-        elif command in ('post','create','update'):
-            if blog.id is not None and command == 'create':
-                die('document has been previously posted, use update command')
-            if blog.id is None and command == 'update':
-                die('missing cache file: specify --post-id instead')
-            if command == 'update' or \
-                    command == 'post' and blog.id is not None:
-                blog.update()
-            if command == 'create' or \
-                    command == 'post' and blog.id is None:
-                blog.create()
-            if OPTIONS.categories:
-                blog.set_categories()
-        else:
-            assert(False)
+                execute(command, blog_files, args[1:])
+        finally:
+            if TIMINGS is not None:
+                if OPTIONS.timings_file is not None:
+                    TIMINGS.write(OPTIONS.timings_file)
+                if OPTIONS.timings:
+                    TIMINGS.summary()
+            if OPTIONS.verbose and wordpresslib.callStats.methods():
+                infomsg('server calls:')
+                for line in wordpresslib.callStats.report():
+                    infomsg('  %s' % line)
+                for url, limit in wordpresslib.concurrencyLimits.items():
+                    infomsg('server concurrency: %s' % url)
+                    for line in limit.report():
+                        infomsg('  %s' % line)
     except asciidocapi.AsciiDocError, e:
         errmsg(e.message)
         sys.exit(1)
@@ -928,4 +3230,3 @@ else:
         die(e.message)
     except xmlrpclib.ProtocolError, e:
         die(e)
-
@@ -31,6 +31,7 @@
 		* editPost
 		* deletePost
 		* newMediaObject
+		* getMediaLibrary
 		* getCategoryList
 		* getPostCategories
 		* setPostCategories
@@ -57,6 +58,18 @@ import xmlrpclib
 import datetime
 import time
 import httplib
+import threading
+import base64
+import urllib
+import socket
+import errno
+import select
+import ssl
+import sys
+import random
+import zlib
+import json
+import mimetypes
 
 class WordPressException(exceptions.Exception):
 	"""Custom exception for WordPress client operations
@@ -65,6 +78,9 @@ class WordPressException(exceptions.Exception):
 		if isinstance(obj, xmlrpclib.Fault):
 			self.id = obj.faultCode
 			self.message = obj.faultString
+		elif isinstance(obj, RestError):
+			self.id = obj.errcode
+			self.message = obj.errmsg
 		else:
 			self.id = 0
 			self.message = obj
@@ -115,42 +131,954 @@ class WordPressPost:
 		self.user = ''
 		self.allowPings	= False
 		self.allowComments = False
+		self.status = ''
+		self.postType = ''
+		self.modified = None
 
-class ProxiedTransport(xmlrpclib.Transport):
-	"""Access xml-rpc through a proxy, copy from 
-	   http://docs.python.org/library/xmlrpclib.html#convenience-functions
+class WordPressMediaItem:
+	"""Represents media library item
 	"""
+	def __init__(self):
+		self.id = 0
+		self.url = ''
+		self.title = ''
+		self.file = ''		# Server file name (relative to the uploads directory).
+		self.size = None	# File size in bytes (None if unknown).
+		self.date = None
+		self.parent = 0
+		self.mimeType = ''
+
+class Base64FileBody:
+	"""File-like XML-RPC request body: head + base64 encoded file + tail.
+	   The file is encoded in chunks as the body is read so memory use does
+	   not depend on the file size, len() returns the Content-Length.
+	"""
+
+	CHUNK_SIZE = 3 * 16 * 1024	# Multiple of 3 so chunks encode without padding.
+
+	def __init__(self, head, fileName, tail):
+		self.head = head
+		self.fileName = fileName
+		self.tail = tail
+		self.fileSize = os.path.getsize(fileName)
+		self.file = None
+		self.seek(0)
+
+	def __len__(self):
+		return len(self.head) + 4 * ((self.fileSize + 2) // 3) + len(self.tail)
+
+	def seek(self, offset):
+		"""Rewind to the start of the body (offset must be 0)
+		"""
+		assert offset == 0
+		self.close()
+		self.file = file(self.fileName, 'rb')
+		self.buffer = self.head
+		self.eof = False
+
+	def read(self, size=-1):
+		while not self.eof and (size < 0 or len(self.buffer) < size):
+			chunk = self.file.read(self.CHUNK_SIZE)
+			if chunk:
+				self.buffer += base64.b64encode(chunk)
+			else:
+				self.buffer += self.tail
+				self.eof = True
+				self.close()
+		if size < 0:
+			size = len(self.buffer)
+		result, self.buffer = self.buffer[:size], self.buffer[size:]
+		return result
+
+	def close(self):
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+
+class FileBody:
+	"""File-like request body of the raw contents of file fileName, read
+	   in chunks as the body is sent, len() returns the Content-Length
+	"""
+
+	def __init__(self, fileName):
+		self.fileName = fileName
+		self.fileSize = os.path.getsize(fileName)
+		self.file = None
+		self.seek(0)
+
+	def __len__(self):
+		return self.fileSize
+
+	def seek(self, offset):
+		"""Rewind to the start of the body (offset must be 0)
+		"""
+		assert offset == 0
+		self.close()
+		self.file = file(self.fileName, 'rb')
+
+	def read(self, size=-1):
+		return self.file.read(size)
+
+	def close(self):
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+
+class FileBodyTransportMixin:
+	"""Transport mixin that accepts file-like request bodies
+	"""
+
+	def send_content(self, connection, request_body):
+		if hasattr(request_body, 'seek'):
+			# Rewind the body in case the request is being retried.
+			request_body.seek(0)
+		xmlrpclib.Transport.send_content(self, connection, request_body)
+
+class ConnectionPool:
+	"""Thread-safe pool of idle keep-alive HTTP(S) connections
+	"""
+
+	def __init__(self, maxIdle=16, maxIdleTime=30):
+		self.maxIdle = maxIdle			# Maximum idle connections per key.
+		self.maxIdleTime = maxIdleTime	# Seconds before idle connections are discarded.
+		self.lock = threading.Lock()
+		self.idle = {}	# Lists of (connection, time released) keyed by key.
+
+	def get(self, key):
+		"""Return most recently used idle connection for key or None.
+		   Connections the server has closed are discarded.
+		"""
+		self.lock.acquire()
+		try:
+			connections = self.idle.get(key, [])
+			while connections:
+				conn, released = connections.pop()
+				if time.time() - released < self.maxIdleTime \
+						and not self.dropped(conn):
+					return conn
+				conn.close()
+			return None
+		finally:
+			self.lock.release()
+
+	def dropped(self, conn):
+		"""Return True if idle connection conn has been closed by the
+		   server: its socket is readable (at end of file or reset) or gone
+		"""
+		if conn.sock is None:
+			return True
+		try:
+			return bool(select.select([conn.sock], [], [], 0)[0])
+		except (select.error, socket.error, ValueError):
+			return True
+
+	def put(self, key, conn):
+		"""Return idle connection for key to the pool
+		"""
+		self.lock.acquire()
+		try:
+			connections = self.idle.setdefault(key, [])
+			if len(connections) < self.maxIdle:
+				connections.append((conn, time.time()))
+				conn = None
+		finally:
+			self.lock.release()
+		if conn is not None:
+			conn.close()
+
+	def clear(self):
+		"""Close all idle connections
+		"""
+		self.lock.acquire()
+		try:
+			for connections in self.idle.values():
+				for conn, released in connections:
+					conn.close()
+			self.idle = {}
+		finally:
+			self.lock.release()
+
+# Connection pool shared by all WordPressClient instances.
+connectionPool = ConnectionPool()
+
+class CallStats:
+	"""Thread-safe per XML-RPC method statistics: call, fault and error
+	   counts, request and response bytes and a latency histogram
+	"""
+
+	# Latency histogram bucket upper bounds in seconds (the last bucket
+	# counts slower calls).
+	LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		self.lock.acquire()
+		try:
+			self.stats = {}
+		finally:
+			self.lock.release()
+
+	def record(self, methodName, requestBytes, responseBytes, latency,
+			status):
+		"""Record a call, status is 'ok', 'fault', 'error' or 'retry' (a
+		   failed attempt that is being retried)
+		"""
+		self.lock.acquire()
+		try:
+			stats = self.stats.get(methodName)
+			if stats is None:
+				stats = self.stats[methodName] = {
+					'calls': 0, 'faults': 0, 'errors': 0, 'retries': 0,
+					'requestBytes': 0, 'responseBytes': 0,
+					'latency': 0.0, 'maxLatency': 0.0,
+					'histogram': [0] * (len(self.LATENCY_BUCKETS) + 1),
+				}
+			if status == 'retry':
+				stats['retries'] += 1
+			else:
+				stats['calls'] += 1
+			if status == 'fault':
+				stats['faults'] += 1
+			elif status == 'error':
+				stats['errors'] += 1
+			stats['requestBytes'] += requestBytes
+			stats['responseBytes'] += responseBytes
+			stats['latency'] += latency
+			stats['maxLatency'] = max(stats['maxLatency'], latency)
+			i = 0
+			while i < len(self.LATENCY_BUCKETS) and latency > self.LATENCY_BUCKETS[i]:
+				i += 1
+			stats['histogram'][i] += 1
+		finally:
+			self.lock.release()
+
+	def methods(self):
+		"""Return a copy of the statistics dictionaries keyed by method name
+		"""
+		self.lock.acquire()
+		try:
+			result = {}
+			for methodName, stats in self.stats.items():
+				result[methodName] = dict(stats)
+				result[methodName]['histogram'] = list(stats['histogram'])
+			return result
+		finally:
+			self.lock.release()
+
+	def report(self):
+		"""Return the statistics as a list of printable lines, methods
+		   with the highest total latency first
+		"""
+		methods = self.methods().items()
+		methods.sort(key=lambda item: item[1]['latency'], reverse=True)
+		lines = ['%-34s %5s %6s %7s %10s %10s %8s %8s' % ('method', 'calls',
+				'faults', 'retries', 'sent', 'received', 'latency', 'max')]
+		for methodName, stats in methods:
+			lines.append('%-34s %5d %6d %7d %10d %10d %8.3f %8.3f' % (
+					methodName, stats['calls'],
+					stats['faults'] + stats['errors'], stats['retries'],
+					stats['requestBytes'], stats['responseBytes'],
+					stats['latency'], stats['maxLatency']))
+			buckets = ['<=%gs:%d' % (bound, n) for bound, n in
+					zip(self.LATENCY_BUCKETS, stats['histogram']) if n]
+			if stats['histogram'][-1]:
+				buckets.append('>%gs:%d' % (self.LATENCY_BUCKETS[-1],
+						stats['histogram'][-1]))
+			lines.append('  latency histogram: %s' % ' '.join(buckets))
+		return lines
+
+# Call statistics shared by all WordPressClient instances.
+callStats = CallStats()
+
+class RetryPolicy:
+	"""Decides whether a failed call is retried and how long to wait
+	   first. Up to retries retries are made after transient failures
+	   (connection errors, timeouts and HTTP 429, 500, 502, 503 and 504
+	   responses) with exponential backoff: the delay starts at baseDelay
+	   seconds, doubles with each retry up to maxDelay and is jittered so
+	   clients that failed together do not retry together. A Retry-After
+	   header gives the minimum delay. Methods that create server objects
+	   are only retried if the request cannot have been processed: it was
+	   never sent or the server answered 429 or 503.
+	"""
+
+	TRANSIENT_STATUS = (429, 500, 502, 503, 504)
+	UNPROCESSED_STATUS = (429, 503)
+	NON_IDEMPOTENT = ('metaWeblog.newPost', 'metaWeblog.newMediaObject',
+			'wp.newPost', 'wp.newPage', 'wp.newCategory', 'wp.uploadFile',
+			'POST /wp/v2/posts', 'POST /wp/v2/pages', 'POST /wp/v2/media',
+			'POST /wp/v2/categories')
+
+	def __init__(self, retries=0, baseDelay=0.5, maxDelay=30):
+		self.retries = retries
+		self.baseDelay = baseDelay
+		self.maxDelay = maxDelay
+
+	def isIdempotent(self, methodName, body):
+		"""Return True if XML-RPC request body (a string or Base64FileBody)
+		   calling methodName can safely be repeated
+		"""
+		if methodName in self.NON_IDEMPOTENT:
+			return False
+		if methodName == 'system.multicall' and isinstance(body, str):
+			for name in self.NON_IDEMPOTENT:
+				if '>%s<' % name in body:
+					return False
+		return True
+
+	def delay(self, attempt, methodName, body, error, sent=True):
+		"""Return the seconds to wait before retrying failed attempt number
+		   attempt (counting from 0) of the methodName request body, or
+		   None if it should not be retried. error is the exception, sent is
+		   False if no part of the request was sent.
+		"""
+		if attempt >= self.retries:
+			return None
+		minimum = 0
+		if isinstance(error, xmlrpclib.ProtocolError):
+			if error.errcode not in self.TRANSIENT_STATUS:
+				return None
+			processed = error.errcode not in self.UNPROCESSED_STATUS
+			headers = error.headers or {}
+			retryAfter = headers.get('retry-after') or \
+					headers.get('Retry-After') or ''
+			if retryAfter.strip().isdigit():
+				minimum = min(int(retryAfter), self.maxDelay)
+		elif isinstance(error, (socket.error, httplib.HTTPException)):
+			processed = sent
+		else:
+			return None
+		if processed and not self.isIdempotent(methodName, body):
+			return None
+		delay = min(self.maxDelay, self.baseDelay * 2 ** attempt)
+		return max(minimum, random.uniform(delay / 2, delay))
+
+class GzipEncoding:
+	"""Decides whether XML-RPC request bodies are gzip compressed
+	   (responses are always negotiated with Accept-Encoding: gzip). String
+	   bodies larger than threshold bytes are sent with Content-Encoding:
+	   gzip unless threshold is None or the server has rejected a
+	   compressed request. Servers that cannot decode compressed requests
+	   answer HTTP 400, 411, 415 or 501 or, if they parse the body without
+	   decoding it, an XML-RPC parse error fault (or REST API invalid JSON
+	   error): the first rejection is
+	   remembered for the server and the request resent uncompressed.
+	   Streamed Base64FileBody uploads are not compressed.
+	"""
+
+	REJECTED_STATUS = (400, 411, 415, 501)
+	PARSE_ERROR = -32700
+
+	# Maps server keys to True or False once a compressed request has
+	# shown whether the server accepts them (shared by all transports).
+	support = {}
+
+	def __init__(self, threshold=None):
+		self.threshold = threshold
+
+	def encode(self, key, body):
+		"""Return the compressed request body for server key or None if
+		   body should be sent as is
+		"""
+		if self.threshold is None or not isinstance(body, str) \
+				or len(body) <= self.threshold \
+				or self.support.get(key) is False:
+			return None
+		return xmlrpclib.gzip_encode(body)
+
+	def accepted(self, key):
+		"""A compressed request to server key succeeded
+		"""
+		self.support[key] = True
+
+	def rejected(self, key, error):
+		"""Return True if exception error, the failure of a compressed
+		   request to server key, shows the server cannot decode
+		   compressed requests (none are sent to it from then on)
+		"""
+		if self.support.get(key):
+			return False
+		if isinstance(error, RestError) and error.code:
+			# The REST API reports an unreadable body as invalid JSON.
+			rejected = error.code == 'rest_invalid_json'
+		elif isinstance(error, xmlrpclib.ProtocolError):
+			rejected = error.errcode in self.REJECTED_STATUS
+		elif isinstance(error, xmlrpclib.Fault):
+			rejected = error.faultCode == self.PARSE_ERROR
+		else:
+			rejected = False
+		if rejected:
+			self.support[key] = False
+		return rejected
+
+class CountingResponse:
+	"""httplib.HTTPResponse wrapper that counts the bytes read
+	"""
+
+	def __init__(self, response):
+		self.response = response
+		self.bytesRead = 0
+
+	def read(self, *args):
+		data = self.response.read(*args)
+		self.bytesRead += len(data)
+		return data
+
+	def __getattr__(self, name):
+		return getattr(self.response, name)
+
+class ConcurrencyLimit:
+	"""Thread-safe AIMD (additive increase, multiplicative decrease) limit
+	   on the number of requests in flight to a server. acquire() or
+	   tryAcquire() takes a request slot, release() returns it with the
+	   request's latency and outcome. The limit (between 1 and maximum,
+	   starting at initial) grows by about one request per limit responses
+	   while responses are fast and is multiplied by decrease, at most
+	   once per round trip, when the server pushes back: HTTP 429 or 503
+	   responses, timeouts or a latency more than latencyFactor times the
+	   method's lowest latency (and more than latencyFloor seconds).
+	   Latencies of large requests are compared per SIZE_UNIT bytes so
+	   big uploads are not mistaken for congestion.
+	   listener, if set, is called with a message when the limit changes.
+	"""
+
+	SIZE_UNIT = 64 * 1024
+
+	def __init__(self, maximum=16, initial=None, decrease=0.5,
+			latencyFactor=3, latencyFloor=0.25):
+		self.maximum = maximum
+		self.limit = float(initial or max(1, maximum // 2))
+		self.decrease = decrease
+		self.latencyFactor = latencyFactor
+		self.latencyFloor = latencyFloor
+		self.listener = None
+		self.lock = threading.Condition(threading.Lock())
+		self.inFlight = 0
+		self.latency = None		# Moving average latency in seconds.
+		self.baselines = {}		# Lowest unit latencies keyed by method name.
+		self.lastDecrease = 0
+		self.lowest = self.highest = int(self.limit)
+		self.decreases = 0
+		self.peakInFlight = 0
+
+	def current(self):
+		"""Return the current limit on requests in flight
+		"""
+		return max(1, int(self.limit))
+
+	def acquire(self):
+		"""Wait for a request slot
+		"""
+		self.lock.acquire()
+		try:
+			while self.inFlight >= self.current():
+				self.lock.wait()
+			self._take()
+		finally:
+			self.lock.release()
+
+	def tryAcquire(self):
+		"""Take a request slot if one is free, return True if it was taken
+		"""
+		self.lock.acquire()
+		try:
+			if self.inFlight >= self.current():
+				return False
+			self._take()
+			return True
+		finally:
+			self.lock.release()
+
+	def _take(self):
+		self.inFlight += 1
+		self.peakInFlight = max(self.peakInFlight, self.inFlight)
+
+	def release(self, methodName, latency, outcome, size=0):
+		"""Return the request slot of a size bytes request. outcome is
+		   'ok' (a response, including faults), 'throttled' (HTTP 429 or
+		   503), 'timeout' or 'error' (other failures, which do not change
+		   the limit).
+		"""
+		message = None
+		self.lock.acquire()
+		try:
+			self.inFlight -= 1
+			old = self.current()
+			now = time.time()
+			congested = outcome in ('throttled', 'timeout')
+			if outcome == 'ok':
+				if self.latency is None:
+					self.latency = latency
+				else:
+					self.latency = 0.8 * self.latency + 0.2 * latency
+				unitLatency = latency / max(1.0, float(size) / self.SIZE_UNIT)
+				baseline = min(self.baselines.get(methodName, unitLatency),
+						unitLatency)
+				self.baselines[methodName] = baseline
+				if unitLatency > max(self.latencyFloor,
+						baseline * self.latencyFactor):
+					congested = True
+					outcome = 'slow'
+				else:
+					self.limit = min(self.maximum,
+							self.limit + 1.0 / self.limit)
+			if congested and now - self.lastDecrease > (self.latency or 0):
+				self.limit = max(1.0, self.limit * self.decrease)
+				self.lastDecrease = now
+				self.decreases += 1
+			new = self.current()
+			self.lowest = min(self.lowest, new)
+			self.highest = max(self.highest, new)
+			if new != old:
+				message = 'concurrency limit %d -> %d (%s, latency %.3fs)' % (
+						old, new, outcome, self.latency or 0)
+			self.lock.notifyAll()
+		finally:
+			self.lock.release()
+		if message is not None and self.listener is not None:
+			self.listener(message)
+
+	def report(self):
+		"""Return the limit and latency statistics as a list of printable
+		   lines
+		"""
+		self.lock.acquire()
+		try:
+			return ['limit %d (range %d-%d of %d, %d decreases), '
+					'peak in flight %d, average latency %.3fs' % (
+					self.current(), self.lowest, self.highest, self.maximum,
+					self.decreases, self.peakInFlight, self.latency or 0)]
+		finally:
+			self.lock.release()
 
-	def set_proxy(self, proxy):
+	@staticmethod
+	def outcome(error):
+		"""Return the release() outcome of a request that failed with
+		   exception error (None if it succeeded)
+		"""
+		if error is None or isinstance(error, xmlrpclib.Fault):
+			return 'ok'
+		if isinstance(error, xmlrpclib.ProtocolError) \
+				and error.errcode in (429, 503):
+			return 'throttled'
+		if isinstance(error, socket.timeout):
+			return 'timeout'
+		return 'error'
+
+# ConcurrencyLimits shared by all clients keyed by server URL (see
+# concurrencyLimit()).
+concurrencyLimits = {}
+concurrencyLimitsLock = threading.Lock()
+
+def concurrencyLimit(url, maximum):
+	"""Return the ConcurrencyLimit of server url, creating it with maximum
+	   if there isn't one
+	"""
+	concurrencyLimitsLock.acquire()
+	try:
+		if url not in concurrencyLimits:
+			concurrencyLimits[url] = ConcurrencyLimit(maximum)
+		return concurrencyLimits[url]
+	finally:
+		concurrencyLimitsLock.release()
+
+class PooledTransport(FileBodyTransportMixin, xmlrpclib.Transport):
+	"""Thread-safe XML-RPC transport that keeps HTTP and HTTPS
+	   connections alive in a ConnectionPool and reuses them across calls
+	   and threads (reused HTTPS connections need no new TLS handshake).
+	   Optionally connects through an HTTP proxy (HTTPS is tunnelled with
+	   CONNECT). connectTimeout and readTimeout are in seconds, None
+	   means no timeout. Calls are recorded in the CallStats object stats
+	   and failed calls are retried as decided by the RetryPolicy retry.
+	   If limit is a ConcurrencyLimit each attempt waits for a request
+	   slot. Responses are gzip compressed if the server supports it,
+	   requests as decided by the GzipEncoding gzip.
+	"""
+
+	def __init__(self, scheme='http', proxy=None, connectTimeout=None,
+			readTimeout=None, pool=None, stats=None, retry=None, limit=None,
+			gzip=None):
+		xmlrpclib.Transport.__init__(self)
+		self.scheme = scheme
+		if proxy and '://' in proxy:
+			proxy = urllib.splithost(urllib.splittype(proxy)[1])[0]
 		self.proxy = proxy
+		self.connectTimeout = connectTimeout
+		self.readTimeout = readTimeout
+		self.pool = pool or connectionPool
+		self.stats = stats or callStats
+		self.retry = retry or RetryPolicy()
+		self.limit = limit
+		self.gzip = gzip or GzipEncoding()
 
 	def make_connection(self, host):
-		self.realhost = host
-		h = httplib.HTTP(self.proxy)
-		return h
+		"""Return a new connection to host
+		"""
+		chost, extra_headers, x509 = self.get_host_info(host)
+		if self.connectTimeout is None:
+			timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+		else:
+			timeout = self.connectTimeout
+		if self.proxy:
+			if self.scheme == 'https':
+				conn = httplib.HTTPSConnection(self.proxy, timeout=timeout)
+				conn.set_tunnel(chost)
+			else:
+				conn = httplib.HTTPConnection(self.proxy, timeout=timeout)
+		elif self.scheme == 'https':
+			conn = httplib.HTTPSConnection(chost, timeout=timeout,
+					**(x509 or {}))
+		else:
+			conn = httplib.HTTPConnection(chost, timeout=timeout)
+		self._connect(conn)
+		return conn
+
+	def _connect(self, conn):
+		"""Connect conn (httplib connects lazily while sending a request,
+		   so connection failures would look like failures of a request
+		   that was sent)
+		"""
+		conn.connect()
+		if self.readTimeout is not None:
+			conn.sock.settimeout(self.readTimeout)
+
+	def request(self, host, handler, request_body, verbose=0):
+		if hasattr(request_body, 'head'):
+			head = request_body.head	# Base64FileBody.
+		else:
+			head = request_body[:512]
+		mo = re.search(r'<methodName>([^<]*)</methodName>', head)
+		methodName = mo and mo.group(1) or 'unknown'
+		return self._perform(host, handler, request_body, methodName, verbose)
+
+	def _perform(self, host, handler, request_body, methodName, verbose=0):
+		"""Send request_body to handler with retries, recording the
+		   attempts as calls of methodName
+		"""
+		key = (self.scheme, host, self.proxy)
+		attempt = 0
+		while True:
+			gzipped = self.gzip.encode(key, request_body)
+			requestBytes = len(gzipped or request_body)
+			exchange = {'responseBytes': 0, 'sent': False, 'written': False,
+					'gzipped': gzipped, 'idempotent':
+						self.retry.isIdempotent(methodName, request_body)}
+			if self.limit is not None:
+				self.limit.acquire()
+			started = time.time()
+			status = 'error'
+			error = None
+			try:
+				try:
+					result = self._request(host, handler, request_body,
+							verbose, exchange)
+					status = 'ok'
+					if gzipped:
+						self.gzip.accepted(key)
+					return result
+				except xmlrpclib.Fault, e:
+					if not gzipped or not self.gzip.rejected(key, e):
+						status = 'fault'
+						raise
+					# The server could not read the compressed request,
+					# resend it uncompressed.
+					error = e
+					status = 'retry'
+					continue
+				except (socket.error, httplib.HTTPException,
+						xmlrpclib.ProtocolError), e:
+					error = e
+					if gzipped and self.gzip.rejected(key, e):
+						status = 'retry'
+						continue
+					delay = self.retry.delay(attempt, methodName,
+							request_body, e, exchange['sent'])
+					if delay is None:
+						raise
+					status = 'retry'
+					attempt += 1
+			finally:
+				latency = time.time() - started
+				self.stats.record(methodName, requestBytes,
+						exchange['responseBytes'], latency, status)
+				if self.limit is not None:
+					if status in ('ok', 'fault'):
+						outcome = 'ok'
+					elif error is not None:
+						outcome = ConcurrencyLimit.outcome(error)
+					else:
+						outcome = 'error'
+					self.limit.release(methodName, latency, outcome,
+							requestBytes)
+			time.sleep(delay)
+
+	def _request(self, host, handler, request_body, verbose, exchange):
+		key = (self.scheme, host, self.proxy)
+		conn = self.pool.get(key)
+		if conn is not None:
+			# If the server has closed the idle connection the request is
+			# resent on a new connection, unless it may have been
+			# processed: it was completely written and is not idempotent.
+			try:
+				return self.single_request(key, conn, handler, request_body,
+						verbose, exchange)
+			except socket.error, e:
+				if e.errno not in (errno.ECONNRESET, errno.ECONNABORTED,
+						errno.EPIPE):
+					raise
+				if exchange['written'] and not exchange['idempotent']:
+					raise
+			except httplib.BadStatusLine:
+				if exchange['written'] and not exchange['idempotent']:
+					raise
+			exchange['sent'] = exchange['written'] = False
+		conn = self.make_connection(host)
+		return self.single_request(key, conn, handler, request_body, verbose,
+				exchange)
+
+	def single_request(self, key, conn, handler, request_body, verbose=0,
+			exchange=None):
+		"""Send request on connection conn, return the connection to the
+		   pool once the response has been read. The number of response
+		   bytes read is stored in exchange['responseBytes'], if
+		   exchange['gzipped'] is set it is sent as the compressed body.
+		"""
+		scheme, host, proxy = key
+		if proxy and scheme == 'http':
+			handler = 'http://%s%s' % (self.get_host_info(host)[0], handler)
+		try:
+			if verbose:
+				conn.set_debuglevel(1)
+			if conn.sock is None:
+				self._connect(conn)
+			if exchange is not None:
+				exchange['sent'] = True
+			self.send_request(conn, handler, request_body)
+			self.send_host(conn, host)
+			self.send_user_agent(conn)
+			if exchange is not None and exchange.get('gzipped'):
+				conn.putheader('Content-Encoding', 'gzip')
+				request_body = exchange['gzipped']
+			self.send_content(conn, request_body)
+			if exchange is not None:
+				exchange['written'] = True
+			response = CountingResponse(conn.getresponse(buffering=True))
+			try:
+				if response.status != 200:
+					response.read()
+					raise xmlrpclib.ProtocolError(host + handler,
+							response.status, response.reason, response.msg)
+				self.verbose = verbose
+				try:
+					result = self.parse_response(response)
+				except xmlrpclib.Fault:
+					# The response has been read, the connection is reusable.
+					self._release(key, conn, response)
+					raise
+			finally:
+				if exchange is not None:
+					exchange['responseBytes'] = response.bytesRead
+		except xmlrpclib.Fault:
+			raise
+		except:
+			conn.close()
+			raise
+		self._release(key, conn, response)
+		return result
+
+	def _release(self, key, conn, response):
+		if response.will_close:
+			conn.close()
+		else:
+			self.pool.put(key, conn)
+
+class RestError(xmlrpclib.ProtocolError):
+	"""Failed WordPress REST API request. If the response is a REST API
+	   error object code is its error code (for example
+	   'rest_post_invalid_id') and errmsg its message.
+	"""
+
+	def __init__(self, url, errcode, errmsg, headers, body=''):
+		xmlrpclib.ProtocolError.__init__(self, url, errcode, errmsg, headers)
+		self.code = ''
+		try:
+			error = json.loads(body)
+		except ValueError:
+			error = None
+		if isinstance(error, dict) and error.get('message'):
+			self.code = error.get('code') or ''
+			self.errmsg = error['message']
+
+def restResult(url, status, reason, headers, body):
+	"""Return the decoded JSON body of a REST API response, raise
+	   RestError if status is not a 2xx success status
+	"""
+	if not 200 <= status < 300:
+		raise RestError(url, status, reason, headers, body)
+	if not body:
+		return None
+	return json.loads(body)
+
+def gzipDecode(response, body):
+	"""Return response body decompressed if the response headers
+	   (httplib.HTTPMessage or dict keyed by lower-cased name) say it is
+	   gzip encoded
+	"""
+	encoding = response.get('content-encoding') or ''
+	if encoding.lower() == 'gzip':
+		return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+	return body
+
+class RestTransport(PooledTransport):
+	"""PooledTransport for WordPress REST API requests: perform() sends
+	   an HTTP request with an optional JSON string or file-like body and
+	   returns the decoded JSON response
+	"""
 
-	def send_request(self, connection, handler, request_body):
-		connection.putrequest("POST", 'http://%s%s' % (self.realhost, handler))
+	def perform(self, host, method, path, headers, body, methodName):
+		"""Send method request for path to host with the list of (name,
+		   value) headers and body (a string or file-like body) and return
+		   the decoded response, calls are recorded as methodName
+		"""
+		return self._perform(host, (method, path, headers), body, methodName)
 
-	def send_host(self, connection, host):
-		connection.putheader('Host', self.realhost)
+	def single_request(self, key, conn, request, body, verbose=0,
+			exchange=None):
+		method, path, headers = request
+		scheme, host, proxy = key
+		if proxy and scheme == 'http':
+			path = 'http://%s%s' % (self.get_host_info(host)[0], path)
+		try:
+			if verbose:
+				conn.set_debuglevel(1)
+			if conn.sock is None:
+				self._connect(conn)
+			exchange['sent'] = True
+			conn.putrequest(method, path, skip_accept_encoding=True)
+			conn.putheader('Accept-Encoding', 'gzip')
+			self.send_host(conn, host)
+			self.send_user_agent(conn)
+			for name, value in headers:
+				conn.putheader(name, value)
+			if exchange.get('gzipped'):
+				conn.putheader('Content-Encoding', 'gzip')
+				body = exchange['gzipped']
+			elif hasattr(body, 'seek'):
+				# Rewind the body in case the request is being retried.
+				body.seek(0)
+			conn.putheader('Content-Length', str(len(body)))
+			conn.endheaders(body)
+			exchange['written'] = True
+			response = CountingResponse(conn.getresponse(buffering=True))
+			try:
+				data = response.read()
+			finally:
+				exchange['responseBytes'] = response.bytesRead
+		except:
+			conn.close()
+			raise
+		# The response has been read, the connection is reusable.
+		self._release(key, conn, response)
+		return restResult(host + path, response.status, response.reason,
+				response.msg, gzipDecode(response.msg, data))
 
 class WordPressClient:
 	"""Client for connect to WordPress XML-RPC interface
 	"""
 	
-	def __init__(self, url, user, password, proxy=None):
+	def __init__(self, url, user, password, proxy=None,
+			connectTimeout=None, readTimeout=None, callStats=None, retries=0,
+			maxRequests=None, gzipThreshold=None):
 		self.url = url
 		self.user = user
 		self.password = password
 		self.blogId = 0
 		self.categories = None
-		if not proxy:
-			self._server = xmlrpclib.ServerProxy(self.url)
-		else:
-			p = ProxiedTransport()
-			p.set_proxy(proxy)
-			self._server = xmlrpclib.Server(self.url, transport=p)
+		# PooledTransport is thread-safe so one server proxy is shared
+		# by all threads. If maxRequests is set the requests in flight
+		# are limited by the server's shared ConcurrencyLimit. Request
+		# bodies larger than gzipThreshold bytes are compressed if the
+		# server accepts them (None disables request compression).
+		limit = None
+		if maxRequests:
+			limit = concurrencyLimit(url, maxRequests)
+		self._transport = PooledTransport(
+				urllib.splittype(url)[0].lower(), proxy,
+				connectTimeout, readTimeout, stats=callStats,
+				retry=RetryPolicy(retries), limit=limit,
+				gzip=GzipEncoding(gzipThreshold))
+		# CallStats recording this client's server calls (by default the
+		# module-level callStats shared by all clients).
+		self.callStats = self._transport.stats
+		self._server = xmlrpclib.ServerProxy(self.url,
+				transport=self._transport)
+		# Post structs fetched by newPost/editPost/editPage(fetch=True).
+		self._fetched = {}
+
+	def _streamCall(self, methodName, params, fileName):
+		"""Call XML-RPC method with params in which the first string
+		   value equal to the placeholder BASE64_FILE is replaced by the
+		   base64 encoded contents of file fileName. The request body is
+		   streamed from the file so it is never held in memory.
+		"""
+		body = self._streamBody(methodName, params, fileName)
+		host, handler = urllib.splithost(urllib.splittype(self.url)[1])
+		try:
+			return self._transport.request(host, handler or '/RPC2', body)[0]
+		finally:
+			body.close()
+
+	def _streamBody(self, methodName, params, fileName):
+		"""Return _streamCall request body
+		"""
+		request = xmlrpclib.dumps(params, methodName)
+		head, tail = request.split('<string>%s</string>' % self.BASE64_FILE, 1)
+		return Base64FileBody(head + '<base64>', fileName, '</base64>' + tail)
+
+	BASE64_FILE = '__wordpresslib_base64_file__'
+
+	# Maps server URLs to True or False once a batch has shown whether
+	# they support system.multicall (shared by all clients).
+	multiCallSupport = {}
+
+	# XML-RPC fault code of calls to methods the server does not have.
+	METHOD_NOT_FOUND = -32601
+
+	def _multiCall(self, calls):
+		"""Execute calls, a list of (methodName, params) tuples, and
+		   return the list of results. If the server supports
+		   system.multicall the calls are sent in a single request,
+		   otherwise (the multicall faults with METHOD_NOT_FOUND) they are
+		   executed one at a time. Either way the first call to fail
+		   raises its xmlrpclib.Fault.
+		"""
+		if self.multiCallSupport.get(self.url) is not False and len(calls) > 1:
+			try:
+				results = self._server.system.multicall(
+						[{'methodName': name, 'params': params}
+							for name, params in calls])
+			except xmlrpclib.Fault, fault:
+				# Faults from batched calls are returned in the results.
+				if fault.faultCode != self.METHOD_NOT_FOUND:
+					raise
+				self.multiCallSupport[self.url] = False
+			else:
+				self.multiCallSupport[self.url] = True
+				for result in results:
+					if isinstance(result, dict):
+						raise xmlrpclib.Fault(result['faultCode'],
+								result['faultString'])
+				return [result[0] for result in results]
+		return [getattr(self._server, name)(*params) for name, params in calls]
+
+	def _fetchedPost(self, methodName, postId):
+		"""Return and forget the post struct fetched along with the last
+		   edit of postId, or None.
+		"""
+		return self._fetched.pop((methodName, str(postId)), None)
 
 	def _filterPost(self, post):
 		"""Transform post struct in WordPressPost instance 
@@ -204,11 +1132,86 @@ class WordPressClient:
 		except xmlrpclib.Fault, fault:
 			raise WordPressException(fault)
 			
+	def _filterWpPost(self, post):
+		"""Transform wp.getPosts post struct in WordPressPost instance
+		"""
+		def parseDate(value):
+			try:
+				return time.strptime(str(value).rstrip('Z'), "%Y%m%dT%H:%M:%S")
+			except ValueError:
+				# Unset (all zero) dates e.g. draft post_date_gmt.
+				return None
+		postObj = WordPressPost()
+		postObj.id				= int(post['post_id'])
+		postObj.title			= post.get('post_title', '')
+		postObj.status			= post.get('post_status', '')
+		postObj.postType		= post.get('post_type', '')
+		postObj.permaLink		= post.get('link', '')
+		postObj.link			= post.get('link', '')
+		if 'post_date_gmt' in post:
+			postObj.date		= parseDate(post['post_date_gmt'])
+		if 'post_modified_gmt' in post:
+			postObj.modified	= parseDate(post['post_modified_gmt'])
+		postObj.categories		= [term['name'] for term in post.get('terms', [])
+				if term.get('taxonomy') == 'category']
+		return postObj
+
+	def getPosts(self, filter=None, fields=None):
+		"""Get posts matching wp.getPosts filter struct (post_type,
+		   post_status, number, offset, orderby, order), fields is an
+		   optional list of the post fields to return
+		"""
+		try:
+			params = [self.blogId, self.user, self.password, filter or {}]
+			if fields is not None:
+				params.append(fields)
+			posts = self._server.wp.getPosts(*params)
+			for post in posts:
+				yield self._filterWpPost(post)
+		except xmlrpclib.Fault, fault:
+			raise WordPressException(fault)
+
+	def _filterMedia(self, item):
+		"""Transform wp.getMediaLibrary item struct in WordPressMediaItem instance
+		"""
+		mediaObj = WordPressMediaItem()
+		mediaObj.id				= int(item['attachment_id'])
+		mediaObj.url			= item.get('link', '')
+		mediaObj.title			= item.get('title', '')
+		mediaObj.parent			= int(item.get('parent') or 0)
+		mediaObj.mimeType		= item.get('type', '')
+		if 'date_created_gmt' in item:
+			mediaObj.date		= time.strptime(str(item['date_created_gmt']).rstrip('Z'),
+					"%Y%m%dT%H:%M:%S")
+		# Only images have metadata and only recent WordPress versions
+		# include the file size.
+		metadata = item.get('metadata') or {}
+		if metadata.get('file'):
+			mediaObj.file		= metadata['file']
+		if metadata.get('filesize'):
+			mediaObj.size		= int(metadata['filesize'])
+		return mediaObj
+
+	def getMediaLibrary(self, filter=None):
+		"""Get media library items matching wp.getMediaLibrary filter
+		   struct (number, offset, parent_id, mime_type)
+		"""
+		try:
+			items = self._server.wp.getMediaLibrary(self.blogId, self.user,
+					self.password, filter or {})
+			for item in items:
+				yield self._filterMedia(item)
+		except xmlrpclib.Fault, fault:
+			raise WordPressException(fault)
+
 	def getPost(self, postId):
 		"""Get post item
 		"""
 		try:
-			return self._filterPost(self._server.metaWeblog.getPost(str(postId), self.user, self.password))
+			post = self._fetchedPost('metaWeblog.getPost', postId)
+			if post is None:
+				post = self._server.metaWeblog.getPost(str(postId), self.user, self.password)
+			return self._filterPost(post)
 		except xmlrpclib.Fault, fault:
 			raise WordPressException(fault)
 		
@@ -242,16 +1245,18 @@ class WordPressClient:
 		except xmlrpclib.Fault, fault:
 			raise WordPressException(fault)
 			
-	def newPost(self, post, publish):
-		"""Insert new post
+	def _newPostContent(self, post):
+		"""Return newPost content struct of WordPressPost post
 		"""
-		blogContent = {
+		return {
 			'title' : post.title,
 			'description' : post.description,
 			'mt_text_more': post.textMore,
 		}
-		
-		# add categories
+
+	def _postCategories(self, post):
+		"""Return setPostCategories categories of WordPressPost post
+		"""
 		i = 0
 		categories = []
 		for cat in post.categories:
@@ -260,16 +1265,23 @@ class WordPressClient:
 			else:
 				categories.append({'categoryId' : cat, 'isPrimary' : 0})
 			i += 1
+		return categories
+
+	def newPost(self, post, publish, fetch=False):
+		"""Insert new post. If fetch is True the new post is fetched in
+		   the same batch as its categories and publication so a following
+		   getPost call needs no round-trip.
+		"""
+		blogContent = self._newPostContent(post)
+		
+		# add categories
+		categories = self._postCategories(post)
 		
 		# insert new post
 		idNewPost = int(self._server.metaWeblog.newPost(self.blogId, self.user, self.password, blogContent, 0))
 		
-		# set categories for new post
-		self.setPostCategories(idNewPost, categories)
-		
-		# publish post if publish set at True 
-		if publish:
-			self.publishPost(idNewPost)
+		# set categories, publish and fetch the new post in one batch
+		self._batchPostCalls(idNewPost, categories, publish, fetch)
 			
 		return idNewPost
 	   
@@ -289,8 +1301,21 @@ class WordPressClient:
 		"""
 		self._server.mt.setPostCategories(postId, self.user, self.password, categories)
 	
-	def editPost(self, postId, post, publish):
-		"""Edit post
+	def editPost(self, postId, post, publish, fetch=False):
+		"""Edit post. If fetch is True the edited post is fetched in the
+		   same batch as its categories and publication so a following
+		   getPost call needs no round-trip.
+		"""
+		result = self._server.metaWeblog.editPost(postId, self.user,
+				self.password, self._editPostContent(post), 0)
+		self._editResult(result)
+
+		# set categories, publish and fetch the post in one batch
+		self._batchPostCalls(postId, self._postCategories(post), publish,
+				fetch)
+
+	def _editPostContent(self, post):
+		"""Return editPost content struct of WordPressPost post
 		"""
 		blogcontent = {
 			'title' : post.title,
@@ -303,29 +1328,39 @@ class WordPressClient:
 		
 		if post.date:
 			blogcontent['dateCreated'] = xmlrpclib.DateTime(post.date) 
-		
-		# add categories
-		i = 0
-		categories = []
-		for cat in post.categories:
-			if i == 0:
-				categories.append({'categoryId' : cat, 'isPrimary' : 1})
-			else:
-				categories.append({'categoryId' : cat, 'isPrimary' : 0})
-			i += 1				 
-		
-		result = self._server.metaWeblog.editPost(postId, self.user, self.password,
-											  blogcontent, 0)
-		
+		return blogcontent
+
+	def _batchPostCalls(self, postId, categories, publish, fetch):
+		"""Run the setPostCategories, publishPost and getPost calls that
+		   complete a new or edited post as a single multicall.
+		"""
+		results = self._multiCall(self._postCalls(postId, categories,
+				publish, fetch))
+		self._postResults(postId, results, fetch)
+
+	def _postCalls(self, postId, categories, publish, fetch):
+		"""Return the _batchPostCalls (methodName, params) list
+		"""
+		calls = [('mt.setPostCategories',
+				(postId, self.user, self.password, categories))]
+		if publish:
+			calls.append(('mt.publishPost', (postId, self.user, self.password)))
+		if fetch:
+			calls.append(('metaWeblog.getPost',
+				(str(postId), self.user, self.password)))
+		return calls
+
+	def _editResult(self, result):
+		"""Check the metaWeblog.editPost result
+		"""
 		if result == 0:
 			raise WordPressException('Post edit failed')
-			
-		# set categories for new post
-		self.setPostCategories(postId, categories)
-		
-		# publish new post
-		if publish:
-			self.publishPost(postId)
+
+	def _postResults(self, postId, results, fetch):
+		"""Keep the post fetched by _batchPostCalls
+		"""
+		if fetch:
+			self._fetched[('metaWeblog.getPost', str(postId))] = results[-1]
 
 	def deletePost(self, postId):
 		"""Delete post
@@ -382,21 +1417,23 @@ class WordPressClient:
 		except xmlrpclib.Fault, fault:
 			raise WordPressException(fault)
 			
+	def _mediaParams(self, mediaFileName):
+		"""Return newMediaObject params, the file contents are streamed
+		   in place of the BASE64_FILE placeholder
+		"""
+		mediaStruct = {
+			'name' : os.path.basename(mediaFileName),
+			'bits' : self.BASE64_FILE
+		}
+		return (self.blogId, self.user, self.password, mediaStruct)
+
 	def newMediaObject(self, mediaFileName):
 		"""Add new media object (image, movie, etc...)
 		"""
 		try:
-			f = file(mediaFileName, 'rb')
-			mediaBits = f.read()
-			f.close()
-			
-			mediaStruct = {
-				'name' : os.path.basename(mediaFileName),
-				'bits' : xmlrpclib.Binary(mediaBits)
-			}
-			
-			result = self._server.metaWeblog.newMediaObject(self.blogId, 
-									self.user, self.password, mediaStruct)
+			# Stream the file rather than reading it into an xmlrpclib.Binary.
+			result = self._streamCall('metaWeblog.newMediaObject',
+					self._mediaParams(mediaFileName), mediaFileName)
 			return result['url']
 			
 		except xmlrpclib.Fault, fault:
@@ -449,27 +1486,34 @@ class WordPressClient:
 		"""Get post item
 		"""
 		try:
-			return self._filterPage(self._server.wp.getPage(self.blogId, str(postId), self.user, self.password))
+			post = self._fetchedPost('wp.getPage', postId)
+			if post is None:
+				post = self._server.wp.getPage(self.blogId, str(postId), self.user, self.password)
+			return self._filterPage(post)
 		except xmlrpclib.Fault, fault:
 			raise WordPressException(fault)
 		
 	def newPage(self, post, publish):
 		"""Insert new page
 		"""
-		blogContent = {
-			'title' : post.title,
-			'description' : post.description,
-			'mt_text_more': post.textMore,
-			'permaLink' : post.permaLink,
-		}
+		blogContent = self._pageContent(post)
 		
 		# insert new post
 		postId = int(self._server.wp.newPage(self.blogId, self.user, self.password, blogContent, publish))
 
 		return postId
 	   
-	def editPage(self, postId, post, publish):
-		"""Edit page
+	def editPage(self, postId, post, publish, fetch=False):
+		"""Edit page. If fetch is True the edited page is fetched in the
+		   same request so a following getPage call needs no round-trip.
+		"""
+		results = self._multiCall(self._editPageCalls(postId, post, publish,
+				fetch))
+		self._editPageResults(postId, results, fetch)
+
+	def _pageContent(self, post, edit=False):
+		"""Return newPage (or editPage if edit is True) content struct of
+		   WordPressPost post
 		"""
 		blogcontent = {
 			'title' : post.title,
@@ -478,14 +1522,27 @@ class WordPressClient:
 			'permaLink' : post.permaLink,
 		}
 		
-		if post.date:
+		if edit and post.date:
 			blogcontent['dateCreated'] = xmlrpclib.DateTime(post.date) 
-		
-		result = self._server.wp.editPage(self.blogId, postId, self.user, self.password,
-											  blogcontent, publish)
-		
-		if result == 0:
+		return blogcontent
+
+	def _editPageCalls(self, postId, post, publish, fetch):
+		"""Return the editPage (methodName, params) list
+		"""
+		calls = [('wp.editPage', (self.blogId, postId, self.user, self.password,
+											  self._pageContent(post, True), publish))]
+		if fetch:
+			calls.append(('wp.getPage',
+				(self.blogId, str(postId), self.user, self.password)))
+		return calls
+
+	def _editPageResults(self, postId, results, fetch):
+		"""Check the editPage results and keep the fetched page
+		"""
+		if results[0] == 0:
 			raise WordPressException('Page edit failed')
+		if fetch:
+			self._fetched[('wp.getPage', str(postId))] = results[-1]
 
 	def deletePage(self, postId):
 		"""Delete page
@@ -512,6 +1569,1392 @@ class WordPressClient:
 		except xmlrpclib.Fault, fault:
 			raise WordPressException(fault)
 
+	def newCategories(self, names):
+		"""Create new categories in a single request (if the server
+		   supports system.multicall). Return list of new categoryIds.
+		"""
+		try:
+			return [int(catId) for catId in self._multiCall(
+				[('wp.newCategory', (self.blogId, self.user, self.password,
+					{'name': name})) for name in names])]
+		except xmlrpclib.Fault, fault:
+			raise WordPressException(fault)
+
 	#####################
 	# End of Patch
 	#####################
+
+class AsyncCall:
+	"""Result of an AsyncWordPressClient call. get() runs the client's
+	   event loop until the call has completed then returns the result or
+	   raises the exception of the call.
+	"""
+
+	def __init__(self, client):
+		self.client = client
+		self.done = False
+		self.result = None
+		self.error = None		# sys.exc_info() tuple if the call failed.
+		self.callbacks = []
+
+	def ready(self):
+		return self.done
+
+	def get(self):
+		if not self.done:
+			self.client.run([self])
+		if self.error:
+			raise self.error[0], self.error[1], self.error[2]
+		return self.result
+
+	def addCallback(self, func):
+		"""Call func(call) when the call completes
+		"""
+		if self.done:
+			func(self)
+		else:
+			self.callbacks.append(func)
+
+	def complete(self, result=None, error=None):
+		self.done = True
+		self.result = result
+		self.error = error
+		callbacks, self.callbacks = self.callbacks, []
+		for func in callbacks:
+			func(self)
+
+	def then(self, func=None, onError=None):
+		"""Return a call that completes with func(result) or, if the call
+		   fails, onError(error) where error is the sys.exc_info() tuple.
+		   A missing func passes the result on, a missing onError the
+		   error. If func or onError return an AsyncCall the returned call
+		   completes with its outcome.
+		"""
+		chained = AsyncCall(self.client)
+		def completed(call):
+			try:
+				if call.error:
+					if onError is None:
+						chained.complete(error=call.error)
+						return
+					result = onError(call.error)
+				elif func is None:
+					result = call.result
+				else:
+					result = func(call.result)
+			except:
+				chained.complete(error=sys.exc_info())
+				return
+			if isinstance(result, AsyncCall):
+				result.addCallback(
+					lambda call: chained.complete(call.result, call.error))
+			else:
+				chained.complete(result)
+		self.addCallback(completed)
+		return chained
+
+class AsyncConnection:
+	"""Non-blocking HTTP(S) connection of an AsyncTransport
+	"""
+
+	def __init__(self, sock):
+		self.sock = sock
+		self.state = 'connect'	# connect, tunnel, handshake, send or receive.
+		self.want = 'w'			# TLS handshake wants to read ('r') or write ('w').
+		self.reused = False
+		self.reset()
+
+	def reset(self):
+		"""Prepare for the next request
+		"""
+		self.call = None		# Call being sent or received.
+		self.out = ''			# Pending output.
+		self.body = None		# File-like request body still to be sent.
+		self.inbuf = ''			# Input not yet parsed.
+		self.headers = None		# Response headers keyed by lower-cased name.
+		self.status = None
+		self.reason = ''
+		self.version = ''
+		self.chunks = []		# Response body chunks.
+		self.received = 0		# Response body bytes.
+		self.bytesRead = 0		# Response bytes including the headers.
+		self.chunkSize = None	# Size of the chunk being read (chunked bodies).
+		self.started = None
+		self.deadline = None
+
+	def fileno(self):
+		return self.sock.fileno()
+
+	def close(self):
+		self.sock.close()
+
+# Idle connections shared by all AsyncWordPressClient instances.
+asyncConnectionPool = ConnectionPool()
+
+class AsyncTransport:
+	"""Single threaded XML-RPC transport that keeps up to maxConnections
+	   requests in flight on non-blocking keep-alive HTTP(S) connections,
+	   optionally through an HTTP proxy (HTTPS is tunnelled with CONNECT).
+	   Requests are queued by submit() and performed by the select() event
+	   loop in run(). connectTimeout and readTimeout are in seconds, None
+	   means no timeout. Calls are recorded in the CallStats object stats
+	   and failed calls are requeued as decided by the RetryPolicy retry.
+	   If limit is a ConcurrencyLimit calls also wait for a request slot.
+	   Responses are gzip compressed if the server supports it, requests
+	   as decided by the GzipEncoding gzip. A transport must only be used
+	   by one thread at a time.
+	"""
+
+	BUFFER_SIZE = 64 * 1024
+	LIMIT_POLL = 0.01	# Seconds between polls for a free limit slot.
+
+	def __init__(self, url, proxy=None, connectTimeout=None, readTimeout=None,
+			maxConnections=8, pool=None, stats=None, retry=None, limit=None,
+			gzip=None):
+		scheme, rest = urllib.splittype(url)
+		self.scheme = scheme.lower()
+		self.host, self.handler = urllib.splithost(rest)
+		self.handler = self.handler or '/RPC2'
+		if proxy and '://' in proxy:
+			proxy = urllib.splithost(urllib.splittype(proxy)[1])[0]
+		self.proxy = proxy
+		self.connectTimeout = connectTimeout
+		self.readTimeout = readTimeout
+		self.maxConnections = maxConnections
+		self.pool = pool or asyncConnectionPool
+		self.stats = stats or callStats
+		self.retry = retry or RetryPolicy()
+		self.limit = limit
+		self.gzip = gzip or GzipEncoding()
+		self.limited = False	# Set if queued calls wait for limit slots.
+		self.key = (self.scheme, self.host, self.proxy)
+		self.queue = []		# Calls waiting for a connection.
+		self.active = []	# Connections with a call in progress.
+		self.address = None
+		self.sslContext = None
+
+	def submit(self, call, methodName, body, request=None):
+		"""Queue XML-RPC request body (a string or a Base64FileBody) for
+		   AsyncCall call. If request is a (method, path, headers) tuple
+		   body (a string or file-like body) is sent as a REST API request
+		   and the call's result is the decoded JSON response.
+		"""
+		call.methodName = methodName
+		call.body = body
+		call.request = request
+		call.retried = False	# Retried on a new connection.
+		call.attempt = 0		# Failed attempts retried by self.retry.
+		call.notBefore = 0		# Time the retry backoff ends.
+		call.slot = False		# Set while holding a self.limit slot.
+		call.gzipped = None		# Compressed body of the request being sent.
+		self.queue.append(call)
+		return call
+
+	def run(self, calls=None):
+		"""Run the event loop until calls (by default all queued calls)
+		   have completed
+		"""
+		while True:
+			if calls is None:
+				if not self.queue and not self.active:
+					break
+			elif not [call for call in calls if not call.done]:
+				break
+			assert self.queue or self.active, 'calls will never complete'
+			self._start()
+			self._poll()
+
+	def _start(self):
+		"""Assign queued calls that are not backing off to idle or new
+		   connections
+		"""
+		now = time.time()
+		self.limited = False
+		for call in list(self.queue):
+			if len(self.active) >= self.maxConnections:
+				break
+			if call.notBefore > now:
+				continue
+			if self.limit is not None:
+				if not self.limit.tryAcquire():
+					self.limited = True
+					break
+				call.slot = True
+			self.queue.remove(call)
+			try:
+				conn = self.pool.get(self.key)
+				if conn is None:
+					conn = self._connect()
+				else:
+					conn.reused = True
+			except:
+				if not self._retry(None, call, sys.exc_info(), False):
+					self._finish(None, call, error=sys.exc_info())
+				continue
+			conn.call = call
+			conn.started = time.time()
+			if conn.state == 'connect':
+				conn.deadline = self._deadline(self.connectTimeout)
+			else:
+				self._request(conn)
+			self.active.append(conn)
+
+	def _deadline(self, timeout):
+		if timeout is None:
+			return None
+		return time.time() + timeout
+
+	def _connect(self):
+		"""Start connecting to the server (or proxy)
+		"""
+		if self.address is None:
+			if self.proxy:
+				host, port = urllib.splitport(self.proxy)
+				port = port or 80
+			else:
+				host, port = urllib.splitport(self.host)
+				port = port or (self.scheme == 'https' and 443 or 80)
+			self.address = socket.getaddrinfo(host, int(port), 0,
+					socket.SOCK_STREAM)[0]
+		family, socktype, proto, canonname, sockaddr = self.address
+		sock = socket.socket(family, socktype, proto)
+		sock.setblocking(0)
+		err = sock.connect_ex(sockaddr)
+		if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+			sock.close()
+			raise socket.error(err, os.strerror(err))
+		return AsyncConnection(sock)
+
+	def _connected(self, conn):
+		"""The TCP connection is up: tunnel, start TLS or send the request
+		"""
+		if self.scheme == 'https' and self.proxy and conn.state == 'connect':
+			conn.state = 'tunnel'
+			conn.out = 'CONNECT %s HTTP/1.1\r\nHost: %s\r\n\r\n' % (
+					self._hostPort(), self._hostPort())
+		elif self.scheme == 'https' and conn.state != 'handshake':
+			if self.sslContext is None:
+				self.sslContext = ssl.create_default_context()
+			conn.sock = self.sslContext.wrap_socket(conn.sock,
+					server_hostname=urllib.splitport(self.host)[0],
+					do_handshake_on_connect=False)
+			conn.state = 'handshake'
+			self._handshake(conn)
+		else:
+			self._request(conn)
+
+	def _hostPort(self):
+		host, port = urllib.splitport(self.host)
+		return '%s:%s' % (host, port or 443)
+
+	def _handshake(self, conn):
+		try:
+			conn.sock.do_handshake()
+		except ssl.SSLWantReadError:
+			conn.want = 'r'
+		except ssl.SSLWantWriteError:
+			conn.want = 'w'
+		else:
+			self._request(conn)
+
+	def _request(self, conn):
+		"""Start sending the request of conn.call
+		"""
+		call = conn.call
+		method, handler, headers = call.request or \
+				('POST', self.handler, [('Content-Type', 'text/xml')])
+		if self.proxy and self.scheme == 'http':
+			handler = 'http://%s%s' % (self.host, handler)
+		conn.state = 'send'
+		call.gzipped = self.gzip.encode(self.key, call.body)
+		headers = headers + [('Accept-Encoding', 'gzip')]
+		if call.gzipped:
+			headers.append(('Content-Encoding', 'gzip'))
+		conn.out = ('%s %s HTTP/1.1\r\nHost: %s\r\nUser-Agent: %s\r\n'
+			'%sContent-Length: %d\r\n\r\n' % (method, handler, self.host,
+				xmlrpclib.Transport.user_agent,
+				''.join(['%s: %s\r\n' % header for header in headers]),
+				self._bodySize(call)))
+		if call.gzipped:
+			conn.out += call.gzipped
+		elif hasattr(call.body, 'seek'):
+			call.body.seek(0)
+			conn.body = call.body
+		else:
+			conn.out += call.body
+		conn.deadline = self._deadline(self.readTimeout)
+
+	def _poll(self):
+		"""Wait for and process connection events
+		"""
+		readers, writers = [], []
+		deadlines = []
+		for conn in self.active:
+			if conn.state == 'connect':
+				writers.append(conn)
+			elif conn.state == 'handshake':
+				if conn.want == 'r':
+					readers.append(conn)
+				else:
+					writers.append(conn)
+			elif conn.out or conn.body:
+				writers.append(conn)
+			else:
+				readers.append(conn)
+			if conn.deadline is not None:
+				deadlines.append(conn.deadline)
+		if self.queue and len(self.active) < self.maxConnections:
+			# Wake up when the first backoff ends or, if slots are held
+			# by other transports, poll for a free slot.
+			deadlines.append(min(call.notBefore for call in self.queue))
+			if self.limited:
+				deadlines.append(time.time() + self.LIMIT_POLL)
+		timeout = None
+		if deadlines:
+			timeout = max(0, min(deadlines) - time.time())
+		try:
+			readable, writable, _ = select.select(readers, writers, [],
+					timeout)
+		except select.error, e:
+			if e.args[0] == errno.EINTR:
+				return
+			raise
+		for conn in readable + writable:
+			try:
+				self._step(conn)
+			except:
+				self._failed(conn, sys.exc_info())
+		now = time.time()
+		for conn in list(self.active):
+			if conn.deadline is not None and now > conn.deadline:
+				try:
+					raise socket.timeout('timed out')
+				except socket.timeout:
+					self._failed(conn, sys.exc_info())
+
+	def _step(self, conn):
+		"""Make progress on conn
+		"""
+		if conn not in self.active:
+			return
+		if conn.state == 'connect':
+			err = conn.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+			if err:
+				raise socket.error(err, os.strerror(err))
+			self._connected(conn)
+		elif conn.state == 'handshake':
+			self._handshake(conn)
+		elif conn.out or conn.body:
+			self._send(conn)
+		else:
+			self._receive(conn)
+
+	def _send(self, conn):
+		if not conn.out:
+			conn.out = conn.body.read(self.BUFFER_SIZE)
+			if not conn.out:
+				conn.body = None
+				return
+		try:
+			n = conn.sock.send(conn.out)
+		except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+			return
+		except socket.error, e:
+			if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+				return
+			raise
+		conn.out = conn.out[n:]
+		conn.deadline = self._deadline(conn.state == 'tunnel'
+				and self.connectTimeout or self.readTimeout)
+
+	def _receive(self, conn):
+		try:
+			data = conn.sock.recv(self.BUFFER_SIZE)
+			# Drain data already decrypted by the TLS layer.
+			while data and hasattr(conn.sock, 'pending') and conn.sock.pending():
+				data += conn.sock.recv(conn.sock.pending())
+		except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+			return
+		except socket.error, e:
+			if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+				return
+			raise
+		conn.bytesRead += len(data)
+		conn.deadline = self._deadline(conn.state == 'tunnel'
+				and self.connectTimeout or self.readTimeout)
+		eof = not data		# recv() returns '' once the server has closed.
+		if conn.headers is None:
+			conn.inbuf += data
+			if eof:
+				raise httplib.BadStatusLine('connection closed')
+			i = conn.inbuf.find('\r\n\r\n')
+			if i < 0:
+				return
+			self._parseHeaders(conn, conn.inbuf[:i])
+			data, conn.inbuf = conn.inbuf[i+4:], ''
+			if conn.state == 'tunnel':
+				if conn.status != 200:
+					raise socket.error('Tunnel connection failed: %d %s' %
+							(conn.status, conn.reason))
+				conn.headers = None
+				self._connected(conn)
+				return
+		if self._readBody(conn, data, eof):
+			self._response(conn)
+
+	def _parseHeaders(self, conn, text):
+		lines = text.split('\r\n')
+		parts = lines[0].split(None, 2)
+		if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+			raise httplib.BadStatusLine(lines[0])
+		conn.version = parts[0]
+		conn.status = int(parts[1])
+		conn.reason = len(parts) > 2 and parts[2] or ''
+		conn.headers = {}
+		for line in lines[1:]:
+			name, sep, value = line.partition(':')
+			if sep:
+				conn.headers[name.strip().lower()] = value.strip()
+
+	def _readBody(self, conn, data, eof=False):
+		"""Add response body data (which may be empty, the headers and
+		   body often arrive separately), return True when the body is
+		   complete. eof is True if the server has closed the connection.
+		"""
+		if conn.status in (204, 304) or 100 <= conn.status < 200:
+			return True		# No body.
+		if conn.headers.get('transfer-encoding', '').lower() == 'chunked':
+			conn.inbuf += data
+			if self._readChunks(conn):
+				return True
+		else:
+			conn.chunks.append(data)
+			conn.received += len(data)
+			length = conn.headers.get('content-length')
+			if length is None:
+				return eof		# The body ends when the connection closes.
+			if conn.received >= int(length):
+				return True
+		if eof:
+			raise httplib.IncompleteRead(''.join(conn.chunks))
+		return False
+
+	def _readChunks(self, conn):
+		"""Move the complete chunks of a chunked body from conn.inbuf to
+		   conn.chunks, return True when the last chunk has been read
+		"""
+		while True:
+			if conn.chunkSize is None:
+				i = conn.inbuf.find('\r\n')
+				if i < 0:
+					return False
+				conn.chunkSize = int(conn.inbuf[:i].split(';')[0], 16)
+				conn.inbuf = conn.inbuf[i+2:]
+			if conn.chunkSize == 0:
+				# Skip the trailer.
+				return conn.inbuf.startswith('\r\n') \
+						or '\r\n\r\n' in conn.inbuf
+			if len(conn.inbuf) < conn.chunkSize + 2:
+				return False
+			conn.chunks.append(conn.inbuf[:conn.chunkSize])
+			conn.received += conn.chunkSize
+			conn.inbuf = conn.inbuf[conn.chunkSize+2:]
+			conn.chunkSize = None
+
+	def _response(self, conn):
+		"""Complete the call with the response received on conn
+		"""
+		call = conn.call
+		body = ''.join(conn.chunks)
+		keepAlive = conn.headers.get('connection', '').lower() != 'close' \
+				and conn.version == 'HTTP/1.1' \
+				and (conn.headers.get('content-length') is not None
+					or 'transfer-encoding' in conn.headers)
+		if call.request is not None:
+			self._restResponse(conn, call, body, keepAlive)
+			return
+		if conn.status != 200:
+			try:
+				raise xmlrpclib.ProtocolError(self.host + self.handler,
+						conn.status, conn.reason, conn.headers)
+			except xmlrpclib.ProtocolError:
+				if not self._resend(conn, call, sys.exc_info(), keepAlive) \
+						and not self._retry(conn, call, sys.exc_info(), True,
+							keepAlive):
+					self._finish(conn, call, error=sys.exc_info(),
+							keepAlive=keepAlive)
+			return
+		try:
+			body = gzipDecode(conn.headers, body)
+			p, u = xmlrpclib.getparser()
+			p.feed(body)
+			p.close()
+			result = u.close()
+		except xmlrpclib.Fault:
+			if not self._resend(conn, call, sys.exc_info(), keepAlive):
+				self._finish(conn, call, error=sys.exc_info(), status='fault',
+						keepAlive=keepAlive)
+		except:
+			self._finish(conn, call, error=sys.exc_info())
+		else:
+			if call.gzipped:
+				self.gzip.accepted(self.key)
+			if len(result) == 1:
+				result = result[0]
+			self._finish(conn, call, result, keepAlive=keepAlive)
+
+	def _restResponse(self, conn, call, body, keepAlive):
+		"""Complete the REST API call with the response received on conn
+		"""
+		try:
+			result = restResult(self.host + call.request[1], conn.status,
+					conn.reason, conn.headers, gzipDecode(conn.headers, body))
+		except RestError:
+			if not self._resend(conn, call, sys.exc_info(), keepAlive) \
+					and not self._retry(conn, call, sys.exc_info(), True,
+						keepAlive):
+				self._finish(conn, call, error=sys.exc_info(),
+						keepAlive=keepAlive)
+		except:
+			self._finish(conn, call, error=sys.exc_info())
+		else:
+			if call.gzipped:
+				self.gzip.accepted(self.key)
+			self._finish(conn, call, result, keepAlive=keepAlive)
+
+	def _failed(self, conn, error):
+		"""conn failed with error, retry the call on a new connection if
+		   the server may have closed the idle connection (unless the call
+		   is not idempotent and its request was completely written)
+		"""
+		call = conn.call
+		if conn.reused and not conn.bytesRead and not call.retried \
+				and isinstance(error[1], (socket.error, httplib.BadStatusLine)) \
+				and not isinstance(error[1], socket.timeout) \
+				and (conn.out or conn.body is not None
+					or self.retry.isIdempotent(call.methodName, call.body)):
+			self.active.remove(conn)
+			conn.close()
+			self._releaseSlot(call, 0, 'error')
+			call.retried = True
+			self.queue.insert(0, call)
+			return
+		sent = conn.state not in ('connect', 'tunnel', 'handshake')
+		if not self._retry(conn, call, error, sent):
+			self._finish(conn, call, error=error)
+
+	def _resend(self, conn, call, error, keepAlive):
+		"""Requeue call to be sent uncompressed if error shows the server
+		   could not read its compressed request. Return True if the call
+		   was requeued.
+		"""
+		if not call.gzipped or not self.gzip.rejected(self.key, error[1]):
+			return False
+		self._release(conn, call, 'retry', keepAlive)
+		self.queue.insert(0, call)
+		return True
+
+	def _retry(self, conn, call, error, sent, keepAlive=False):
+		"""Requeue call after its backoff delay if the retry policy allows
+		   it to be retried after error (sent is False if no part of the
+		   request was sent). Return True if the call was requeued.
+		"""
+		delay = self.retry.delay(call.attempt, call.methodName, call.body,
+				error[1], sent)
+		if delay is None:
+			return False
+		self._release(conn, call, 'retry', keepAlive, error[1])
+		call.attempt += 1
+		call.notBefore = time.time() + delay
+		self.queue.append(call)
+		return True
+
+	def _finish(self, conn, call, result=None, error=None, status=None,
+			keepAlive=False):
+		"""Record and complete call, release or close its connection
+		"""
+		self._release(conn, call, status or (error and 'error' or 'ok'),
+				keepAlive, error and error[1])
+		call.complete(result, error)
+
+	def _releaseSlot(self, call, latency, outcome):
+		if call.slot:
+			call.slot = False
+			self.limit.release(call.methodName, latency, outcome,
+					self._bodySize(call))
+
+	def _bodySize(self, call):
+		"""Return the size of the request body sent for call
+		"""
+		return len(call.gzipped or call.body)
+
+	def _release(self, conn, call, status, keepAlive=False, error=None):
+		"""Record call with status, release or close its connection and
+		   return its limit slot (error is the exception if it failed)
+		"""
+		latency = 0
+		if conn is not None:
+			latency = time.time() - conn.started
+			self.active.remove(conn)
+			self.stats.record(call.methodName, self._bodySize(call),
+					conn.bytesRead, latency, status)
+			if keepAlive:
+				conn.reset()
+				conn.state = 'send'
+				self.pool.put(self.key, conn)
+			else:
+				conn.close()
+		else:
+			self.stats.record(call.methodName, len(call.body), 0, 0, status)
+		if status == 'fault':
+			error = None
+		self._releaseSlot(call, latency, ConcurrencyLimit.outcome(error))
+
+class AsyncWordPressClient(WordPressClient):
+	"""Asynchronous counterpart of WordPressClient for keeping many calls
+	   in flight on a single thread. The methods take the same arguments
+	   as the WordPressClient methods but return an AsyncCall whose get()
+	   returns the WordPressClient method result (lists rather than
+	   generators). Up to maxConnections calls are performed concurrently
+	   by the event loop of the AsyncTransport, which runs when get() or
+	   run() is called. A client must only be used by one thread at a time.
+	"""
+
+	def __init__(self, url, user, password, proxy=None,
+			connectTimeout=None, readTimeout=None, callStats=None, retries=0,
+			maxRequests=None, maxConnections=8, gzipThreshold=None):
+		WordPressClient.__init__(self, url, user, password, proxy,
+				connectTimeout, readTimeout, callStats, retries, maxRequests,
+				gzipThreshold)
+		self._async = AsyncTransport(url, proxy, connectTimeout, readTimeout,
+				maxConnections, stats=self.callStats,
+				retry=RetryPolicy(retries), limit=self._transport.limit,
+				gzip=self._transport.gzip)
+
+	def run(self, calls=None):
+		"""Run the event loop until calls (by default all calls) have
+		   completed
+		"""
+		self._async.run(calls)
+
+	def _call(self, methodName, params, faults=False):
+		"""Return AsyncCall of XML-RPC method, if faults is True faults
+		   are raised as WordPressException
+		"""
+		call = self._async.submit(AsyncCall(self), methodName,
+				xmlrpclib.dumps(params, methodName))
+		if faults:
+			call = call.then(None, self._wordPressFault)
+		return call
+
+	def _wordPressFault(self, error):
+		if isinstance(error[1], xmlrpclib.Fault):
+			raise WordPressException(error[1])
+		raise error[0], error[1], error[2]
+
+	def _completed(self, result):
+		"""Return completed AsyncCall with result
+		"""
+		call = AsyncCall(self)
+		call.complete(result)
+		return call
+
+	def _multiCall(self, calls):
+		"""Asynchronous WordPressClient._multiCall()
+		"""
+		if self.multiCallSupport.get(self.url) is not False and len(calls) > 1:
+			def batched(results):
+				self.multiCallSupport[self.url] = True
+				for result in results:
+					if isinstance(result, dict):
+						raise xmlrpclib.Fault(result['faultCode'],
+								result['faultString'])
+				return [result[0] for result in results]
+			def rejected(error):
+				if isinstance(error[1], xmlrpclib.Fault) \
+						and error[1].faultCode == self.METHOD_NOT_FOUND:
+					self.multiCallSupport[self.url] = False
+					return self._sequence(calls)
+				raise error[0], error[1], error[2]
+			return self._call('system.multicall',
+					([{'methodName': name, 'params': params}
+						for name, params in calls],)).then(batched, rejected)
+		return self._sequence(calls)
+
+	def _sequence(self, calls, results=[]):
+		"""Return AsyncCall of the list of results of calls executed one
+		   after the other
+		"""
+		if not calls:
+			return self._completed(results)
+		name, params = calls[0]
+		return self._call(name, params).then(
+				lambda result: self._sequence(calls[1:], results + [result]))
+
+	def supportedMethods(self):
+		return self._call('mt.supportedMethods', ())
+
+	def getLastPost(self):
+		return self.getRecentPosts(1).then(lambda posts: posts[0])
+
+	def getRecentPosts(self, numPosts=5):
+		return self._call('metaWeblog.getRecentPosts', (self.blogId,
+				self.user, self.password, numPosts), True).then(
+				lambda posts: [self._filterPost(post) for post in posts])
+
+	def getPosts(self, filter=None, fields=None):
+		params = [self.blogId, self.user, self.password, filter or {}]
+		if fields is not None:
+			params.append(fields)
+		return self._call('wp.getPosts', tuple(params), True).then(
+				lambda posts: [self._filterWpPost(post) for post in posts])
+
+	def getPost(self, postId):
+		post = self._fetchedPost('metaWeblog.getPost', postId)
+		if post is not None:
+			return self._completed(self._filterPost(post))
+		return self._call('metaWeblog.getPost',
+				(str(postId), self.user, self.password), True).then(
+				self._filterPost)
+
+	def getUserInfo(self):
+		def user(userinfo):
+			userObj = WordPressUser()
+			userObj.id = userinfo['userid']
+			userObj.firstName = userinfo['firstname']
+			userObj.lastName = userinfo['lastname']
+			userObj.nickname = userinfo['nickname']
+			userObj.email = userinfo['email']
+			return userObj
+		return self._call('blogger.getUserInfo',
+				('', self.user, self.password), True).then(user)
+
+	def getUsersBlogs(self):
+		def blogs(blogs):
+			result = []
+			for blog in blogs:
+				blogObj = WordPressBlog()
+				blogObj.id = blog['blogid']
+				blogObj.name = blog['blogName']
+				blogObj.isAdmin = blog['isAdmin']
+				blogObj.url = blog['url']
+				result.append(blogObj)
+			return result
+		return self._call('blogger.getUsersBlogs',
+				('', self.user, self.password), True).then(blogs)
+
+	def newPost(self, post, publish, fetch=False):
+		categories = self._postCategories(post)
+		def created(postId):
+			postId = int(postId)
+			return self._batchPostCalls(postId, categories, publish,
+					fetch).then(lambda result: postId)
+		return self._call('metaWeblog.newPost', (self.blogId, self.user,
+				self.password, self._newPostContent(post), 0)).then(created)
+
+	def getPostCategories(self, postId):
+		return self._call('mt.getPostCategories',
+				(postId, self.user, self.password), True).then(
+				lambda categories: [self._filterCategory(cat)
+					for cat in categories])
+
+	def setPostCategories(self, postId, categories):
+		return self._call('mt.setPostCategories',
+				(postId, self.user, self.password, categories))
+
+	def editPost(self, postId, post, publish, fetch=False):
+		def edited(result):
+			self._editResult(result)
+			return self._batchPostCalls(postId, self._postCategories(post),
+					publish, fetch)
+		return self._call('metaWeblog.editPost', (postId, self.user,
+				self.password, self._editPostContent(post), 0)).then(edited)
+
+	def _batchPostCalls(self, postId, categories, publish, fetch):
+		return self._multiCall(self._postCalls(postId, categories, publish,
+				fetch)).then(lambda results:
+				self._postResults(postId, results, fetch))
+
+	def deletePost(self, postId):
+		return self._call('blogger.deletePost',
+				('', postId, self.user, self.password), True)
+
+	def getCategoryList(self):
+		if self.categories:
+			return self._completed(self.categories)
+		def categories(categories):
+			self.categories = [self._filterCategory(cat) for cat in categories]
+			return self.categories
+		return self._call('mt.getCategoryList', (self.blogId, self.user,
+				self.password), True).then(categories)
+
+	def getCategoryIdFromName(self, name):
+		def categoryId(categories):
+			for c in categories:
+				if c.name == name:
+					return c.id
+		return self.getCategoryList().then(categoryId)
+
+	def getTrackbackPings(self, postId):
+		return self._call('mt.getTrackbackPings', (postId,), True)
+
+	def publishPost(self, postId):
+		return self._call('mt.publishPost', (postId, self.user,
+				self.password), True).then(lambda result: result == 1)
+
+	def getPingbacks(self, postUrl):
+		return self._call('pingback.extensions.getPingbacks', (postUrl,), True)
+
+	def newMediaObject(self, mediaFileName):
+		methodName = 'metaWeblog.newMediaObject'
+		body = self._streamBody(methodName, self._mediaParams(mediaFileName),
+				mediaFileName)
+		call = self._async.submit(AsyncCall(self), methodName, body)
+		call.addCallback(lambda call: body.close())
+		return call.then(lambda result: result['url'], self._wordPressFault)
+
+	def getMediaLibrary(self, filter=None):
+		return self._call('wp.getMediaLibrary', (self.blogId, self.user,
+				self.password, filter or {}), True).then(
+				lambda items: [self._filterMedia(item) for item in items])
+
+	def getLastPage(self):
+		return self.getRecentPages().then(lambda pages: pages[0])
+
+	def getRecentPages(self):
+		return self._call('wp.getPages', (self.blogId, self.user,
+				self.password), True).then(
+				lambda pages: [self._filterPage(page) for page in pages])
+
+	def getPage(self, postId):
+		post = self._fetchedPost('wp.getPage', postId)
+		if post is not None:
+			return self._completed(self._filterPage(post))
+		return self._call('wp.getPage', (self.blogId, str(postId), self.user,
+				self.password), True).then(self._filterPage)
+
+	def newPage(self, post, publish):
+		return self._call('wp.newPage', (self.blogId, self.user,
+				self.password, self._pageContent(post), publish)).then(int)
+
+	def editPage(self, postId, post, publish, fetch=False):
+		return self._multiCall(self._editPageCalls(postId, post, publish,
+				fetch)).then(lambda results:
+				self._editPageResults(postId, results, fetch))
+
+	def deletePage(self, postId):
+		return self._call('wp.deletePage', (self.blogId, self.user,
+				self.password, postId), True)
+
+	def newCategory(self, name, description=None):
+		cat = {'name': name}
+		if description is not None:
+			cat['description'] = description
+		return self._call('wp.newCategory', (self.blogId, self.user,
+				self.password, cat), True)
+
+	def newCategories(self, names):
+		return self._multiCall([('wp.newCategory', (self.blogId, self.user,
+				self.password, {'name': name})) for name in names]).then(
+				lambda catIds: [int(catId) for catId in catIds],
+				self._wordPressFault)
+
+class WordPressRestClient:
+	"""Client for the WordPress REST API with the methods of
+	   WordPressClient for posts, pages, categories and media (the XML-RPC
+	   only supportedMethods, getUsersBlogs, getTrackbackPings and
+	   getPingbacks are not available). url is the API root, for example
+	   http://example.com/wp-json (or http://example.com/?rest_route= on
+	   sites without pretty permalinks), password is an application
+	   password. Media files are uploaded as raw binary request bodies
+	   streamed from the file and responses are limited to the fields the
+	   client uses. The other arguments are those of WordPressClient.
+	"""
+
+	# Post object fields filling WordPressPost instances.
+	POST_FIELDS = ['id', 'title', 'content', 'excerpt', 'author', 'date',
+			'date_gmt', 'modified_gmt', 'link', 'status', 'type',
+			'categories', 'comment_status', 'ping_status']
+	# Fields returned by post creates and updates: the content is the
+	# one that was sent.
+	ECHO_FIELDS = [name for name in POST_FIELDS if name != 'content']
+	# REST API fields of wp.getPosts field names.
+	WP_FIELDS = {
+		'post_title': 'title', 'post_status': 'status', 'post_type': 'type',
+		'post_date_gmt': 'date_gmt', 'post_modified_gmt': 'modified_gmt',
+		'link': 'link', 'terms': 'categories', 'post_content': 'content',
+		'post_excerpt': 'excerpt', 'post_author': 'author',
+	}
+	MEDIA_FIELDS = ['id', 'source_url', 'title', 'post', 'mime_type',
+			'date_gmt', 'media_details']
+	PER_PAGE = 100	# Maximum items per REST API list request.
+	MORE = '<!--more-->'
+
+	def __init__(self, url, user, password, proxy=None,
+			connectTimeout=None, readTimeout=None, callStats=None, retries=0,
+			maxRequests=None, gzipThreshold=None):
+		self.url = url
+		self.user = user
+		self.password = password
+		self.blogId = 0
+		self.categories = None
+		scheme, rest = urllib.splittype(url)
+		self.host, self.root = urllib.splithost(rest)
+		self.root = self.root.rstrip('/')
+		limit = None
+		if maxRequests:
+			limit = concurrencyLimit(url, maxRequests)
+		self._transport = RestTransport(scheme.lower(), proxy,
+				connectTimeout, readTimeout, stats=callStats,
+				retry=RetryPolicy(retries), limit=limit,
+				gzip=GzipEncoding(gzipThreshold))
+		self.callStats = self._transport.stats
+		self._authorization = 'Basic ' + base64.b64encode(
+				'%s:%s' % (user, password))
+		# Post objects returned by newPost/editPost/editPage(fetch=True).
+		self._fetched = {}
+
+	def _path(self, route, query=None):
+		"""Return the request path of API route with query parameters
+		"""
+		path = self.root + route
+		if query:
+			path += ('?' in path and '&' or '?') + urllib.urlencode(query)
+		return path
+
+	def _methodName(self, method, route):
+		"""Return the name calls are recorded as, e.g. GET /wp/v2/posts/{id}
+		"""
+		return '%s %s' % (method, re.sub(r'/\d+', '/{id}', route))
+
+	def _call(self, method, route, query=None, data=None, fields=None):
+		"""Perform REST API request and return the decoded response.
+		   query is a dictionary of URL parameters, data the request's JSON
+		   body and fields the list of response fields to return.
+		"""
+		query = dict(query or {})
+		if fields:
+			query['_fields'] = ','.join(fields)
+		headers = [('Authorization', self._authorization)]
+		body = ''
+		if data is not None:
+			headers.append(('Content-Type', 'application/json'))
+			body = json.dumps(data)
+		return self._perform(method, route, query, headers, body)
+
+	def _perform(self, method, route, query, headers, body):
+		try:
+			return self._transport.perform(self.host, method,
+					self._path(route, query), headers, body,
+					self._methodName(method, route))
+		except RestError, e:
+			if e.code:
+				raise WordPressException(e)
+			raise
+
+	def _list(self, route, query, fields, number=None):
+		"""Return list of up to number (all if None) items of list route
+		   fetched PER_PAGE at a time from query['offset']
+		"""
+		query = dict(query)
+		offset = query.get('offset', 0)
+		result = []
+		while number is None or len(result) < number:
+			count = self.PER_PAGE
+			if number is not None:
+				count = min(count, number - len(result))
+			query['per_page'] = count
+			query['offset'] = offset + len(result)
+			items = self._call('GET', route, query, fields=fields)
+			result.extend(items)
+			if len(items) < count:
+				break
+		return result
+
+	def _route(self, postType, postId=None):
+		"""Return the route of postType ('post' or 'page') posts or post
+		"""
+		route = '/wp/v2/%s' % {'post': 'posts', 'page': 'pages'}.get(
+				postType, postType)
+		if postId is not None:
+			route += '/%s' % postId
+		return route
+
+	def _text(self, value):
+		"""Return the raw (else rendered) text of a REST API field
+		"""
+		if isinstance(value, dict):
+			if 'raw' in value:
+				return value['raw']
+			return value.get('rendered', '')
+		return value or ''
+
+	def _parseDate(self, value):
+		if not value:
+			return None
+		return time.strptime(str(value), "%Y-%m-%dT%H:%M:%S")
+
+	def _filterPost(self, post):
+		"""Transform REST API post object in WordPressPost instance
+		"""
+		postObj = WordPressPost()
+		postObj.id				= int(post['id'])
+		postObj.title			= self._text(post.get('title'))
+		postObj.description, more, postObj.textMore = \
+				self._text(post.get('content')).partition(self.MORE)
+		postObj.excerpt			= self._text(post.get('excerpt'))
+		postObj.user			= str(post.get('author', ''))
+		postObj.date			= self._parseDate(post.get('date_gmt')
+				or post.get('date'))
+		postObj.modified		= self._parseDate(post.get('modified_gmt'))
+		postObj.permaLink		= post.get('link', '')
+		postObj.link			= post.get('link', '')
+		postObj.status			= post.get('status', '')
+		postObj.postType		= post.get('type', '')
+		postObj.allowComments	= post.get('comment_status') == 'open'
+		postObj.allowPings		= post.get('ping_status') == 'open'
+		postObj.categories		= [cat.name for cat in
+				self._categoriesFromIds(post.get('categories', []))]
+		return postObj
+
+	def _filterMedia(self, item):
+		"""Transform REST API media object in WordPressMediaItem instance
+		"""
+		mediaObj = WordPressMediaItem()
+		mediaObj.id				= int(item['id'])
+		mediaObj.url			= item.get('source_url', '')
+		mediaObj.title			= self._text(item.get('title'))
+		mediaObj.parent			= int(item.get('post') or 0)
+		mediaObj.mimeType		= item.get('mime_type', '')
+		mediaObj.date			= self._parseDate(item.get('date_gmt'))
+		details = item.get('media_details') or {}
+		if details.get('file'):
+			mediaObj.file			= details['file']
+		if details.get('filesize'):
+			mediaObj.size			= int(details['filesize'])
+		return mediaObj
+
+	def _categoriesFromIds(self, ids):
+		"""Return the WordPressCategory instances of category ids
+		"""
+		if not ids:
+			return []
+		categories = dict((cat.id, cat) for cat in self.getCategoryList())
+		if [catId for catId in ids if catId not in categories]:
+			# Created since the category list was fetched.
+			self.categories = None
+			categories = dict((cat.id, cat) for cat in self.getCategoryList())
+		return [categories[catId] for catId in ids if catId in categories]
+
+	def _categoryIds(self, categories):
+		"""Return the ids of categories, a list of category ids or names
+		"""
+		result = []
+		for cat in categories:
+			if isinstance(cat, (int, long)) or str(cat).isdigit():
+				result.append(int(cat))
+			else:
+				catId = self.getCategoryIdFromName(cat)
+				if catId is not None:
+					result.append(catId)
+		return result
+
+	def _postContent(self, post, publish, postType, edit=False):
+		"""Return create (or update if edit is True) request data of
+		   WordPressPost post
+		"""
+		content = post.description
+		if post.textMore:
+			content += self.MORE + post.textMore
+		data = {
+			'title': post.title,
+			'content': content,
+			'status': publish and 'publish' or 'draft',
+		}
+		if postType == 'post' and post.categories:
+			data['categories'] = self._categoryIds(post.categories)
+		if edit:
+			data['excerpt'] = post.excerpt
+			data['ping_status'] = post.allowPings and 'open' or 'closed'
+			if post.date:
+				data['date_gmt'] = time.strftime('%Y-%m-%dT%H:%M:%S',
+						post.date)
+		return data
+
+	def _save(self, postType, postId, post, publish, fetch):
+		"""Create (postId is None) or update post, return its id. If
+		   fetch is True the post object returned by the request is kept so
+		   a following getPost or getPage call needs no round-trip.
+		"""
+		data = self._postContent(post, publish, postType, postId is not None)
+		result = self._call('POST', self._route(postType, postId), data=data,
+				fields=fetch and self.ECHO_FIELDS or ['id'])
+		postId = int(result['id'])
+		if fetch:
+			result['content'] = {'raw': data['content']}
+			self._fetched[(postType, postId)] = result
+		return postId
+
+	def _getPost(self, postType, postId):
+		post = self._fetched.pop((postType, int(postId)), None)
+		if post is None:
+			post = self._call('GET', self._route(postType, postId),
+					{'context': 'edit'}, fields=self.POST_FIELDS)
+		return self._filterPost(post)
+
+	def selectBlog(self, blogId):
+		self.blogId = blogId
+
+	def getLastPost(self):
+		"""Get last post
+		"""
+		return self.getRecentPosts(1)[0]
+
+	def getRecentPosts(self, numPosts=5):
+		"""Get recent posts
+		"""
+		return [self._filterPost(post) for post in self._list(
+				self._route('post'), {'context': 'edit', 'status': 'any'},
+				self.POST_FIELDS, numPosts)]
+
+	def getPosts(self, filter=None, fields=None):
+		"""Get posts matching wp.getPosts filter struct (post_type,
+		   post_status, number, offset, orderby, order), fields is an
+		   optional list of the wp.getPosts post fields to return
+		"""
+		filter = filter or {}
+		if fields is None:
+			restFields = self.POST_FIELDS
+		else:
+			restFields = ['id'] + [self.WP_FIELDS[name] for name in fields
+					if name in self.WP_FIELDS]
+		query = {
+			'context': 'edit',
+			'status': filter.get('post_status', 'any'),
+			'offset': filter.get('offset', 0),
+			'orderby': filter.get('orderby', 'date'),
+			'order': filter.get('order', 'DESC').lower(),
+		}
+		return [self._filterPost(post) for post in self._list(
+				self._route(filter.get('post_type', 'post')), query,
+				restFields, filter.get('number', 10))]
+
+	def getMediaLibrary(self, filter=None):
+		"""Get media library items matching wp.getMediaLibrary filter
+		   struct (number, offset, parent_id, mime_type)
+		"""
+		filter = filter or {}
+		query = {'offset': filter.get('offset', 0)}
+		if 'parent_id' in filter:
+			query['parent'] = filter['parent_id']
+		mimeType = filter.get('mime_type')
+		if mimeType:
+			if '/' in mimeType:
+				query['mime_type'] = mimeType
+			else:
+				query['media_type'] = mimeType
+		return [self._filterMedia(item) for item in self._list('/wp/v2/media',
+				query, self.MEDIA_FIELDS, filter.get('number', 10))]
+
+	def getPost(self, postId):
+		"""Get post item
+		"""
+		return self._getPost('post', postId)
+
+	def getUserInfo(self):
+		"""Get user info
+		"""
+		user = self._call('GET', '/wp/v2/users/me', {'context': 'edit'},
+				fields=['id', 'first_name', 'last_name', 'nickname', 'email'])
+		userObj = WordPressUser()
+		userObj.id = str(user['id'])
+		userObj.firstName = user.get('first_name', '')
+		userObj.lastName = user.get('last_name', '')
+		userObj.nickname = user.get('nickname', '')
+		userObj.email = user.get('email', '')
+		return userObj
+
+	def newPost(self, post, publish, fetch=False):
+		"""Insert new post with its categories in a single request. If
+		   fetch is True a following getPost call needs no round-trip.
+		"""
+		return self._save('post', None, post, publish, fetch)
+
+	def getPostCategories(self, postId):
+		"""Get post's categories
+		"""
+		post = self._call('GET', self._route('post', postId),
+				fields=['categories'])
+		result = []
+		for cat in self._categoriesFromIds(post.get('categories', [])):
+			catObj = WordPressCategory()
+			catObj.id = cat.id
+			catObj.name = cat.name
+			catObj.isPrimary = not result
+			result.append(catObj)
+		return result
+
+	def setPostCategories(self, postId, categories):
+		"""Set post's categories (a list of {'categoryId': id} structs)
+		"""
+		self._call('POST', self._route('post', postId), data={'categories':
+				self._categoryIds([cat['categoryId'] for cat in categories])},
+				fields=['id'])
+		return True
+
+	def editPost(self, postId, post, publish, fetch=False):
+		"""Edit post. If fetch is True a following getPost call needs no
+		   round-trip.
+		"""
+		self._save('post', postId, post, publish, fetch)
+
+	def deletePost(self, postId):
+		"""Delete post (it is moved to the trash)
+		"""
+		self._call('DELETE', self._route('post', postId), fields=['id'])
+		return True
+
+	def getCategoryList(self):
+		"""Get blog's categories list
+		"""
+		if not self.categories:
+			self.categories = []
+			for cat in self._list('/wp/v2/categories', {}, ['id', 'name']):
+				catObj = WordPressCategory()
+				catObj.id = int(cat['id'])
+				catObj.name = cat['name']
+				self.categories.append(catObj)
+		return self.categories
+
+	def getCategoryIdFromName(self, name):
+		"""Get category id from category name
+		"""
+		for c in self.getCategoryList():
+			if c.name == name:
+				return c.id
+
+	def publishPost(self, postId):
+		"""Publish post
+		"""
+		self._call('POST', self._route('post', postId),
+				data={'status': 'publish'}, fields=['id'])
+		return True
+
+	def _mediaRequest(self, mediaFileName):
+		"""Return (route, query, headers, body) of a newMediaObject
+		   request that streams the raw file
+		"""
+		name = os.path.basename(mediaFileName)
+		headers = [
+			('Authorization', self._authorization),
+			('Content-Type', mimetypes.guess_type(name)[0]
+				or 'application/octet-stream'),
+			('Content-Disposition',
+				'attachment; filename="%s"' % name.replace('"', '')),
+		]
+		return ('/wp/v2/media', {'_fields': 'source_url'}, headers,
+				FileBody(mediaFileName))
+
+	def newMediaObject(self, mediaFileName):
+		"""Add new media object (image, movie, etc...)
+		"""
+		route, query, headers, body = self._mediaRequest(mediaFileName)
+		try:
+			return self._perform('POST', route, query, headers,
+					body)['source_url']
+		finally:
+			body.close()
+
+	def getLastPage(self):
+		"""Get last page
+		"""
+		return self.getRecentPages()[0]
+
+	def getRecentPages(self):
+		"""Get recent pages
+		"""
+		return [self._filterPost(page) for page in self._list(
+				self._route('page'), {'context': 'edit', 'status': 'any'},
+				self.POST_FIELDS, 10)]
+
+	def getPage(self, postId):
+		"""Get page item
+		"""
+		return self._getPost('page', postId)
+
+	def newPage(self, post, publish):
+		"""Insert new page
+		"""
+		return self._save('page', None, post, publish, False)
+
+	def editPage(self, postId, post, publish, fetch=False):
+		"""Edit page. If fetch is True a following getPage call needs no
+		   round-trip.
+		"""
+		self._save('page', postId, post, publish, fetch)
+
+	def deletePage(self, postId):
+		"""Delete page (it is moved to the trash)
+		"""
+		self._call('DELETE', self._route('page', postId), fields=['id'])
+		return True
+
+	def newCategory(self, name, description=None):
+		"""Create new category. Return new categoryId.
+		"""
+		data = {'name': name}
+		if description is not None:
+			data['description'] = description
+		catId = int(self._call('POST', '/wp/v2/categories', data=data,
+				fields=['id'])['id'])
+		if self.categories is not None:
+			catObj = WordPressCategory()
+			catObj.id = catId
+			catObj.name = name
+			self.categories.append(catObj)
+		return catId
+
+	def newCategories(self, names):
+		"""Create new categories. Return list of new categoryIds.
+		"""
+		return [self.newCategory(name) for name in names]
+
+class AsyncWordPressRestClient(WordPressRestClient):
+	"""WordPressRestClient whose newMediaObject() is asynchronous:
+	   it returns an AsyncCall and up to maxConnections uploads are
+	   performed concurrently by the event loop of an AsyncTransport, which
+	   runs when get() or run() is called. The other methods are those of
+	   WordPressRestClient. A client must only be used by one thread at a
+	   time.
+	"""
+
+	def __init__(self, url, user, password, proxy=None,
+			connectTimeout=None, readTimeout=None, callStats=None, retries=0,
+			maxRequests=None, maxConnections=8, gzipThreshold=None):
+		WordPressRestClient.__init__(self, url, user, password, proxy,
+				connectTimeout, readTimeout, callStats, retries, maxRequests,
+				gzipThreshold)
+		self._async = AsyncTransport(url, proxy, connectTimeout, readTimeout,
+				maxConnections, stats=self.callStats,
+				retry=RetryPolicy(retries), limit=self._transport.limit,
+				gzip=self._transport.gzip)
+
+	def run(self, calls=None):
+		"""Run the event loop until calls (by default all calls) have
+		   completed
+		"""
+		self._async.run(calls)
+
+	def newMediaObject(self, mediaFileName):
+		route, query, headers, body = self._mediaRequest(mediaFileName)
+		call = self._async.submit(AsyncCall(self),
+				self._methodName('POST', route), body,
+				('POST', self._path(route, query), headers))
+		call.addCallback(lambda call: body.close())
+		return call.then(lambda result: result['source_url'],
+				self._restFault)
+
+	def _restFault(self, error):
+		if isinstance(error[1], RestError) and error[1].code:
+			raise WordPressException(error[1])
+		raise error[0], error[1], error[2]